@@ -4,30 +4,81 @@ build_tracker.py
 Run this from the repo root to compile the Python tracker into a binary.
 
 Usage:
-  python build_tracker.py
+  python build_tracker.py              # single-file binary
+  python build_tracker.py --onedir     # folder build; starts much faster
+  python build_tracker.py --bench-only # measure the build in resources/
+  python build_tracker.py --bench-only --script  # measure the plain Python tracker
 
 Output:
-  dist/tracker           (Mac/Linux)
-  dist/tracker.exe       (Windows)
+  dist/tracker           (Mac/Linux, --onefile)
+  dist/tracker.exe       (Windows, --onefile)
+  dist/tracker/          (--onedir: the executable plus its libraries)
 
 Then copy the output to resources/ in your Electron project before packaging.
+
+A --onefile binary unpacks its whole archive to a temp dir on every start;
+--onedir ships it already unpacked, so the tracker reaches its first poll
+sooner. `npm run package` uses --onedir.
+
+After building, the cold start is measured: the tracker is started against a
+local stub ADS-B server and timed until its first poll. Binary size and
+time-to-first-poll are appended to build/startup_benchmark.jsonl, and the
+build fails if either is over budget (--max-startup-seconds,
+--max-size-mb).
 """
 
+import argparse
+import json
+import os
+import shutil
+import statistics
 import subprocess
 import sys
-import shutil
-import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 TRACKER_SCRIPT = 'tracker/aviation_tracker_discord_bot.py'
 OUTPUT_NAME = 'tracker'
 RESOURCES_DIR = 'resources'
+BENCHMARK_LOG = 'build/startup_benchmark.jsonl'
+
+# Only what the tracker imports at runtime
+TRACKER_DEPENDENCIES = ['requests']
+
+# Modules PyInstaller would otherwise pull in from the build environment.
+# NumPy only speeds up very large fleets (see airspace_geometry); use
+# --with-numpy to keep it.
+EXCLUDED_MODULES = [
+    'tkinter', 'unittest', 'pydoc', 'doctest', 'pdb', 'lib2to3', 'xmlrpc',
+    'discord', 'aiohttp', 'numpy',
+]
+
+# Budgets for the cold-start benchmark
+STARTUP_BUDGET_SECONDS = 3.0
+SIZE_BUDGET_MB = 30
+
+STARTUP_RUNS = 5
+STARTUP_TIMEOUT_SECONDS = 60
 
 def run(cmd):
     print(f'\n$ {" ".join(cmd)}')
     result = subprocess.run(cmd, check=True)
     return result
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build the FinalPing tracker binary')
+    parser.add_argument('--onedir', action='store_true', help='folder build instead of a single file (faster start)')
+    parser.add_argument('--with-numpy', action='store_true', help='bundle NumPy for very large fleets')
+    parser.add_argument('--bench-only', action='store_true', help="don't build; measure the existing build")
+    parser.add_argument('--script', action='store_true', help='with --bench-only, measure the Python script')
+    parser.add_argument('--runs', type=int, default=STARTUP_RUNS, help='cold-start runs to time')
+    parser.add_argument('--max-startup-seconds', type=float, default=STARTUP_BUDGET_SECONDS)
+    parser.add_argument('--max-size-mb', type=float, default=SIZE_BUDGET_MB)
+    return parser.parse_args()
+
+def build(onedir, with_numpy):
     # Make sure pyinstaller is available
     try:
         import PyInstaller
@@ -37,34 +88,191 @@ def main():
 
     # Install tracker dependencies
     print('\nInstalling tracker dependencies...')
-    run([sys.executable, '-m', 'pip', 'install', 'requests', 'discord.py'])
+    run([sys.executable, '-m', 'pip', 'install', *TRACKER_DEPENDENCIES])
+
+    excluded = [m for m in EXCLUDED_MODULES if not (with_numpy and m == 'numpy')]
 
     # Build the binary
-    print(f'\nBuilding {TRACKER_SCRIPT} -> dist/{OUTPUT_NAME}...')
+    print(f'\nBuilding {TRACKER_SCRIPT} -> dist/{OUTPUT_NAME} ({"onedir" if onedir else "onefile"})...')
     run([
         sys.executable, '-m', 'PyInstaller',
-        '--onefile',                        # single binary
+        '--onedir' if onedir else '--onefile',
         '--name', OUTPUT_NAME,
         '--distpath', 'dist',
         '--workpath', 'build/pyinstaller',
         '--specpath', 'build/pyinstaller',
+        '--noupx',                          # UPX-packed libraries unpack slower
         '--noconfirm',
         '--clean',
         '--log-level', 'WARN',
+        *[arg for module in excluded for arg in ('--exclude-module', module)],
         TRACKER_SCRIPT,
     ])
 
     # Copy to Electron resources folder
     ext = '.exe' if sys.platform == 'win32' else ''
-    src = os.path.join('dist', f'{OUTPUT_NAME}{ext}')
-    
     os.makedirs(RESOURCES_DIR, exist_ok=True)
-    dst = os.path.join(RESOURCES_DIR, f'{OUTPUT_NAME}{ext}')
-    
-    shutil.copy2(src, dst)
-    print(f'\n✓ Binary copied to {dst}')
-    print(f'  Size: {os.path.getsize(dst) / 1024 / 1024:.1f} MB')
-    print('\nDone! Run npm run package to build the Electron installer.')
+    if onedir:
+        src = os.path.join('dist', OUTPUT_NAME)
+        dst = os.path.join(RESOURCES_DIR, OUTPUT_NAME)
+    else:
+        src = os.path.join('dist', f'{OUTPUT_NAME}{ext}')
+        dst = os.path.join(RESOURCES_DIR, f'{OUTPUT_NAME}{ext}')
+
+    # Switching between onefile and onedir: a file and a folder share the name
+    if os.path.isdir(dst):
+        shutil.rmtree(dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+
+    if onedir:
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+    print(f'\n✓ Build copied to {dst}')
+
+def built_executable():
+    """Path of the executable in resources/, onedir layout first"""
+    ext = '.exe' if sys.platform == 'win32' else ''
+    onedir = os.path.join(RESOURCES_DIR, OUTPUT_NAME, f'{OUTPUT_NAME}{ext}')
+    if os.path.isfile(onedir):
+        return onedir
+    onefile = os.path.join(RESOURCES_DIR, f'{OUTPUT_NAME}{ext}')
+    if os.path.isfile(onefile):
+        return onefile
+    return None
+
+def size_mb(path):
+    """Size of a file, or of everything in a folder"""
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1024 / 1024
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / 1024 / 1024
+
+# ─── Cold-start benchmark ────────────────────────────────────────────────────
+
+class _EmptySkyHandler(BaseHTTPRequestHandler):
+    """adsb.lol stand-in that always answers with no aircraft"""
+
+    def do_GET(self):
+        body = json.dumps({'ac': [], 'msg': 'No error', 'now': time.time()}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def startup_config(api_url):
+    return {
+        'logging': {'format': 'json', 'level': 'info'},
+        'aircraft': {'tail_numbers': ['N12345'], 'icao24_codes': ['a061d9']},
+        'airspace': {
+            'name': 'Startup Benchmark', 'center_lat': 40.0, 'center_lon': -75.0,
+            'radius_nm': 5, 'field_elevation_ft_msl': 0, 'ceiling_ft_agl': 3000,
+            'query_radius_nm': 25, 'alert_distances_nm': [10.0, 5.0, 2.0],
+        },
+        'integrations': {},
+        'monitoring': {'poll_interval_seconds': 10, 'adsb_api': api_url},
+        'notifications': {'cooldown_minutes': 1},
+    }
+
+def time_to_first_poll(command, config_path):
+    """Seconds from spawning the tracker until it reports its first poll"""
+    started = time.perf_counter()
+    proc = subprocess.Popen(command + [config_path], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, encoding='utf-8', errors='replace')
+    timer = threading.Timer(STARTUP_TIMEOUT_SECONDS, proc.kill)
+    timer.start()
+    try:
+        for line in proc.stdout:
+            try:
+                event = json.loads(line).get('event')
+            except ValueError:
+                continue
+            if event in ('poll_empty', 'aircraft'):
+                return time.perf_counter() - started
+        raise RuntimeError(f'tracker exited with code {proc.wait()} before its first poll')
+    finally:
+        timer.cancel()
+        proc.kill()
+        proc.wait()
+
+def measure_startup(command, runs):
+    """Time-to-first-poll for runs fresh starts, each with its own empty state"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _EmptySkyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f'http://127.0.0.1:{server.server_port}/v2'
+    times = []
+    try:
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as tmp:
+                config_path = os.path.join(tmp, 'tracker_config.json')
+                with open(config_path, 'w', encoding='utf-8') as f:
+                    json.dump(startup_config(api_url), f)
+                times.append(time_to_first_poll(command, config_path))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return times
+
+def benchmark(args, mode):
+    if args.script:
+        command = [sys.executable, TRACKER_SCRIPT]
+        size = None
+    else:
+        executable = built_executable()
+        if executable is None:
+            print(f'✗ No tracker build in {RESOURCES_DIR}/ - build it first')
+            return False
+        command = [executable]
+        onedir = os.path.dirname(executable) != RESOURCES_DIR
+        mode = mode or ('onedir' if onedir else 'onefile')
+        size = size_mb(os.path.dirname(executable) if onedir else executable)
+
+    print(f'\nMeasuring cold start ({args.runs} runs)...')
+    times = measure_startup(command, args.runs)
+    result = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'mode': 'script' if args.script else mode,
+        'platform': sys.platform,
+        'first_start_s': round(times[0], 3),
+        'median_start_s': round(statistics.median(times), 3),
+        'size_mb': None if size is None else round(size, 1),
+    }
+    os.makedirs(os.path.dirname(BENCHMARK_LOG), exist_ok=True)
+    with open(BENCHMARK_LOG, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+
+    print(f'  Time to first poll: first {result["first_start_s"]:.2f}s, median {result["median_start_s"]:.2f}s '
+          f'(budget {args.max_startup_seconds:.1f}s)')
+    if size is not None:
+        print(f'  Size: {size:.1f} MB (budget {args.max_size_mb:.0f} MB)')
+
+    ok = True
+    if result['first_start_s'] > args.max_startup_seconds:
+        print('✗ Cold start is over budget')
+        ok = False
+    if size is not None and size > args.max_size_mb:
+        print('✗ Binary size is over budget')
+        ok = False
+    return ok
+
+def main():
+    args = parse_args()
+    mode = None
+    if not args.bench_only:
+        build(args.onedir, args.with_numpy)
+        mode = 'onedir' if args.onedir else 'onefile'
+
+    if not benchmark(args, mode):
+        sys.exit(1)
+    if not args.bench_only:
+        print('\nDone! Run npm run package to build the Electron installer.')
 
 if __name__ == '__main__':
     main()
@@ -90,6 +90,14 @@ ipcMain.handle('tracker-stop', () => {
   return tracker.stopTracker();
 });
 
+ipcMain.handle('tracker-reload', async (event, token) => {
+  return tracker.reloadTracker(token);
+});
+
 ipcMain.handle('tracker-status', () => {
   return tracker.getStatus();
 });
+
+ipcMain.handle('tracker-history', async (event, kind, options) => {
+  return tracker.queryHistory(kind, options);
+});
@@ -13,7 +13,9 @@ contextBridge.exposeInMainWorld('electronAPI', {
   // Tracker control
   trackerStart: (token) => ipcRenderer.invoke('tracker-start', token),
   trackerStop: () => ipcRenderer.invoke('tracker-stop'),
+  trackerReload: (token) => ipcRenderer.invoke('tracker-reload', token),
   trackerStatus: () => ipcRenderer.invoke('tracker-status'),
+  trackerHistory: (kind, options) => ipcRenderer.invoke('tracker-history', kind, options),
 
   // Listen for live status updates pushed from main process
   onTrackerStatus: (callback) => {
@@ -18,8 +18,9 @@ const https = require('https');
 const API_BASE = 'https://aircraft-tracker-backend-production.up.railway.app';
 
 let trackerProcess = null;
-let statusCallback = null;   // called with { running, logs, error }
+let statusCallback = null;   // called with { running, logs, metrics, error }
 let logBuffer = [];
+let latestMetrics = null;    // last periodic "metrics" event from the tracker
 
 // ─── HTTP helper (no axios in main process) ─────────────────────────────────
 function apiGet(endpoint, token) {
@@ -90,6 +91,12 @@ async function buildTrackerConfig(token) {
     use_short_messages: false,
     verbose_debug: false,
 
+    // JSON-lines event stream, parsed by handleTrackerLine()
+    logging: {
+      format: 'json',
+      level: 'info',
+    },
+
     aircraft: {
       tail_numbers: tailNumbers,
       icao24_codes: icao24Codes,
@@ -147,17 +154,23 @@ function getConfigPath() {
 }
 
 function writeConfig(config) {
+  // Write-then-rename so a running tracker never reads a half-written file
   const configPath = getConfigPath();
-  fs.writeFileSync(configPath, JSON.stringify(config, null, 2), 'utf8');
+  const tmpPath = `${configPath}.tmp`;
+  fs.writeFileSync(tmpPath, JSON.stringify(config, null, 2), 'utf8');
+  fs.renameSync(tmpPath, configPath);
   return configPath;
 }
 
 // ─── Tracker binary path ──────────────────────────────────────────────────────
 function getTrackerBinaryPath() {
   if (app.isPackaged) {
-    // In packaged app, binary is in resources/
+    // In packaged app, the build is in resources/: a tracker/ folder from
+    // `build_tracker.py --onedir`, or a single-file binary
     const ext = process.platform === 'win32' ? '.exe' : '';
-    return path.join(process.resourcesPath, `tracker${ext}`);
+    const onedir = path.join(process.resourcesPath, 'tracker', `tracker${ext}`);
+    const onefile = path.join(process.resourcesPath, `tracker${ext}`);
+    return fs.existsSync(onedir) ? onedir : onefile;
   } else {
     // In development, use python directly
     return null;
@@ -169,19 +182,61 @@ function getTrackerScriptPath() {
   return path.join(__dirname, '..', '..', 'tracker', 'aviation_tracker_discord_bot.py');
 }
 
+// [command, args] to run the tracker with args, or null if it can't be found
+function trackerCommand(args) {
+  const binaryPath = getTrackerBinaryPath();
+  if (binaryPath && fs.existsSync(binaryPath) && fs.statSync(binaryPath).isFile()) {
+    return [binaryPath, args];
+  }
+  const scriptPath = getTrackerScriptPath();
+  if (!fs.existsSync(scriptPath)) {
+    return null;
+  }
+  const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
+  return [pythonCmd, [scriptPath, ...args]];
+}
+
 // ─── Push a log line to the renderer ─────────────────────────────────────────
-function pushLog(line) {
-  logBuffer.push({ time: new Date().toLocaleTimeString(), text: line.trim() });
+function pushLog(line, level = 'info', time = new Date()) {
+  logBuffer.push({ time: time.toLocaleTimeString(), text: line.trim(), level });
   if (logBuffer.length > 200) logBuffer.shift(); // cap buffer
-  if (statusCallback) {
-    statusCallback({ running: trackerProcess !== null, logs: logBuffer });
-  }
+  notifyStatus();
 }
 
 function notifyStatus(extra = {}) {
   if (statusCallback) {
-    statusCallback({ running: trackerProcess !== null, logs: logBuffer, ...extra });
+    statusCallback({ running: trackerProcess !== null, logs: logBuffer, metrics: latestMetrics, ...extra });
+  }
+}
+
+// ─── Tracker event stream ─────────────────────────────────────────────────────
+// The tracker writes one JSON event per line. Anything else (startup errors
+// before the config is read, Python tracebacks) is shown as plain text.
+function handleTrackerLine(line) {
+  if (line.startsWith('{')) {
+    let event = null;
+    try { event = JSON.parse(line); } catch { /* fall through to plain text */ }
+    if (event && event.msg !== undefined) {
+      if (event.event === 'metrics') {
+        latestMetrics = event;
+        notifyStatus();
+        return;
+      }
+      pushLog(event.msg, event.level, event.t ? new Date(event.t * 1000) : new Date());
+      return;
+    }
   }
+  pushLog(line);
+}
+
+// Split a stream into whole lines; chunks can end mid-line
+function lineReader(onLine) {
+  let pending = '';
+  return (data) => {
+    const lines = (pending + data.toString()).split('\n');
+    pending = lines.pop();
+    lines.filter(l => l.trim()).forEach(onLine);
+  };
 }
 
 // ─── Start tracker ─────────────────────────────────────────────────────────────
@@ -206,43 +261,32 @@ async function startTracker(token) {
     pushLog(`Config written with ${config.aircraft.tail_numbers.length} aircraft.`);
     pushLog(`Monitoring ${config.airspace.name} within ${config.airspace.query_radius_nm}nm.`);
 
-    // Determine how to launch
-    const binaryPath = getTrackerBinaryPath();
-    let proc;
-
-    if (binaryPath && fs.existsSync(binaryPath)) {
-      // Production: use compiled binary
-      proc = spawn(binaryPath, [configPath], { stdio: ['ignore', 'pipe', 'pipe'] });
-      pushLog('Starting tracker binary...');
-    } else {
-      // Development: use python
-      const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
-      const scriptPath = getTrackerScriptPath();
-      if (!fs.existsSync(scriptPath)) {
-        return { success: false, error: `Tracker script not found at: ${scriptPath}` };
-      }
-      proc = spawn(pythonCmd, [scriptPath, configPath], { stdio: ['ignore', 'pipe', 'pipe'] });
-      pushLog('Starting tracker (dev mode via Python)...');
+    // Production: compiled binary; development: python
+    const command = trackerCommand([configPath, '--stdin-control']);
+    if (!command) {
+      return { success: false, error: `Tracker script not found at: ${getTrackerScriptPath()}` };
     }
+    // stdin carries the stop request on Windows, which has no SIGTERM
+    const proc = spawn(command[0], command[1], { stdio: ['pipe', 'pipe', 'pipe'] });
+    pushLog(command[1][0] === configPath ? 'Starting tracker binary...' : 'Starting tracker (dev mode via Python)...');
 
     trackerProcess = proc;
+    latestMetrics = null;
 
-    proc.stdout.on('data', (data) => {
-      data.toString().split('\n').filter(l => l.trim()).forEach(pushLog);
-    });
-
-    proc.stderr.on('data', (data) => {
-      data.toString().split('\n').filter(l => l.trim()).forEach(l => pushLog(`⚠ ${l}`));
-    });
+    proc.stdin.on('error', () => {}); // the tracker may exit before reading a stop request
+    proc.stdout.on('data', lineReader(handleTrackerLine));
+    proc.stderr.on('data', lineReader(l => pushLog(`⚠ ${l}`, 'warn')));
 
     proc.on('close', (code) => {
-      trackerProcess = null;
+      clearTimeout(proc.killTimer);
+      // A stopped tracker can still be flushing after a new one has started
+      if (trackerProcess === proc) trackerProcess = null;
       pushLog(code === 0 ? 'Tracker stopped.' : `Tracker exited with code ${code}.`);
       notifyStatus();
     });
 
     proc.on('error', (err) => {
-      trackerProcess = null;
+      if (trackerProcess === proc) trackerProcess = null;
       pushLog(`Failed to start tracker: ${err.message}`);
       notifyStatus({ error: err.message });
     });
@@ -256,17 +300,56 @@ async function startTracker(token) {
   }
 }
 
+// ─── Reload config into a running tracker ─────────────────────────────────────
+// The tracker watches its config file and keeps aircraft state across
+// reloads, so settings changes don't need a restart.
+async function reloadTracker(token) {
+  if (!trackerProcess) {
+    return { success: false, error: 'Tracker is not running' };
+  }
+  try {
+    const config = await buildTrackerConfig(token);
+    if (!config.aircraft.tail_numbers.length) {
+      return { success: false, error: 'No aircraft configured. Add aircraft in the Aircraft tab first.' };
+    }
+    writeConfig(config);
+    if (process.platform !== 'win32') {
+      trackerProcess.kill('SIGHUP'); // apply now instead of on the next poll
+    }
+    pushLog('Configuration updated.');
+    return { success: true };
+  } catch (err) {
+    pushLog(`Error reloading tracker config: ${err.message}`);
+    return { success: false, error: err.message };
+  }
+}
+
 // ─── Stop tracker ─────────────────────────────────────────────────────────────
+// The tracker flushes queued webhook alerts, flight history and its state
+// snapshot before exiting, which can take up to 15s; it is only killed
+// outright if it hasn't exited by then.
+const STOP_TIMEOUT_MS = 20000;
+
+function forceKill(proc) {
+  if (process.platform === 'win32') {
+    spawn('taskkill', ['/pid', proc.pid.toString(), '/f', '/t']);
+  } else {
+    proc.kill('SIGKILL');
+  }
+}
+
 function stopTracker() {
   if (!trackerProcess) {
     return { success: false, error: 'Tracker is not running' };
   }
+  const proc = trackerProcess;
   try {
     if (process.platform === 'win32') {
-      spawn('taskkill', ['/pid', trackerProcess.pid.toString(), '/f', '/t']);
+      proc.stdin.end(JSON.stringify({ cmd: 'stop' }) + '\n');
     } else {
-      trackerProcess.kill('SIGTERM');
+      proc.kill('SIGTERM');
     }
+    proc.killTimer = setTimeout(() => forceKill(proc), STOP_TIMEOUT_MS);
     trackerProcess = null;
     pushLog('Tracker stopped by user.');
     notifyStatus();
@@ -276,13 +359,54 @@ function stopTracker() {
   }
 }
 
+// ─── Flight history ───────────────────────────────────────────────────────────
+// kind is approaches, movements, track or events; options.aircraft is a tail
+// number or icao24, options.since/until are YYYY-MM-DD. Runs a one-off
+// tracker process against the history the running tracker writes.
+function queryHistory(kind, options = {}) {
+  return new Promise((resolve) => {
+    const configPath = getConfigPath();
+    if (!fs.existsSync(configPath)) {
+      resolve({ success: false, error: 'Start the tracker once to begin recording history.' });
+      return;
+    }
+    const args = [configPath, '--history', kind];
+    if (options.aircraft) args.push('--aircraft', options.aircraft);
+    if (options.since) args.push('--since', options.since);
+    if (options.until) args.push('--until', options.until);
+
+    const command = trackerCommand(args);
+    if (!command) {
+      resolve({ success: false, error: 'Tracker not found' });
+      return;
+    }
+
+    let output = '';
+    const proc = spawn(command[0], command[1], { stdio: ['ignore', 'pipe', 'pipe'] });
+    proc.stdout.on('data', (chunk) => (output += chunk));
+    proc.on('error', (err) => resolve({ success: false, error: err.message }));
+    proc.on('close', (code) => {
+      // The result is the last line; anything before it is log output
+      const lines = output.trim().split('\n');
+      const last = lines[lines.length - 1] || '';
+      if (code === 0) {
+        try { resolve({ success: true, data: JSON.parse(last) }); return; }
+        catch { /* fall through */ }
+      }
+      let error = last || `History query exited with code ${code}`;
+      try { error = JSON.parse(last).msg || error; } catch { /* plain text */ }
+      resolve({ success: false, error });
+    });
+  });
+}
+
 // ─── Status ────────────────────────────────────────────────────────────────────
 function getStatus() {
-  return { running: trackerProcess !== null, logs: logBuffer };
+  return { running: trackerProcess !== null, logs: logBuffer, metrics: latestMetrics };
 }
 
 function onStatusChange(cb) {
   statusCallback = cb;
 }
 
-module.exports = { startTracker, stopTracker, getStatus, onStatusChange };
+module.exports = { startTracker, stopTracker, reloadTracker, queryHistory, getStatus, onStatusChange };
@@ -162,6 +162,7 @@ export default function AircraftManager() {
         showMessage('success', `${form.tail_number.toUpperCase()} added successfully`);
       }
       await loadAircraft();
+      APIService.reloadTracker();
       cancel();
     } catch (err) {
       showMessage('error', err.response?.data?.detail || 'Failed to save aircraft');
@@ -176,6 +177,7 @@ export default function AircraftManager() {
     try {
       await APIService.deleteAircraft(id);
       setAircraft(prev => prev.filter(a => a.id !== id));
+      APIService.reloadTracker();
       showMessage('success', `${tailNum} removed`);
     } catch (err) {
       showMessage('error', 'Failed to remove aircraft');
@@ -63,6 +63,7 @@ export default function AirportConfig() {
     setMessage({ type: '', text: '' });
     try {
       await APIService.updateAirportConfig(config);
+      APIService.reloadTracker();
       setMessage({ type: 'success', text: 'Configuration saved successfully!' });
     } catch (error) {
       setMessage({ type: 'error', text: error.response?.data?.detail || 'Failed to save configuration' });
@@ -111,6 +111,7 @@ export default function AlertSettings() {
         await APIService.updateAlertSetting(`${alert.distance}nm`, alert.enabled, alert.message);
       }
       await APIService.updateAlertSetting('landing', landingAlert.enabled, landingAlert.message);
+      APIService.reloadTracker();
       setMessage({ type: 'success', text: 'Alert settings saved successfully!' });
     } catch (error) {
       setMessage({ type: 'error', text: error.response?.data?.detail || 'Failed to save settings' });
@@ -8,6 +8,7 @@ import Integrations from './Integrations';
 import AccountDashboard from './AccountDashboard';
 import AircraftManager from './AircraftManager';
 import TrackerStatus from './TrackerStatus';
+import FlightHistory from './FlightHistory';
 
 const s = {
   shell: {
@@ -57,11 +58,12 @@ const s = {
   content: { padding: '32px' },
 };
 
-// Dashboard home — tracker panel + account info
+// Dashboard home — tracker panel, flight history + account info
 function DashboardHome() {
   return (
     <>
       <TrackerStatus />
+      <FlightHistory />
       <AccountDashboard />
     </>
   );
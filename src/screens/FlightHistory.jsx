@@ -0,0 +1,155 @@
+import React, { useState, useEffect } from 'react';
+import { History, Search, AlertCircle, Loader } from 'lucide-react';
+
+const s = {
+  card: {
+    background: '#1a2030',
+    border: '1px solid #2d3748',
+    borderRadius: '14px',
+    padding: '24px',
+    marginBottom: '20px',
+    fontFamily: "'Segoe UI', system-ui, sans-serif",
+  },
+  titleRow: { display: 'flex', alignItems: 'center', gap: '12px', marginBottom: '20px' },
+  iconWrap: {
+    width: '44px', height: '44px', borderRadius: '12px', background: '#3b82f620',
+    display: 'flex', alignItems: 'center', justifyContent: 'center', flexShrink: 0,
+  },
+  title: { fontSize: '18px', fontWeight: '700', color: '#f9fafb', margin: '0 0 2px 0' },
+  subtitle: { fontSize: '12px', color: '#9ca3af', margin: 0 },
+  sectionLabel: {
+    fontSize: '11px', color: '#6b7280', textTransform: 'uppercase',
+    letterSpacing: '0.06em', margin: '0 0 8px 0',
+  },
+  bars: { display: 'flex', alignItems: 'flex-end', gap: '3px', height: '80px', marginBottom: '6px' },
+  bar: (height) => ({
+    flex: 1, minWidth: '4px', height: `${height}%`, minHeight: '2px',
+    background: '#0ea5e9', borderRadius: '3px 3px 0 0',
+  }),
+  barCaption: { fontSize: '12px', color: '#9ca3af', margin: '0 0 20px 0' },
+  searchRow: { display: 'flex', gap: '10px', marginBottom: '14px' },
+  input: {
+    flex: 1, padding: '10px 12px', borderRadius: '10px', fontSize: '13px',
+    background: '#0f1117', border: '1px solid #1f2937', color: '#f9fafb', outline: 'none',
+  },
+  searchBtn: (disabled) => ({
+    display: 'flex', alignItems: 'center', gap: '8px',
+    padding: '10px 16px', borderRadius: '10px', border: 'none', fontSize: '13px', fontWeight: '600',
+    cursor: disabled ? 'not-allowed' : 'pointer',
+    background: disabled ? '#1f2937' : 'linear-gradient(135deg, #0ea5e9, #0284c7)',
+    color: disabled ? '#4b5563' : '#fff',
+  }),
+  row: {
+    display: 'flex', justifyContent: 'space-between', gap: '12px',
+    padding: '9px 12px', borderRadius: '8px', marginBottom: '6px',
+    background: '#111827', border: '1px solid #1f2937', fontSize: '13px', color: '#d1d5db',
+  },
+  muted: { color: '#6b7280' },
+  empty: { color: '#4b5563', fontSize: '13px', margin: '4px 0' },
+  errorBox: {
+    display: 'flex', alignItems: 'flex-start', gap: '10px',
+    padding: '12px 14px', borderRadius: '10px', marginBottom: '14px',
+    background: '#ef444415', border: '1px solid #ef444430', color: '#fca5a5', fontSize: '13px',
+  },
+};
+
+const formatTime = (t) => new Date(t * 1000).toLocaleString([], {
+  month: 'short', day: 'numeric', hour: '2-digit', minute: '2-digit',
+});
+
+export default function FlightHistory() {
+  const [movements, setMovements] = useState([]);
+  const [aircraft, setAircraft] = useState('');
+  const [approaches, setApproaches] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState('');
+
+  useEffect(() => {
+    if (!window.electronAPI) return;
+    window.electronAPI.trackerHistory('movements').then((result) => {
+      if (result.success) setMovements(result.data);
+    });
+  }, []);
+
+  const handleSearch = async () => {
+    setError('');
+    setLoading(true);
+    try {
+      const result = await window.electronAPI.trackerHistory('approaches', { aircraft: aircraft.trim() });
+      if (result.success) {
+        setApproaches(result.data.slice().reverse());
+      } else {
+        setError(result.error || 'History query failed.');
+      }
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const peak = Math.max(1, ...movements.map(d => d.landings + d.takeoffs));
+  const landings = movements.reduce((n, d) => n + d.landings, 0);
+  const takeoffs = movements.reduce((n, d) => n + d.takeoffs, 0);
+
+  return (
+    <div style={s.card}>
+      <div style={s.titleRow}>
+        <div style={s.iconWrap}>
+          <History size={20} color="#60a5fa" />
+        </div>
+        <div>
+          <p style={s.title}>Flight History</p>
+          <p style={s.subtitle}>Movements and approaches recorded by the tracker</p>
+        </div>
+      </div>
+
+      {/* Movements per day, last 30 days */}
+      <p style={s.sectionLabel}>Last 30 days</p>
+      {movements.length === 0
+        ? <p style={{ ...s.empty, marginBottom: '20px' }}>No movements recorded yet.</p>
+        : <>
+            <div style={s.bars}>
+              {movements.map(d => (
+                <div key={d.date} style={s.bar(100 * (d.landings + d.takeoffs) / peak)}
+                     title={`${d.date}: ${d.landings} landings, ${d.takeoffs} takeoffs`} />
+              ))}
+            </div>
+            <p style={s.barCaption}>{landings} landings, {takeoffs} takeoffs</p>
+          </>
+      }
+
+      {/* Approaches for one aircraft */}
+      <p style={s.sectionLabel}>Approaches</p>
+      {error && (
+        <div style={s.errorBox}>
+          <AlertCircle size={15} style={{ flexShrink: 0, marginTop: 1 }} />
+          <span>{error}</span>
+        </div>
+      )}
+      <div style={s.searchRow}>
+        <input
+          style={s.input}
+          placeholder="Tail number, e.g. N123AB"
+          value={aircraft}
+          onChange={(e) => setAircraft(e.target.value)}
+          onKeyDown={(e) => e.key === 'Enter' && aircraft.trim() && handleSearch()}
+        />
+        <button style={s.searchBtn(!aircraft.trim() || loading)} onClick={handleSearch}
+                disabled={!aircraft.trim() || loading}>
+          {loading
+            ? <Loader size={14} style={{ animation: 'spin 1s linear infinite' }} />
+            : <Search size={14} />}
+          Search
+        </button>
+      </div>
+      {approaches && approaches.length === 0 && <p style={s.empty}>No approaches in the last 30 days.</p>}
+      {approaches && approaches.map(a => (
+        <div key={a.landed_at} style={s.row}>
+          <span>{formatTime(a.landed_at)}{a.retracted && <span style={s.muted}> · retracted</span>}</span>
+          <span style={s.muted}>{a.detail} · {a.path.length} positions</span>
+        </div>
+      ))}
+    </div>
+  );
+}
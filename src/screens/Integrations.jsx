@@ -95,6 +95,7 @@ export default function Integrations() {
       } else {
         await APIService.updateIntegration(integration.id, integration.config, integration.enabled);
       }
+      APIService.reloadTracker();
       setMessage({ type: 'success', text: 'Integration saved successfully!' });
       setTimeout(() => setMessage({ type: '', text: '' }), 3000);
     } catch (error) {
@@ -120,6 +121,7 @@ export default function Integrations() {
     try {
       if (!integration.isNew) await APIService.deleteIntegration(integration.id);
       setIntegrations(prev => prev.filter(i => i.id !== integration.id));
+      APIService.reloadTracker();
       setMessage({ type: 'success', text: 'Integration removed' });
       setTimeout(() => setMessage({ type: '', text: '' }), 3000);
     } catch {
@@ -67,10 +67,10 @@ const s = {
     color: '#4b5563', textAlign: 'center',
     marginTop: '80px', fontSize: '13px',
   },
-  logLine: (text) => ({
-    color: text.startsWith('⚠') ? '#fbbf24'
+  logLine: (text, level) => ({
+    color: level === 'error' || text.startsWith('✗') ? '#f87171'
+         : level === 'warn' || text.startsWith('⚠') ? '#fbbf24'
          : text.startsWith('✓') ? '#34d399'
-         : text.startsWith('✗') ? '#f87171'
          : text.startsWith('🛬') ? '#60a5fa'
          : '#9ca3af',
     margin: 0, padding: '1px 0',
@@ -95,6 +95,7 @@ const s = {
 export default function TrackerStatus() {
   const [running, setRunning] = useState(false);
   const [logs, setLogs] = useState([]);
+  const [metrics, setMetrics] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const logRef = useRef(null);
@@ -105,12 +106,14 @@ export default function TrackerStatus() {
       window.electronAPI.trackerStatus().then((status) => {
         setRunning(status.running);
         setLogs(status.logs || []);
+        setMetrics(status.metrics || null);
       });
 
       // Subscribe to live updates from main process
       window.electronAPI.onTrackerStatus((status) => {
         setRunning(status.running);
         setLogs(status.logs || []);
+        setMetrics(status.metrics || null);
         if (status.error) setError(status.error);
       });
 
@@ -202,12 +205,34 @@ export default function TrackerStatus() {
         </button>
       </div>
 
+      {/* Metrics from the tracker's periodic stats event */}
+      {running && metrics && (
+        <div style={s.infoRow}>
+          <div style={s.infoChip}>Polls: {metrics.polls || 0}</div>
+          {metrics.poll_seconds_p95 != null && (
+            <div style={s.infoChip}>
+              {/* '+Inf': past the tracker's largest latency bucket (10s) */}
+              Poll p95: {metrics.poll_seconds_p95 === '+Inf'
+                ? '>10s'
+                : `≤${Math.round(metrics.poll_seconds_p95 * 1000)}ms`}
+            </div>
+          )}
+          <div style={s.infoChip}>ADS-B: {((metrics.adsb_wire_bytes || 0) / 1024 / 1024).toFixed(1)}MB</div>
+          <div style={s.infoChip}>Alerts sent: {metrics.alerts_sent || 0}</div>
+          <div style={s.infoChip}>
+            Webhook failures: {Object.keys(metrics)
+              .filter(k => k.startsWith('webhook_failed'))
+              .reduce((n, k) => n + metrics[k], 0)}
+          </div>
+        </div>
+      )}
+
       {/* Live log */}
       <div style={s.logBox} ref={logRef}>
         {logs.length === 0
           ? <p style={s.logEmpty}>No activity yet. Start the tracker to see live output.</p>
           : logs.map((line, i) => (
-              <p key={i} style={s.logLine(line.text)}>
+              <p key={i} style={s.logLine(line.text, line.level)}>
                 <span style={{ color: '#4b5563', marginRight: '8px' }}>{line.time}</span>
                 {line.text}
               </p>
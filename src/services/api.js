@@ -142,6 +142,12 @@ class APIService {
     const response = await this.client.get('/health');
     return response.data;
   }
+
+  // Push saved settings to a running tracker (no-op outside Electron or when stopped)
+  async reloadTracker() {
+    if (typeof window === 'undefined' || !window.electronAPI?.trackerReload) return null;
+    return window.electronAPI.trackerReload(this.token);
+  }
 }
 
 export default new APIService();
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+ADS-B fetching for FinalPing
+
+Gets tracked aircraft from adsb.lol with whichever costs fewer bytes: one
+/lat/lon/dist area query, or a /hex lookup per tracked aircraft. Response
+bodies are parsed as they stream in and only `ac` entries for tracked hex
+codes are kept, so a busy area doesn't become a multi-megabyte list in
+memory. ETag/Last-Modified validators are sent back when the server
+provides them, and a 304 reuses the previous result.
+
+monitoring.fetch_strategy picks 'auto' (default), 'area' or 'hex', and
+monitoring.adsb_api can point at another adsb.lol-compatible v2 API.
+"""
+
+import asyncio
+import codecs
+import json
+import time
+from collections import namedtuple
+
+from airspace_geometry import haversine_nm
+from fleet_registry import normalize_icao24
+from metrics import METRICS
+
+ADSB_API = 'https://api.adsb.lol/v2'
+
+# Rough HTTP request+response header cost, counted against each request
+REQUEST_OVERHEAD_BYTES = 600
+
+# Starting guess for one /hex response until we've measured some
+DEFAULT_HEX_BYTES = 700.0
+
+# Re-measure the area query this often while using per-hex lookups, so a
+# quieter sky can switch us back
+AREA_REPROBE_POLLS = 60
+
+# Weight of the newest sample in the byte-cost moving averages
+EWMA_ALPHA = 0.3
+
+# With a parse pool (supervisor), bodies this big are parsed in a worker
+# process; smaller ones cost less to parse than to ship there
+POOL_PARSE_MIN_BYTES = 256 * 1024
+
+FetchStats = namedtuple('FetchStats', ['strategy', 'requests', 'wire_bytes', 'parse_ms', 'not_modified'])
+
+
+def within_radius(found, lat, lon, radius):
+    """Drop aircraft whose reported position is more than radius nm away"""
+    return {
+        hex_code: aircraft for hex_code, aircraft in found.items()
+        if aircraft.get('lat') is None or aircraft.get('lon') is None
+        or haversine_nm(lat, lon, aircraft['lat'], aircraft['lon']) <= radius
+    }
+
+
+class AcStreamFilter:
+    """Incrementally parses an adsb.lol JSON body, keeping wanted `ac` entries.
+
+    Feed decoded text as it arrives. Each aircraft object is decoded on its
+    own and dropped unless its hex is wanted (wanted=None keeps all).
+    """
+
+    def __init__(self, wanted):
+        self.wanted = wanted
+        self.found = {}
+        self.done = False
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._in_array = False
+
+    def feed(self, text):
+        if self.done:
+            return
+        buf = self._buf + text
+        pos = 0
+
+        if not self._in_array:
+            key = buf.find('"ac"')
+            start = buf.find('[', key) if key >= 0 else -1
+            if start < 0:
+                # Keep enough of the tail to match a key split across chunks
+                self._buf = buf[key:] if key >= 0 else buf[-4:]
+                return
+            self._in_array = True
+            pos = start + 1
+
+        length = len(buf)
+        while True:
+            while pos < length and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= length:
+                break
+            if buf[pos] == ']':
+                self.done = True
+                break
+            try:
+                aircraft, pos_end = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                break  # object continues in the next chunk
+            hex_code = normalize_icao24(aircraft.get('hex'))
+            if self.wanted is None or hex_code in self.wanted:
+                self.found[hex_code] = aircraft
+            pos = pos_end
+
+        self._buf = buf[pos:]
+
+    def finish(self):
+        if self._in_array and not self.done and self._buf.strip():
+            raise ValueError("Truncated ADS-B response")
+
+
+def parse_body(data, wanted):
+    """{hex: entry} for wanted aircraft in a whole response body; runs in pool workers"""
+    stream = AcStreamFilter(wanted)
+    stream.feed(data.decode('utf-8', errors='replace'))
+    stream.finish()
+    return stream.found
+
+
+class AdsbFetcher:
+    """Fetches tracked aircraft using the cheaper adsb.lol endpoint"""
+
+    def __init__(self, http, api=ADSB_API):
+        self.http = http
+        self.api = api
+        self.recorder = None  # replay.TraceRecorder when --record is used
+        self.parse_pool = None  # ProcessPoolExecutor shared by supervised trackers
+        # url -> (etag, last_modified, found, raw_body), for the current wanted set; raw_body
+        # is kept while recording so a 304 poll is recorded with the body it stands for
+        self._validators = {}
+        self._wanted = None
+        self.area_bytes = None
+        self.hex_bytes = DEFAULT_HEX_BYTES
+        self.polls_since_area = 0
+        self.last = None
+        self.totals = {'polls': 0, 'requests': 0, 'wire_bytes': 0, 'parse_ms': 0.0, 'not_modified': 0}
+
+    def choose(self, count, strategy='auto'):
+        """'area' or 'hex' for a fleet of count aircraft"""
+        if strategy in ('area', 'hex'):
+            return strategy
+        if self.area_bytes is None or self.polls_since_area >= AREA_REPROBE_POLLS:
+            return 'area'
+        hex_cost = count * (self.hex_bytes + REQUEST_OVERHEAD_BYTES)
+        return 'hex' if hex_cost < self.area_bytes + REQUEST_OVERHEAD_BYTES else 'area'
+
+    async def fetch(self, lat, lon, radius, wanted, strategy='auto'):
+        """Return {hex: raw adsb.lol entry} for wanted aircraft within radius nm"""
+        strategy = self.choose(len(wanted), strategy)
+        if wanted != self._wanted:
+            # Cached results were filtered for the old fleet; a 304 must not bring them back
+            self._validators.clear()
+            self._wanted = wanted
+
+        if strategy == 'area':
+            urls = [f"{self.api}/lat/{lat}/lon/{lon}/dist/{radius}"]
+        else:
+            urls = [f"{self.api}/hex/{hex_code}" for hex_code in sorted(wanted)]
+        results = await asyncio.gather(*(self.http.run(self._get_filtered, url, wanted) for url in urls))
+
+        if self.recorder is not None:
+            self.recorder.write([(url, r[4]) for url, r in zip(urls, results) if r[4] is not None])
+
+        found = {}
+        for partial, _, _, _, _ in results:
+            found.update(partial)
+        if strategy == 'hex':
+            # Per-hex lookups return aircraft anywhere; keep the area semantics
+            found = within_radius(found, lat, lon, radius)
+
+        self._record(strategy, results)
+        return found
+
+    def _record(self, strategy, results):
+        wire_bytes = sum(r[1] for r in results)
+        # Body bytes only; choose() adds the per-request overhead
+        fresh = [r[1] - REQUEST_OVERHEAD_BYTES for r in results if not r[3]]
+        if fresh:
+            per_request = sum(fresh) / len(fresh)
+            if strategy == 'area':
+                self.area_bytes = per_request if self.area_bytes is None else \
+                    EWMA_ALPHA * per_request + (1 - EWMA_ALPHA) * self.area_bytes
+            else:
+                self.hex_bytes = EWMA_ALPHA * per_request + (1 - EWMA_ALPHA) * self.hex_bytes
+        self.polls_since_area = 0 if strategy == 'area' else self.polls_since_area + 1
+
+        self.last = FetchStats(
+            strategy, len(results), wire_bytes,
+            sum(r[2] for r in results) * 1000, sum(1 for r in results if r[3]),
+        )
+        self.totals['polls'] += 1
+        self.totals['requests'] += self.last.requests
+        self.totals['wire_bytes'] += wire_bytes
+        self.totals['parse_ms'] += self.last.parse_ms
+        self.totals['not_modified'] += self.last.not_modified
+
+        METRICS.inc('adsb_requests', self.last.requests, strategy=strategy)
+        METRICS.inc('adsb_wire_bytes', wire_bytes)
+        METRICS.inc('adsb_not_modified', self.last.not_modified)
+
+    def _get_filtered(self, url, wanted):
+        """Blocking GET + streaming filter.
+
+        Returns (found, wire_bytes, parse_s, not_modified, raw_body); raw_body
+        is only kept while recording.
+        """
+        headers = {}
+        cached = self._validators.get(url)
+        if cached and self.recorder is not None and cached[3] is None:
+            # Cached before recording started: fetch the body again
+            cached = None
+        if cached:
+            if cached[0]:
+                headers['If-None-Match'] = cached[0]
+            if cached[1]:
+                headers['If-Modified-Since'] = cached[1]
+
+        session = self.http.session
+        with session.get(url, headers=headers, stream=True, timeout=self.http.timeout) as r:
+            if r.status_code == 304 and cached:
+                return cached[2], REQUEST_OVERHEAD_BYTES, 0.0, True, cached[3]
+            r.raise_for_status()
+
+            if self.parse_pool is not None:
+                found, body_bytes, parse_s, raw = self._parse_whole(r, wanted)
+            else:
+                found, body_bytes, parse_s, raw = self._parse_streaming(r, wanted)
+
+            # Bytes off the wire (compressed) when urllib3 can tell us
+            try:
+                wire_bytes = r.raw.tell() or body_bytes
+            except Exception:
+                wire_bytes = body_bytes
+
+            etag = r.headers.get('ETag')
+            last_modified = r.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._validators[url] = (etag, last_modified, found, raw)
+
+        return found, wire_bytes + REQUEST_OVERHEAD_BYTES, parse_s, False, raw
+
+    def _parse_streaming(self, r, wanted):
+        """Parse the body as it arrives; (found, body_bytes, parse_s, raw_text)"""
+        stream = AcStreamFilter(wanted)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        raw = [] if self.recorder is not None else None
+        body_bytes = 0
+        parse_s = 0.0
+        for chunk in r.iter_content(chunk_size=65536):
+            body_bytes += len(chunk)
+            started = time.perf_counter()
+            text = decoder.decode(chunk)
+            stream.feed(text)
+            parse_s += time.perf_counter() - started
+            if raw is not None:
+                raw.append(text)
+        stream.finish()
+        return stream.found, body_bytes, parse_s, ''.join(raw) if raw is not None else None
+
+    def _parse_whole(self, r, wanted):
+        """Read the whole body and parse it, big ones in the parse pool"""
+        body = r.content
+        started = time.perf_counter()
+        if len(body) >= POOL_PARSE_MIN_BYTES:
+            found = self.parse_pool.submit(parse_body, body, wanted).result()
+        else:
+            found = parse_body(body, wanted)
+        parse_s = time.perf_counter() - started
+        raw = body.decode('utf-8', errors='replace') if self.recorder is not None else None
+        return found, len(body), parse_s, raw
+
+    def summary(self):
+        """One-line cumulative stats"""
+        t = self.totals
+        polls = max(1, t['polls'])
+        return (f"{t['polls']} polls, {t['requests']} requests, "
+                f"{t['wire_bytes'] / polls / 1024:.1f}KB/poll, "
+                f"parse {t['parse_ms'] / polls:.1f}ms/poll, {t['not_modified']} not modified")
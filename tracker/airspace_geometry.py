@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Batched airspace geometry for FinalPing
+
+Computes distance, bearing, closure rate and airspace membership for every
+aircraft in a poll in one pass, vectorised with NumPy when it is installed
+and the poll is big enough to benefit, and with plain math otherwise. NumPy
+is only imported the first time a poll needs it, so small fleets never pay
+its import time at startup. The tracker computes this once per poll and the
+state machine and status logging both read from it.
+
+With geofences (see geofence), each row also carries the bit mask of fences
+the aircraft is inside, and airspace fences replace the radius_nm circle
+for in_airspace.
+"""
+
+from collections import namedtuple
+from math import radians, degrees, cos, sin, asin, atan2, sqrt
+
+np = None
+_numpy_checked = False
+
+EARTH_RADIUS_NM = 3440.065
+FT_PER_M = 3.28084
+
+# Below this many aircraft plain math beats NumPy's per-call overhead
+NUMPY_MIN_AIRCRAFT = 64
+
+# One row per aircraft. distance_nm/bearing_deg are None when the aircraft has
+# no position; closure_kts is None until there is a previous distance to
+# compare against (positive means closing on the field). fences is a
+# geofence bit mask.
+AircraftGeometry = namedtuple('AircraftGeometry', [
+    'distance_nm', 'bearing_deg', 'closure_kts',
+    'altitude_msl_ft', 'altitude_agl_ft', 'in_airspace', 'fences',
+])
+
+
+def haversine_nm(lat1, lon1, lat2, lon2):
+    """Great-circle distance in nautical miles"""
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    return 2 * EARTH_RADIUS_NM * asin(sqrt(min(1.0, a)))
+
+
+def compute_geometry(airspace, aircraft_list, prev_distances, elapsed_seconds, fences=None):
+    """Geometry for every aircraft in a poll.
+
+    prev_distances and elapsed_seconds run parallel to aircraft_list and hold
+    the last known distance and the seconds since it was taken (None if
+    unknown). fences is a geofence.FenceIndex, or None. Returns a list of
+    AircraftGeometry in the same order.
+    """
+    if not aircraft_list:
+        return []
+    if not fences:
+        fences = None
+    if len(aircraft_list) >= NUMPY_MIN_AIRCRAFT and _load_numpy():
+        return _compute_numpy(airspace, aircraft_list, prev_distances, elapsed_seconds, fences)
+    return _compute_python(airspace, aircraft_list, prev_distances, elapsed_seconds, fences)
+
+
+def _load_numpy():
+    """Import NumPy on first use; False if it isn't installed"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+    return np is not None
+
+
+def _airspace_params(airspace):
+    return (
+        airspace['center_lat'], airspace['center_lon'], airspace['radius_nm'],
+        airspace.get('field_elevation_ft_msl', 0),
+        airspace.get('floor_ft_agl', 0), airspace.get('ceiling_ft_agl', 3000),
+    )
+
+
+def _compute_numpy(airspace, aircraft_list, prev_distances, elapsed_seconds, fences):
+    center_lat, center_lon, radius_nm, field_elevation, floor_agl, ceiling_agl = _airspace_params(airspace)
+    nan = float('nan')
+
+    lat = np.array([nan if ac['latitude'] is None else ac['latitude'] for ac in aircraft_list], dtype=float)
+    lon = np.array([nan if ac['longitude'] is None else ac['longitude'] for ac in aircraft_list], dtype=float)
+    alt_m = np.array([nan if ac['baro_altitude'] is None else ac['baro_altitude'] for ac in aircraft_list], dtype=float)
+    on_ground = np.array([bool(ac['on_ground']) for ac in aircraft_list])
+    prev = np.array([nan if d is None else d for d in prev_distances], dtype=float)
+    elapsed = np.array([nan if e is None else e for e in elapsed_seconds], dtype=float)
+
+    lat1 = radians(center_lat)
+    lat2 = np.radians(lat)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon - center_lon)
+
+    a = np.sin(dlat / 2) ** 2 + cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    distance = 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    bearing = (np.degrees(np.arctan2(
+        np.sin(dlon) * np.cos(lat2),
+        cos(lat1) * np.sin(lat2) - sin(lat1) * np.cos(lat2) * np.cos(dlon),
+    )) + 360.0) % 360.0
+
+    has_alt = ~np.isnan(alt_m)
+    msl_ft = np.where(has_alt, alt_m * FT_PER_M, 0.0)
+    agl_ft = np.where(has_alt, msl_ft - field_elevation, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        in_vertical = np.where(has_alt, (floor_agl <= agl_ft) & (agl_ft <= ceiling_agl), on_ground)
+        in_airspace = (distance <= radius_nm) & in_vertical
+        closure = np.where(elapsed > 0, (prev - distance) / (elapsed / 3600.0), nan)
+
+    has_pos = ~np.isnan(distance)
+    has_closure = ~np.isnan(closure)
+    rows = [
+        AircraftGeometry(
+            d if p else None, b if p else None, c if hc else None, m, g, bool(ia), 0,
+        )
+        for d, b, c, m, g, ia, p, hc in zip(
+            distance.tolist(), bearing.tolist(), closure.tolist(),
+            msl_ft.tolist(), agl_ft.tolist(), in_airspace.tolist(),
+            has_pos.tolist(), has_closure.tolist(),
+        )
+    ]
+    if fences is None:
+        return rows
+
+    # Same flat frame as motion_model.project
+    x = ((lon - center_lon) * 60.0 * cos(lat1)).tolist()
+    y = ((lat - center_lat) * 60.0).tolist()
+    for i, (row, ac, has_a) in enumerate(zip(rows, aircraft_list, has_alt.tolist())):
+        if row.distance_nm is not None:
+            rows[i] = _with_fences(row, fences, x[i], y[i], row.altitude_agl_ft if has_a else None,
+                                   ac['on_ground'])
+    return rows
+
+
+def _with_fences(row, fences, x, y, altitude_agl_ft, on_ground):
+    mask = fences.containing(x, y, altitude_agl_ft, on_ground)
+    in_airspace = bool(mask & fences.airspace_mask) if fences.airspace_mask else row.in_airspace
+    return row._replace(in_airspace=in_airspace, fences=mask)
+
+
+def _compute_python(airspace, aircraft_list, prev_distances, elapsed_seconds, fences):
+    center_lat, center_lon, radius_nm, field_elevation, floor_agl, ceiling_agl = _airspace_params(airspace)
+    lat1 = radians(center_lat)
+    cos_lat1, sin_lat1 = cos(lat1), sin(lat1)
+
+    rows = []
+    for ac, prev, elapsed in zip(aircraft_list, prev_distances, elapsed_seconds):
+        alt_m = ac['baro_altitude']
+        if alt_m is not None:
+            msl_ft = alt_m * FT_PER_M
+            agl_ft = msl_ft - field_elevation
+            in_vertical = floor_agl <= agl_ft <= ceiling_agl
+        else:
+            msl_ft = agl_ft = 0
+            in_vertical = ac['on_ground']
+
+        if ac['latitude'] is None or ac['longitude'] is None:
+            rows.append(AircraftGeometry(None, None, None, msl_ft, agl_ft, False, 0))
+            continue
+
+        lat2 = radians(ac['latitude'])
+        dlat = lat2 - lat1
+        dlon = radians(ac['longitude'] - center_lon)
+        a = sin(dlat/2)**2 + cos_lat1 * cos(lat2) * sin(dlon/2)**2
+        distance = 2 * EARTH_RADIUS_NM * asin(sqrt(min(1.0, a)))
+        bearing = (degrees(atan2(sin(dlon) * cos(lat2),
+                                 cos_lat1 * sin(lat2) - sin_lat1 * cos(lat2) * cos(dlon))) + 360.0) % 360.0
+        closure = (prev - distance) / (elapsed / 3600.0) if prev is not None and elapsed else None
+
+        row = AircraftGeometry(
+            distance, bearing, closure, msl_ft, agl_ft,
+            distance <= radius_nm and bool(in_vertical), 0,
+        )
+        if fences is not None:
+            x = (ac['longitude'] - center_lon) * 60.0 * cos_lat1
+            y = (ac['latitude'] - center_lat) * 60.0
+            row = _with_fences(row, fences, x, y, agl_ft if alt_m is not None else None, ac['on_ground'])
+        rows.append(row)
+    return rows
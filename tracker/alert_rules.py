@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled distance alert rules for FinalPing
+
+Alert rules are compiled once per config load into a table of rings sorted
+by distance. Finding every ring an aircraft crossed between two samples is
+then a pair of binary searches, whatever the number of rings.
+
+alert_rules config (optional):
+  rings              distances (nm), or {distance_nm, min_agl_ft, max_agl_ft}
+                     to only alert inside an altitude band
+                     (default airspace.alert_distances_nm)
+  landing            {distance_nm, after_nm}: crossing distance_nm once every
+                     after_nm ring has alerted calls the landing (default 2nm
+                     after 10nm and 5nm when those rings exist; null for none)
+  reset_distance_nm  alerts re-arm once the aircraft is beyond this
+                     (default outermost ring + 2)
+
+aircraft.settings.<tail or icao24>.alert_rules overrides any of these keys
+for one aircraft.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+
+from track_table import alert_bit
+
+DEFAULT_DISTANCES = (10.0, 5.0, 2.0)
+
+# The sequential-approach landing call older configs get
+LEGACY_LANDING = {'distance_nm': 2.0, 'after_nm': [10.0, 5.0]}
+
+RESET_MARGIN_NM = 2.0
+
+# kind is 'alert' or 'landing'; requires is the alert-bit mask a landing
+# ring needs before it calls the landing instead of alerting
+Ring = namedtuple('Ring', ['distance_nm', 'label', 'min_agl_ft', 'max_agl_ft', 'kind', 'requires',
+                           'bit', 'cooldown_key'])
+
+
+class AlertRules:
+    """Rings sorted by distance, plus the reset threshold"""
+
+    __slots__ = ('distances', 'rings', 'reset_distance_nm', 'landing_path')
+
+    def __init__(self, rings, reset_distance_nm, landing_path=None):
+        rings = sorted(rings, key=lambda ring: ring.distance_nm)
+        self.rings = tuple(rings)
+        self.distances = [ring.distance_nm for ring in rings]
+        self.reset_distance_nm = reset_distance_nm
+        self.landing_path = landing_path  # e.g. "10nm -> 5nm -> 2nm"
+
+    def crossed(self, prev_distance, distance):
+        """Rings crossed inbound between two samples, outermost first"""
+        lo = bisect_left(self.distances, distance)
+        hi = bisect_left(self.distances, prev_distance)
+        return self.rings[lo:hi][::-1]
+
+    def boundaries(self):
+        """Distances (nm) where these rules can change an aircraft's status"""
+        return self.distances + [self.reset_distance_nm]
+
+
+def _label(distance):
+    return f"{distance:g}nm"
+
+
+def compile_rules(airspace, rules=None):
+    """AlertRules from an alert_rules section (None for the legacy rings)"""
+    rules = rules or {}
+    specs = rules.get('rings', airspace.get('alert_distances_nm', DEFAULT_DISTANCES))
+    if 'landing' in rules:
+        landing = rules['landing']
+    else:
+        distances = {float(s['distance_nm'] if isinstance(s, dict) else s) for s in specs}
+        legacy = {LEGACY_LANDING['distance_nm'], *LEGACY_LANDING['after_nm']}
+        landing = LEGACY_LANDING if legacy <= distances else None
+
+    landing_distance = float(landing['distance_nm']) if landing else None
+    requires = 0
+    if landing:
+        for distance in landing.get('after_nm', []):
+            requires |= alert_bit(distance)
+
+    by_distance = {}
+    for spec in specs:
+        if not isinstance(spec, dict):
+            spec = {'distance_nm': spec}
+        distance = float(spec['distance_nm'])
+        by_distance[distance] = spec
+    if landing_distance is not None and landing_distance not in by_distance:
+        by_distance[landing_distance] = {'distance_nm': landing_distance}
+
+    rings = []
+    for distance, spec in by_distance.items():
+        is_landing = distance == landing_distance
+        rings.append(Ring(
+            distance, _label(distance), spec.get('min_agl_ft'), spec.get('max_agl_ft'),
+            'landing' if is_landing else 'alert', requires if is_landing else 0,
+            alert_bit(distance), f"distance_{distance}",
+        ))
+
+    outermost = max(by_distance) if by_distance else 0.0
+    reset = float(rules.get('reset_distance_nm', outermost + RESET_MARGIN_NM))
+
+    landing_path = None
+    if landing:
+        path = sorted((float(d) for d in landing.get('after_nm', [])), reverse=True) + [landing_distance]
+        landing_path = ' -> '.join(_label(d) for d in path)
+    return AlertRules(rings, reset, landing_path)
+
+
+def compile_fleet_rules(config, registry):
+    """(fleet AlertRules, {icao24: AlertRules} for aircraft with overrides)"""
+    airspace = config['airspace']
+    base = config.get('alert_rules')
+    fleet = compile_rules(airspace, base)
+    overrides = {}
+    for entry in registry:
+        override = entry.settings.get('alert_rules')
+        if override:
+            overrides[entry.icao24] = compile_rules(airspace, {**(base or {}), **override})
+    return fleet, overrides
@@ -6,13 +6,39 @@ Tracks aircraft via ADS-B and sends notifications via webhooks
 (Discord, Slack, Microsoft Teams)
 """
 
+import argparse
 import json
+import os
 import sys
 import time
+import random
+import signal
 import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from math import radians, cos, sin, asin, sqrt
+
+import flight_history
+import landing_detector
+import receiver
+from adsb_fetch import ADSB_API, AdsbFetcher, within_radius
+from airspace_geometry import compute_geometry
+from alert_rules import compile_fleet_rules
+from config_reload import ConfigWatcher, diff_sections, install_reload_signal
+from event_log import DEBUG, INFO, configure as configure_logging, debug, emit, enabled, log
+from fleet_registry import FleetRegistry
+from flight_history import FlightHistory
+from geofence import compile_fences
+from metrics import METRICS, MetricsServer, log_metrics
+from motion_model import MotionState, project
+from poll_scheduler import REST_SLACK_SECONDS, PollScheduler
+from profiling import CAPTURE, PollProfiler, install_capture_signal
+from state_store import StateStore
+from track_table import TrackTable, ACTIVE, IN_AIRSPACE, ON_GROUND, GROUND_KNOWN, LANDED, LANDING_INFERRED
+from tracking_engine import TrackingEngine
 
 # Force UTF-8 output on Windows
 if sys.platform == 'win32':
@@ -21,155 +47,560 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
 
-def log(msg):
-    """Print with timestamp"""
-    print(f"{datetime.now().strftime('%H:%M:%S')} {msg}", flush=True)
+class HttpClient:
+    """Pooled keep-alive HTTP session shared by ADS-B fetches and webhook posts.
+
+    requests is blocking, so every call runs on a small dedicated thread pool
+    and the event loop never waits on the network.
+    """
+
+    def __init__(self, pool_size=8, timeout=10):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = 'FinalPing-Tracker'
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='http')
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call that uses the session on the HTTP thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def post(self, url, payload):
+        """POST a JSON payload and return the response without checking status"""
+        return await self.run(self.session.post, url, json=payload, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
+        self._executor.shutdown(wait=False)
+
+
+class WebhookDestination:
+    """Outbound queue and delivery worker for a single webhook.
+
+    Alerts that arrive within batch_window seconds of each other are
+    coalesced into one message. Failed posts are retried with exponential
+    backoff, and 429 responses wait out the server's Retry-After.
+    """
+
+    def __init__(self, name, url, payload_key, http, settings, max_chars):
+        self.name = name
+        self.url = url
+        self.payload_key = payload_key
+        self.http = http
+        self.max_chars = max_chars
+        self.queue_size = settings.get('queue_size', 100)
+        self.batch_window = settings.get('batch_window_seconds', 2.0)
+        self.max_batch = settings.get('max_batch', 10)
+        self.max_retries = settings.get('max_retries', 5)
+        self.backoff_base = settings.get('backoff_base_seconds', 1.0)
+        self.backoff_max = settings.get('backoff_max_seconds', 60.0)
+
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = None
+        self.latencies = deque(maxlen=200)
+        self.counters = {'queued': 0, 'sent': 0, 'batches': 0, 'failed': 0,
+                         'dropped': 0, 'retries': 0, 'rate_limited': 0}
+
+    def enqueue(self, message):
+        """Queue a message, dropping the oldest one if the queue is full"""
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.counters['dropped'] += 1
+            METRICS.inc('webhook_dropped', destination=self.name)
+            log(f"[WARN] {self.name} queue full - dropped oldest alert")
+        self.queue.put_nowait((time.monotonic(), message))
+        self.counters['queued'] += 1
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                log(f"[ERR] {self.name} delivery error: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _chunks(self, messages):
+        """Join messages into as few posts as fit under the destination's size limit"""
+        chunk = ''
+        for message in messages:
+            message = message[:self.max_chars]
+            if chunk and len(chunk) + 2 + len(message) > self.max_chars:
+                yield chunk
+                chunk = ''
+            chunk = f"{chunk}\n\n{message}" if chunk else message
+        if chunk:
+            yield chunk
+
+    async def _deliver(self, batch):
+        for text in self._chunks([message for _, message in batch]):
+            if await self._post_with_retry(text):
+                now = time.monotonic()
+                self.latencies.extend(now - queued_at for queued_at, _ in batch)
+                self.counters['sent'] += 1
+                self.counters['batches'] += 1 if len(batch) > 1 else 0
+                METRICS.inc('webhook_sent', destination=self.name)
+                suffix = f" ({len(batch)} alerts batched)" if len(batch) > 1 else ''
+                log(f"[OK] {self.name} notification sent{suffix}")
+            else:
+                self.counters['failed'] += 1
+                METRICS.inc('webhook_failed', destination=self.name)
+
+    async def _post_with_retry(self, text):
+        for attempt in range(self.max_retries + 1):
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * (0.5 + random.random() / 2)
+            try:
+                started = time.monotonic()
+                r = await self.http.post(self.url, {self.payload_key: text})
+                METRICS.observe('webhook_post_seconds', time.monotonic() - started)
+                if r.status_code == 429:
+                    self.counters['rate_limited'] += 1
+                    delay = self._retry_after(r, delay)
+                    log(f"[WARN] {self.name} rate limited - retrying in {delay:.1f}s")
+                elif r.status_code >= 500:
+                    log(f"[WARN] {self.name} returned {r.status_code}")
+                else:
+                    r.raise_for_status()
+                    return True
+            except requests.HTTPError as e:
+                # Other 4xx responses won't succeed on retry
+                log(f"[ERR] {self.name} failed: {e}")
+                return False
+            except Exception as e:
+                log(f"[WARN] {self.name} send error: {e}")
+
+            if attempt < self.max_retries:
+                self.counters['retries'] += 1
+                METRICS.inc('webhook_retries', destination=self.name)
+                await asyncio.sleep(delay)
+
+        log(f"[ERR] {self.name} failed after {self.max_retries + 1} attempts")
+        return False
+
+    def _retry_after(self, response, default):
+        """Seconds to wait from a 429's Retry-After header or Discord's retry_after body"""
+        try:
+            return min(self.backoff_max, float(response.headers['Retry-After']))
+        except (KeyError, ValueError):
+            pass
+        try:
+            return min(self.backoff_max, float(response.json()['retry_after']))
+        except Exception:
+            return default
+
+    def stats(self):
+        """Queue depth, counters and send latency percentiles"""
+        latencies = sorted(self.latencies)
+        stats = dict(self.counters, depth=self.queue.qsize())
+        if latencies:
+            stats['latency_p50_s'] = round(latencies[len(latencies) // 2], 3)
+            stats['latency_max_s'] = round(latencies[-1], 3)
+        return stats
+
+    async def close(self, timeout):
+        """Wait for queued alerts to drain, then stop the worker"""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log(f"[WARN] {self.name} shutdown with {self.queue.qsize()} alerts undelivered")
+        self._worker.cancel()
 
 
 class WebhookSender:
     """Sends notifications to Discord, Slack, and Teams webhooks"""
 
-    def __init__(self, config):
+    def __init__(self, config, http):
+        self.http = http
         integrations = config.get('integrations', {})
-        self.discord_url  = integrations.get('discord', {}).get('webhook_url', '') if integrations.get('discord', {}).get('enabled') else ''
-        self.slack_url    = integrations.get('slack',   {}).get('webhook_url', '') if integrations.get('slack',   {}).get('enabled') else ''
-        self.teams_url    = integrations.get('teams',   {}).get('webhook_url', '') if integrations.get('teams',   {}).get('enabled') else ''
+        discord_url  = integrations.get('discord', {}).get('webhook_url', '') if integrations.get('discord', {}).get('enabled') else ''
+        slack_url    = integrations.get('slack',   {}).get('webhook_url', '') if integrations.get('slack',   {}).get('enabled') else ''
+        teams_url    = integrations.get('teams',   {}).get('webhook_url', '') if integrations.get('teams',   {}).get('enabled') else ''
 
         # Also support legacy discord_bot.webhook_url
-        if not self.discord_url:
-            self.discord_url = config.get('discord_bot', {}).get('webhook_url', '')
+        if not discord_url:
+            discord_url = config.get('discord_bot', {}).get('webhook_url', '')
 
-        enabled = []
-        if self.discord_url:  enabled.append('Discord')
-        if self.slack_url:    enabled.append('Slack')
-        if self.teams_url:    enabled.append('Teams')
+        settings = config.get('notifications', {}).get('delivery', {})
+        self.destinations = []
+        if discord_url:  self.destinations.append(WebhookDestination('Discord', discord_url, 'content', http, settings, 2000))
+        if slack_url:    self.destinations.append(WebhookDestination('Slack',   slack_url,   'text',    http, settings, 4000))
+        if teams_url:    self.destinations.append(WebhookDestination('Teams',   teams_url,   'text',    http, settings, 20000))
 
-        if enabled:
-            log(f"[OK] Notifications enabled: {', '.join(enabled)}")
+        if self.destinations:
+            log(f"[OK] Notifications enabled: {', '.join(d.name for d in self.destinations)}")
         else:
             log("[WARN] No webhook URLs configured - notifications will not be sent")
 
     def send(self, message):
-        """Send to all configured webhooks"""
-        sent = False
-        if self.discord_url:
-            sent = self._send_discord(message) or sent
-        if self.slack_url:
-            sent = self._send_slack(message) or sent
-        if self.teams_url:
-            sent = self._send_teams(message) or sent
-        return sent
-
-    def _send_discord(self, message):
-        try:
-            r = requests.post(self.discord_url, json={"content": message}, timeout=10)
-            r.raise_for_status()
-            log(f"[OK] Discord notification sent")
-            return True
-        except Exception as e:
-            log(f"[ERR] Discord failed: {e}")
-            return False
+        """Queue a message on every configured webhook"""
+        for destination in self.destinations:
+            destination.enqueue(message)
+        return bool(self.destinations)
 
-    def _send_slack(self, message):
-        try:
-            r = requests.post(self.slack_url, json={"text": message}, timeout=10)
-            r.raise_for_status()
-            log(f"[OK] Slack notification sent")
-            return True
-        except Exception as e:
-            log(f"[ERR] Slack failed: {e}")
-            return False
+    def stats(self):
+        """Per-destination delivery stats"""
+        return {d.name: d.stats() for d in self.destinations}
 
-    def _send_teams(self, message):
-        try:
-            r = requests.post(self.teams_url, json={"text": message}, timeout=10)
-            r.raise_for_status()
-            log(f"[OK] Teams notification sent")
-            return True
-        except Exception as e:
-            log(f"[ERR] Teams failed: {e}")
-            return False
+    async def close(self, timeout=15):
+        """Drain all destination queues concurrently"""
+        await asyncio.gather(*(d.close(timeout) for d in self.destinations))
+
+
+# Config that WebhookSender is built from
+WEBHOOK_SECTIONS = ('integrations', 'discord_bot', 'notifications')
+
+# run() raises after this many failed polls in a row (monitoring.max_poll_errors)
+# rather than logging the same error forever; the supervisor restarts it
+MAX_POLL_ERRORS = 5
 
 
 class AviationTracker:
-    def __init__(self, config):
+    def __init__(self, config, http=None, config_path=None):
         self.config = config
-        self.webhook = WebhookSender(config)
-
-        # Tracking state
-        self.aircraft_state = {}
-        self.last_notifications = {}
-        self.distance_alerts_sent = {}
-
-    def haversine_distance(self, lat1, lon1, lat2, lon2):
-        """Calculate distance in nautical miles"""
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        return 3440.065 * c
-
-    def get_aircraft_data(self):
-        """Fetch aircraft data from adsb.lol"""
+        self.registry = FleetRegistry(config['aircraft'])
+        self.compile_rules()
+        self.config_path = config_path
+        self.fences = None
+        self.compile_fences()
+        self._owns_http = http is None
+        self.http = http or HttpClient()
+        self.webhook = WebhookSender(config, self.http)
+        self.fetcher = AdsbFetcher(self.http, config.get('monitoring', {}).get('adsb_api', ADSB_API))
+        self.receivers = [receiver.acquire(settings) for settings in config.get('receivers', [])]
+        self.receiving = None  # whether local receivers were serving data last poll
+        self.fetch_failed = False  # whether the last adsb.lol fetch failed
+        self.config_watcher = ConfigWatcher(config_path) if config_path else None
+
+        # Clock for all state-machine timestamps; replay swaps in trace time
+        self.now = datetime.now
+
+        # Tracking state, one TrackRecord per aircraft
+        self.tracks = TrackTable()
+
+        # Replaced webhook senders still draining their queues
+        self._retiring = set()
+
+        self.state_store = self._open_state_store(config_path)
+        self.history = self._open_history(config_path)
+
+        self.scheduler = PollScheduler()
+        self.profiler = PollProfiler()
+        self.profiler.configure(config.get('profiling', {}))
+        self.next_poll_delay = config.get('monitoring', {}).get('poll_interval_seconds', 10)
+        self.rest_delay = self.next_poll_delay  # scheduler delay before the receiver cap
+        self._rest = None  # (monotonic time, by_hex or None if it failed) of the last adsb.lol fetch
+
+    def _open_state_store(self, config_path):
+        """Open the state snapshot next to the config file and restore from it"""
+        settings = self.config.get('state', {})
+        if not settings.get('enabled', True) or not (settings.get('path') or config_path):
+            return None
+
+        path = settings.get('path') or os.path.splitext(config_path)[0] + '.state.db'
         try:
-            airspace = self.config['airspace']
-            lat = airspace['center_lat']
-            lon = airspace['center_lon']
-
-            if 'query_radius_nm' in airspace:
-                radius = airspace['query_radius_nm']
+            store = StateStore(path)
+            self.tracks = store.load(settings.get('max_age_minutes', 30))
+        except Exception as e:
+            log(f"[WARN] State snapshots disabled: {e}")
+            return None
+
+        if self.tracks:
+            log(f"[OK] Restored state for {len(self.tracks)} aircraft")
+        return store
+
+    def _open_history(self, config_path):
+        """Start the flight history writer next to the config file"""
+        directory = flight_history.history_dir(self.config, config_path)
+        if directory is None:
+            return None
+        try:
+            return FlightHistory(directory, self.config.get('history', {}).get('retention_days', 90))
+        except OSError as e:
+            log(f"[WARN] Flight history disabled: {e}")
+            return None
+
+    def record_event(self, icao24, kind, detail=''):
+        """Append an alert/landing/takeoff to the flight history"""
+        if self.history is not None:
+            self.history.record_event(self.now().timestamp(), icao24, kind, detail)
+
+    def apply_config(self, config):
+        """Switch to a new config in place, rebuilding only what changed.
+
+        State for aircraft still in the fleet is kept. The registry is built
+        before anything is swapped so config and registry never disagree.
+        Returns the set of changed top-level sections.
+        """
+        if not config.get('aircraft', {}).get('icao24_codes'):
+            log("[WARN] Reloaded config has no aircraft - keeping current config")
+            return set()
+
+        changed = diff_sections(self.config, config)
+        was_capturing = self.config.get('profiling', {}).get('capture')
+        registry = FleetRegistry(config['aircraft']) if 'aircraft' in changed else self.registry
+
+        webhook = None
+        old_delivery = self.config.get('notifications', {}).get('delivery')
+        new_delivery = config.get('notifications', {}).get('delivery')
+        if changed & {'integrations', 'discord_bot'} or old_delivery != new_delivery:
+            webhook = WebhookSender(config, self.http)
+
+        self.config, self.registry = config, registry
+
+        if changed & {'logging', 'verbose_debug'}:
+            configure_logging(config.get('logging', {}), config.get('verbose_debug'))
+
+        if webhook is not None:
+            old, self.webhook = self.webhook, webhook
+            self._retire(old.close())
+
+        if 'monitoring' in changed:
+            self.fetcher.api = config.get('monitoring', {}).get('adsb_api', ADSB_API)
+
+        if 'receivers' in changed:
+            old, self.receivers = self.receivers, [receiver.acquire(s) for s in config.get('receivers', [])]
+            self.receiving = None
+            for source in old:
+                self._retire(receiver.release(source))
+
+        if 'aircraft' in changed:
+            for track in self.tracks:
+                if track.icao24 not in registry:
+                    self.tracks.discard(track.icao24)
+
+        if changed & {'airspace', 'alert_rules', 'aircraft'}:
+            self.compile_rules()
+
+        if changed & {'airspace', 'geofences'}:
+            self.compile_fences()
+
+        if changed & {'airspace', 'alert_rules', 'aircraft', 'geofences', 'monitoring'}:
+            # The last adsb.lol result answered the old query
+            self._rest = None
+
+        if 'profiling' in changed:
+            self.profiler.configure(config.get('profiling', {}))
+            if config['profiling'].get('capture') and not was_capturing:
+                self.start_capture()
+
+        if 'airspace' in changed:
+            # Motion models are in a frame centred on the old airspace
+            for track in self.tracks:
+                track.motion = None
+
+        return changed
+
+    def compile_rules(self):
+        """Build the alert rule tables for the current config and fleet"""
+        self.rules, self.aircraft_rules = compile_fleet_rules(self.config, self.registry)
+        boundaries = set(self.rules.boundaries())
+        distances = list(self.rules.distances)
+        for rules in self.aircraft_rules.values():
+            boundaries.update(rules.boundaries())
+            distances.extend(rules.distances)
+        boundaries.add(self.config['airspace']['radius_nm'])
+        self._boundaries = sorted(boundaries)
+        # Outermost ring of the fleet or any per-aircraft override, for sizing the ADS-B query
+        self._outermost_nm = max(distances, default=10.0)
+
+    def compile_fences(self):
+        """Build the geofence index; bad fences keep the current one"""
+        base_dir = os.path.dirname(self.config_path) if self.config_path else None
+        try:
+            self.fences = compile_fences(self.config, base_dir)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            log(f"[ERR] Geofences not loaded: {e}")
+
+    def start_capture(self):
+        """cProfile the event loop for profiling.capture_seconds"""
+        settings = self.config.get('profiling', {})
+        directory = settings.get('capture_dir')
+        if not directory:
+            directory = os.path.dirname(os.path.abspath(self.config_path)) if self.config_path else '.'
+        CAPTURE.start(settings.get('capture_seconds', 30), directory)
+
+    def _retire(self, coro):
+        """Run a replaced component's shutdown in the background; close() waits for it"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    def check_reload(self):
+        """Apply config changes from disk, returning the changed sections"""
+        if self.config_watcher is None:
+            return set()
+        config = self.config_watcher.poll()
+        if config is None:
+            return set()
+        changed = self.apply_config(config)
+        if changed:
+            log(f"[OK] Config reloaded: {', '.join(sorted(changed))} changed")
+        return changed
+
+    def compute_geometry(self, aircraft_list):
+        """Distance, bearing, closure rate and airspace membership for a whole poll"""
+        now = self.now().timestamp()
+        prev_distances = []
+        elapsed_seconds = []
+        for aircraft_data in aircraft_list:
+            track = self.tracks.get(aircraft_data['icao24'])
+            last_update = track.last_update if track else None
+            prev_distances.append(track.last_distance if track else None)
+            elapsed_seconds.append(now - last_update if last_update is not None else None)
+        return compute_geometry(self.config['airspace'], aircraft_list, prev_distances, elapsed_seconds,
+                                self.fences)
+
+    def query_region(self):
+        """(lat, lon, radius_nm) of the ADS-B area query covering this airspace"""
+        airspace = self.config['airspace']
+        if 'query_radius_nm' in airspace:
+            radius = airspace['query_radius_nm']
+        else:
+            radius = self._outermost_nm + 5
+            if self.fences:
+                radius = max(radius, self.fences.extent_nm + 1)
+        return airspace['center_lat'], airspace['center_lon'], radius
+
+    async def get_aircraft_data(self):
+        """Fetch aircraft data from local receivers and/or adsb.lol.
+
+        Returns None if adsb.lol failed and there is no local data. If it
+        failed with local data, the local aircraft are returned and
+        fetch_failed is set, so the poll isn't taken as complete. While
+        receivers are up, adsb.lol is queried at most every rest_delay
+        seconds and the last result reused in between.
+        """
+        profiler = self.profiler
+        local = self.local_aircraft()
+        profiler.lap('receivers')
+        self.fetch_failed = False
+        by_hex = {}
+        if self.needs_rest(local):
+            age = time.monotonic() - self._rest[0] if self._rest is not None else None
+            if local is not None and age is not None and age < self.rest_delay - REST_SLACK_SECONDS:
+                # Receiver polls run faster than adsb.lol needs querying
+                by_hex = self._rest[1]
+                self.fetch_failed = by_hex is None
+                by_hex = receiver.aged(by_hex, age) if by_hex else {}
             else:
-                radius = max(self.config['airspace'].get('alert_distances_nm', [10.0])) + 5
-
-            url = f"https://api.adsb.lol/v2/lat/{lat}/lon/{lon}/dist/{radius}"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-
-            data = response.json()
-            aircraft_list = []
-
-            if data and 'ac' in data and data['ac']:
-                tracked_icao24s = set(icao.lower() for icao in self.config['aircraft']['icao24_codes'])
-
-                for aircraft in data['ac']:
-                    aircraft_icao = aircraft.get('hex', '').lower()
-
-                    if aircraft_icao in tracked_icao24s:
-                        try:
-                            idx = [x.lower() for x in self.config['aircraft']['icao24_codes']].index(aircraft_icao)
-                            tail_number = self.config['aircraft']['tail_numbers'][idx]
-                        except (ValueError, IndexError):
-                            tail_number = aircraft_icao
-
-                        aircraft_list.append({
-                            'icao24': aircraft_icao,
-                            'callsign': aircraft.get('flight', tail_number).strip() or tail_number,
-                            'longitude': aircraft.get('lon'),
-                            'latitude': aircraft.get('lat'),
-                            'baro_altitude': aircraft.get('alt_baro', 0) * 0.3048 if aircraft.get('alt_baro') and aircraft.get('alt_baro') != 'ground' else None,
-                            'on_ground': aircraft.get('alt_baro') == 'ground' or aircraft.get('gs', 0) < 30,
-                            'velocity': aircraft.get('gs', 0) * 0.514444 if aircraft.get('gs') else None,
-                        })
-
-            return aircraft_list
+                try:
+                    lat, lon, radius = self.query_region()
+                    strategy = self.config.get('monitoring', {}).get('fetch_strategy', 'auto')
+                    by_hex = await self.fetcher.fetch(lat, lon, radius, self.registry.codes, strategy)
+                    self._rest = (time.monotonic(), by_hex)
+                    profiler.lap('fetch')
+                    profiler.split('fetch', 'parse', self.fetcher.last.parse_ms / 1000)
+                    self.log_fetch(self.fetcher)
+                except Exception as e:
+                    profiler.lap('fetch')
+                    log(f"[ERR] Fetching aircraft data: {e}")
+                    self.fetch_failed = True
+                    self._rest = (time.monotonic(), None)
+                    if local is None:
+                        return None
+        aircraft_list = self.extract_aircraft(receiver.fuse(by_hex, local) if local else by_hex)
+        profiler.lap('extract')
+        return aircraft_list
+
+    def local_aircraft(self):
+        """{hex: entry} for tracked aircraft from healthy local receivers, or None if none are up"""
+        if not self.receivers:
+            return None
+        healthy = []
+        for source in self.receivers:
+            source.start()
+            if source.healthy:
+                healthy.append(source)
+
+        receiving = bool(healthy)
+        if receiving != self.receiving:
+            if receiving:
+                log(f"[OK] Using local receiver data ({', '.join(s.name for s in healthy)})")
+            elif self.receiving is not None:
+                log("[WARN] No local receiver data - falling back to adsb.lol")
+            self.receiving = receiving
+        if not healthy:
+            return None
+
+        lat, lon, radius = self.query_region()
+        found = receiver.fuse(*(source.snapshot(self.registry.codes) for source in healthy))
+        return within_radius(found, lat, lon, radius)
+
+    def needs_rest(self, local):
+        """Whether this poll needs adsb.lol as well as local receiver data.
+
+        monitoring.rest_source 'fallback' (default) uses adsb.lol only when no
+        receiver is up or an aircraft being followed in the air has dropped
+        out of receiver coverage; 'always' fuses both every poll.
+        """
+        if local is None or self.config.get('monitoring', {}).get('rest_source', 'fallback') == 'always':
+            return True
+        return any(track.icao24 not in local for track in self.tracks.active()
+                   if not track.flags & (ON_GROUND | LANDED))
 
-        except Exception as e:
-            log(f"[ERR] Fetching aircraft data: {e}")
-            return []
+    def log_fetch(self, fetcher):
+        """Per-poll fetch cost, at debug level"""
+        if not enabled(DEBUG):
+            return
+        f = fetcher.last
+        debug('fetch', "[FETCH] %s x%d: %.1fKB, parse %.1fms, %d not modified",
+              f.strategy, f.requests, f.wire_bytes / 1024, f.parse_ms, f.not_modified, **f._asdict())
+
+    def extract_aircraft(self, by_hex):
+        """Pick this fleet's aircraft out of a hex -> raw adsb.lol entry map"""
+        aircraft_list = []
+        for entry in self.registry:
+            aircraft = by_hex.get(entry.icao24)
+            if aircraft is None:
+                continue
+
+            tail_number = entry.tail_number
+            aircraft_list.append({
+                'icao24': entry.icao24,
+                'callsign': aircraft.get('flight', tail_number).strip() or tail_number,
+                'longitude': aircraft.get('lon'),
+                'latitude': aircraft.get('lat'),
+                'baro_altitude': aircraft.get('alt_baro', 0) * 0.3048 if aircraft.get('alt_baro') and aircraft.get('alt_baro') != 'ground' else None,
+                'on_ground': aircraft.get('alt_baro') == 'ground' or aircraft.get('gs', 0) < 30,
+                'velocity': aircraft.get('gs', 0) * 0.514444 if aircraft.get('gs') else None,
+                'ground_speed_kts': aircraft.get('gs'),
+                'track_deg': aircraft.get('track'),
+                'vertical_rate_fpm': aircraft.get('baro_rate', aircraft.get('geom_rate')),
+            })
+        return aircraft_list
 
     def should_notify(self, event_type, aircraft_id):
         """Check cooldown"""
-        key = f"{aircraft_id}_{event_type}"
-        now = datetime.now()
+        now = self.now().timestamp()
+        track = self.tracks.touch(aircraft_id, now)
         cooldown_minutes = self.config['notifications'].get('cooldown_minutes', 2)
 
-        if key in self.last_notifications:
-            time_since_last = (now - self.last_notifications[key]).total_seconds() / 60
+        last_sent = track.cooldowns.get(event_type)
+        if last_sent is not None:
+            time_since_last = (now - last_sent) / 60
             if time_since_last < cooldown_minutes:
                 return False
 
-        self.last_notifications[key] = now
+        track.cooldowns[event_type] = now
         return True
 
     def is_quiet_hours(self):
@@ -178,7 +609,7 @@ class AviationTracker:
         if not quiet.get('enabled'):
             return False
         try:
-            now = datetime.now().strftime('%H:%M')
+            now = self.now().strftime('%H:%M')
             start = quiet.get('start', '23:00')
             end = quiet.get('end', '06:00')
             if start <= end:
@@ -189,114 +620,107 @@ class AviationTracker:
             return False
 
     def send_notification(self, message):
-        """Send notification if not in quiet hours"""
+        """Queue a notification for delivery unless in quiet hours.
+
+        Delivery happens on the per-webhook workers so the poll loop never
+        waits on webhook latency.
+        """
         if self.is_quiet_hours():
-            log(f"[QUIET] Suppressed: {message[:50]}")
+            log(f"[QUIET] Suppressed: {message[:50]}", event='alert_suppressed')
+            METRICS.inc('alerts_suppressed')
             return False
+        METRICS.inc('alerts_sent')
         return self.webhook.send(message)
 
-    async def check_and_notify(self, aircraft_data):
-        """Check aircraft state and send notifications"""
+    async def close(self, timeout=15):
+        """Flush queued notifications and release the HTTP pool"""
+        await self.webhook.close(timeout)
+        if self._retiring:
+            await asyncio.wait(list(self._retiring), timeout=timeout)
+        if self.state_store is not None:
+            self.state_store.save(self.tracks)
+            self.state_store.close()
+        if self.history is not None:
+            # The final flush and join would otherwise stall every tenant's loop
+            await asyncio.get_running_loop().run_in_executor(None, self.history.close, timeout)
+        for source in self.receivers:
+            await receiver.release(source)
+        if self._owns_http:
+            self.http.close()
+
+    async def check_and_notify(self, aircraft_data, geo):
+        """Check aircraft state and send notifications
+
+        geo is this aircraft's row from compute_geometry().
+        """
         aircraft_id = aircraft_data['icao24']
         callsign = aircraft_data['callsign']
         on_ground = aircraft_data['on_ground']
 
-        if aircraft_data['latitude'] is None or aircraft_data['longitude'] is None:
+        if geo.distance_nm is None:
             return
 
         airspace = self.config['airspace']
-        distance_nm = self.haversine_distance(
-            airspace['center_lat'], airspace['center_lon'],
-            aircraft_data['latitude'], aircraft_data['longitude']
-        )
-
-        in_horizontal = distance_nm <= airspace['radius_nm']
-
-        altitude_msl_m = aircraft_data['baro_altitude']
-        if altitude_msl_m is not None:
-            altitude_msl_ft = altitude_msl_m * 3.28084
-            altitude_agl_ft = altitude_msl_ft - airspace.get('field_elevation_ft_msl', 0)
-            in_vertical = airspace.get('floor_ft_agl', 0) <= altitude_agl_ft <= airspace.get('ceiling_ft_agl', 3000)
-        else:
-            altitude_agl_ft = 0
-            altitude_msl_ft = 0
-            in_vertical = on_ground
-
-        in_airspace = in_horizontal and in_vertical
-
-        was_in_airspace = self.aircraft_state.get(aircraft_id, {}).get('in_airspace', False)
-        was_on_ground = self.aircraft_state.get(aircraft_id, {}).get('on_ground', None)
+        distance_nm = geo.distance_nm
+        altitude_msl_ft = geo.altitude_msl_ft
+        altitude_agl_ft = geo.altitude_agl_ft
+        in_airspace = geo.in_airspace
+
+        track = self.tracks.touch(aircraft_id, self.now().timestamp())
+        if track.has(LANDING_INFERRED):
+            self.review_landing(track, aircraft_data, geo)
+        was_in_airspace = track.has(IN_AIRSPACE)
+        was_on_ground = track.was_on_ground
+        self.update_motion(track, aircraft_data, altitude_msl_ft)
 
         # Distance alerts
         if not on_ground:
-            alert_distances = sorted(self.config['airspace'].get('alert_distances_nm', [10.0, 5.0, 2.0]), reverse=True)
-
-            if aircraft_id not in self.distance_alerts_sent:
-                self.distance_alerts_sent[aircraft_id] = set()
-
-            prev_distance = self.aircraft_state.get(aircraft_id, {}).get('last_distance', None)
-            max_distance = self.aircraft_state.get(aircraft_id, {}).get('max_distance', None)
+            rules = self.aircraft_rules.get(aircraft_id, self.rules)
+            prev_distance = track.last_distance
+            max_distance = track.max_distance
 
             if max_distance is None or distance_nm > max_distance:
                 max_distance = distance_nm
 
             if prev_distance:
-                direction = "Approaching" if distance_nm < prev_distance else "Departing"
-                log(f"  {direction} ({distance_nm:.1f}nm, max: {max_distance:.1f}nm)")
-
-            if max_distance is not None and prev_distance is not None:
-                for alert_distance in alert_distances:
-                    alert_key = f"{alert_distance}nm"
-                    was_beyond_boundary = max_distance > alert_distance
-                    crossed_boundary = (prev_distance > alert_distance and distance_nm <= alert_distance)
-
-                    if crossed_boundary and was_beyond_boundary and alert_key not in self.distance_alerts_sent[aircraft_id]:
-                        if alert_distance == 2.0:
-                            if "10.0nm" in self.distance_alerts_sent[aircraft_id] and "5.0nm" in self.distance_alerts_sent[aircraft_id]:
-                                if self.should_notify('landing', aircraft_id):
-                                    already_landed = self.aircraft_state.get(aircraft_id, {}).get('landed', False)
-                                    if not already_landed:
-                                        message = f"**{callsign} LANDING**\nTime: {datetime.now().strftime('%H:%M')}\nReady to put away\n(Within 2nm - sequential approach)"
-                                        log(f"  LANDING: {callsign} (10nm -> 5nm -> 2nm)")
-                                        self.send_notification(message)
-                                        if aircraft_id not in self.aircraft_state:
-                                            self.aircraft_state[aircraft_id] = {}
-                                        self.aircraft_state[aircraft_id]['landed'] = True
-                                        self.distance_alerts_sent[aircraft_id].add(alert_key)
-                            else:
-                                if self.should_notify(f'distance_{alert_distance}', aircraft_id):
-                                    eta_minutes = int(distance_nm / 1.5)
-                                    message = f"**{callsign} - {alert_distance:.0f}nm out**\nETA ~{eta_minutes}min, Alt {altitude_agl_ft:.0f}ft AGL"
-                                    log(f"  Alert: {alert_distance:.0f}nm")
-                                    self.send_notification(message)
-                                    self.distance_alerts_sent[aircraft_id].add(alert_key)
-                        else:
-                            if self.should_notify(f'distance_{alert_distance}', aircraft_id):
-                                eta_minutes = int(distance_nm / 1.5)
-                                message = f"**{callsign} - {alert_distance:.0f}nm out**\nETA ~{eta_minutes}min, Alt {altitude_agl_ft:.0f}ft AGL"
-                                log(f"  Alert: {alert_distance:.0f}nm")
+                debug('approach', "  %s (%.1fnm, max: %.1fnm)",
+                      "Approaching" if distance_nm < prev_distance else "Departing", distance_nm, max_distance)
+
+            if prev_distance is not None:
+                for ring in rules.crossed(prev_distance, distance_nm):
+                    if track.alerts & ring.bit:
+                        continue
+                    if ((ring.min_agl_ft is not None and altitude_agl_ft < ring.min_agl_ft)
+                            or (ring.max_agl_ft is not None and altitude_agl_ft > ring.max_agl_ft)):
+                        continue
+
+                    if ring.kind == 'landing' and track.alerts & ring.requires == ring.requires:
+                        if self.should_notify('landing', aircraft_id):
+                            if not track.has(LANDED):
+                                message = f"**{callsign} LANDING**\nTime: {self.now().strftime('%H:%M')}\nReady to put away\n(Within {ring.label} - sequential approach)"
+                                log(f"  LANDING: {callsign} ({rules.landing_path})")
                                 self.send_notification(message)
-                                self.distance_alerts_sent[aircraft_id].add(alert_key)
+                                self.record_event(aircraft_id, 'landed', 'sequential approach')
+                                track.set(LANDED)
+                                track.alerts |= ring.bit
+                    elif self.should_notify(ring.cooldown_key, aircraft_id):
+                        eta_minutes = self.eta_minutes(track, distance_nm)
+                        message = f"**{callsign} - {ring.label} out**\nETA ~{eta_minutes}min, Alt {altitude_agl_ft:.0f}ft AGL"
+                        log(f"  Alert: {ring.label}")
+                        self.send_notification(message)
+                        self.record_event(aircraft_id, 'alert', ring.label)
+                        track.alerts |= ring.bit
 
-            if distance_nm > 12.0:
-                self.distance_alerts_sent[aircraft_id] = set()
-                if aircraft_id in self.aircraft_state:
-                    self.aircraft_state[aircraft_id]['max_distance'] = distance_nm
+            if distance_nm > rules.reset_distance_nm:
+                track.alerts = 0
 
-            if aircraft_id not in self.aircraft_state:
-                self.aircraft_state[aircraft_id] = {}
-            self.aircraft_state[aircraft_id]['last_distance'] = distance_nm
-            self.aircraft_state[aircraft_id]['max_distance'] = max_distance
+            track.last_distance = distance_nm
+            track.max_distance = max_distance
 
         # Leaving airspace
         if was_in_airspace and not was_on_ground and not in_airspace:
-            if aircraft_id not in self.aircraft_state:
-                self.aircraft_state[aircraft_id] = {}
-
-            already_landed = self.aircraft_state[aircraft_id].get('landed', False)
-
-            if 'left_airspace_time' not in self.aircraft_state[aircraft_id] and not already_landed:
-                self.aircraft_state[aircraft_id]['left_airspace_time'] = datetime.now()
+            if track.left_airspace_time is None and not track.has(LANDED):
+                track.left_airspace_time = self.now().timestamp()
                 velocity_kts = aircraft_data.get('velocity', 0) * 1.94384 if aircraft_data.get('velocity') else 0
                 field_elevation = airspace.get('field_elevation_ft_msl', 0)
                 is_ground_level = abs(altitude_msl_ft - field_elevation) < 200
@@ -304,43 +728,104 @@ class AviationTracker:
 
                 if is_ground_level and is_slow:
                     if self.should_notify('landing', aircraft_id):
-                        message = f"**{callsign} LANDED**\nTime: {datetime.now().strftime('%H:%M')}\nReady to put away"
+                        message = f"**{callsign} LANDED**\nTime: {self.now().strftime('%H:%M')}\nReady to put away"
                         self.send_notification(message)
-                        self.aircraft_state[aircraft_id]['landed'] = True
+                        self.record_event(aircraft_id, 'landed', 'left airspace at ground level')
+                        track.set(LANDED)
 
         # Direct ground detection
         elif in_airspace and on_ground and was_on_ground == False:
-            already_landed = self.aircraft_state.get(aircraft_id, {}).get('landed', False)
-            if not already_landed:
+            if not track.has(LANDED):
                 if self.should_notify('landing', aircraft_id):
-                    message = f"**{callsign} LANDED**\nTime: {datetime.now().strftime('%H:%M')}\nReady to put away"
+                    message = f"**{callsign} LANDED**\nTime: {self.now().strftime('%H:%M')}\nReady to put away"
                     self.send_notification(message)
-                    if aircraft_id not in self.aircraft_state:
-                        self.aircraft_state[aircraft_id] = {}
-                    self.aircraft_state[aircraft_id]['landed'] = True
+                    self.record_event(aircraft_id, 'landed', 'on ground in airspace')
+                    track.set(LANDED)
 
-        # Update state
-        if aircraft_id not in self.aircraft_state:
-            self.aircraft_state[aircraft_id] = {}
+        # Geofence alerts; an aircraft's first sighting only records where it is
+        if geo.fences != track.fences:
+            if track.last_update is not None:
+                self.notify_fences(track, callsign, geo)
+            track.fences = geo.fences
 
-        self.aircraft_state[aircraft_id].update({
-            'in_airspace': in_airspace,
-            'on_ground': on_ground,
-            'last_update': datetime.now(),
-            'consecutive_missing': 0,
-        })
+        # Update state
+        track.flags |= ACTIVE | GROUND_KNOWN
+        track.set(IN_AIRSPACE, in_airspace)
+        track.set(ON_GROUND, on_ground)
+        track.last_update = self.now().timestamp()
+        track.consecutive_missing = 0
 
         # Takeoff detection - reset flags
         if in_airspace and not on_ground and was_on_ground == True:
-            if aircraft_id in self.distance_alerts_sent:
-                self.distance_alerts_sent[aircraft_id] = set()
-            if aircraft_id in self.aircraft_state:
-                self.aircraft_state[aircraft_id]['landed'] = False
-                self.aircraft_state[aircraft_id]['max_distance'] = distance_nm
-                self.aircraft_state[aircraft_id].pop('left_airspace_time', None)
+            self.record_event(aircraft_id, 'takeoff')
+            track.alerts = 0
+            track.set(LANDED, False)
+            track.max_distance = distance_nm
+            track.left_airspace_time = None
+
+    def notify_fences(self, track, callsign, geo):
+        """Alert for the geofences an aircraft entered or left since its last poll"""
+        entered = geo.fences & ~track.fences
+        left = track.fences & ~geo.fences
+        for fence in self.fences.fences if self.fences else ():
+            if entered & fence.bit and fence.on_enter:
+                action = 'entered'
+            elif left & fence.bit and fence.on_exit:
+                action = 'left'
+            else:
+                continue
+            if self.should_notify(f"fence_{fence.name}_{action}", track.icao24):
+                message = (f"**{callsign} {action} {fence.name}**\n"
+                           f"Alt {geo.altitude_agl_ft:.0f}ft AGL, {geo.distance_nm:.1f}nm out")
+                log(f"  Geofence: {callsign} {action} {fence.name}")
+                self.send_notification(message)
+                self.record_event(track.icao24, 'fence', f"{action} {fence.name}")
+
+    def review_landing(self, track, aircraft_data, geo):
+        """Confirm or retract a landing called on signal loss, now that the aircraft is back"""
+        callsign = aircraft_data['callsign']
+        outcome = landing_detector.review(
+            track, self.config['airspace'], self.config.get('landing', {}),
+            aircraft_data, geo.altitude_agl_ft, self.now().timestamp())
+        track.set(LANDING_INFERRED, False)
+
+        if outcome == 'confirmed':
+            log(f"  Landing confirmed: {callsign} is on the ground", event='landing_confirmed', icao24=track.icao24)
+        elif outcome == 'retracted':
+            track.set(LANDED, False)
+            track.cooldowns.pop('landing', None)
+            message = (f"**{callsign} still airborne**\nEarlier landing call retracted - signal back at "
+                       f"{geo.altitude_agl_ft:.0f}ft AGL, {geo.distance_nm:.1f}nm out")
+            log(f"  Landing retracted: {callsign}", event='landing_retracted', icao24=track.icao24)
+            self.send_notification(message)
+            self.record_event(track.icao24, 'retracted')
+        else:
+            # Landed and took off again while unseen: follow it as a new flight
+            track.drop()
 
-    async def run(self):
-        """Main tracking loop"""
+    def update_motion(self, track, aircraft_data, altitude_msl_ft):
+        """Fold this poll's position, gs/track and altitude into the aircraft's motion model"""
+        airspace = self.config['airspace']
+        t = self.now().timestamp()
+        x, y = project(airspace['center_lat'], airspace['center_lon'],
+                       aircraft_data['latitude'], aircraft_data['longitude'])
+        sample = (t, x, y, aircraft_data.get('ground_speed_kts'), aircraft_data.get('track_deg'),
+                  altitude_msl_ft if aircraft_data['baro_altitude'] is not None else None,
+                  aircraft_data.get('vertical_rate_fpm'))
+        track.motion = track.motion.update(*sample) if track.motion else MotionState.start(*sample)
+
+    def eta_minutes(self, track, distance_nm):
+        """Minutes until the aircraft reaches the field; 90kts straight in if unknown"""
+        seconds = track.motion.eta_seconds() if track.motion else None
+        if seconds is None:
+            return int(distance_nm / 1.5)
+        return round(seconds / 60)
+
+    def alert_boundaries(self):
+        """Distances (nm) at which the state machine can change an aircraft's status"""
+        return self._boundaries
+
+    def log_banner(self):
         poll_interval = self.config.get('monitoring', {}).get('poll_interval_seconds', 10)
         airspace_name = self.config['airspace'].get('name', 'My Airport')
         query_radius = self.config['airspace'].get('query_radius_nm', 100)
@@ -348,88 +833,190 @@ class AviationTracker:
         log("=" * 60)
         log("FinalPing Aviation Tracker")
         log("=" * 60)
-        log(f"Tracking {len(self.config['aircraft']['tail_numbers'])} aircraft:")
-        for tail, icao in zip(self.config['aircraft']['tail_numbers'], self.config['aircraft']['icao24_codes']):
-            log(f"  {tail} ({icao})")
+        log(f"Tracking {len(self.registry)} aircraft:")
+        for entry in self.registry:
+            log(f"  {entry.tail_number} ({entry.icao24})")
         log(f"Location: {airspace_name} within {query_radius}nm")
-        log(f"Poll interval: {poll_interval}s")
+        if self.fences:
+            log(f"Geofences: {', '.join(fence.name for fence in self.fences.fences)}")
+        if self.config.get('monitoring', {}).get('adaptive_polling', True):
+            log(f"Poll interval: {poll_interval}s (adaptive)")
+        else:
+            log(f"Poll interval: {poll_interval}s")
         log("=" * 60)
+
+    def log_stats(self):
+        if self.fetcher.totals['polls']:
+            log(f"[STATS] ADS-B: {self.fetcher.summary()}")
+        for name, stats in self.webhook.stats().items():
+            log(f"[STATS] {name}: " + ', '.join(f"{k}={v}" for k, v in stats.items()))
+
+    async def process_poll(self, aircraft_list, complete=True):
+        """Run one poll's worth of tracked aircraft through the state machine.
+
+        complete is False when adsb.lol couldn't be fetched: aircraft absent
+        from such a poll weren't looked for, so they aren't counted missing.
+        """
+        METRICS.inc('polls')
+        profiler = self.profiler
+        seen_aircraft = set()
+        observations = []
+        boundaries = self.alert_boundaries()
+
+        if aircraft_list:
+            geometry = self.compute_geometry(aircraft_list)
+            profiler.lap('geometry')
+            positions = []
+            for aircraft_data, geo in zip(aircraft_list, geometry):
+                seen_aircraft.add(aircraft_data['icao24'])
+                await self.check_and_notify(aircraft_data, geo)
+                if geo.distance_nm is not None:
+                    positions.append((aircraft_data['icao24'], aircraft_data['latitude'], aircraft_data['longitude'],
+                                      None if aircraft_data['on_ground'] else geo.altitude_msl_ft,
+                                      aircraft_data.get('ground_speed_kts'), aircraft_data.get('track_deg')))
+                if geo.distance_nm is not None and not aircraft_data['on_ground']:
+                    motion = self.tracks.get(aircraft_data['icao24']).motion
+                    if motion is not None and motion.samples > 1:
+                        observations.append((geo.distance_nm, motion.closing_kts(),
+                                             motion.next_crossing(boundaries)))
+                    else:
+                        observations.append((geo.distance_nm, geo.closure_kts, None))
+
+                if geo.distance_nm is not None:
+                    emit(INFO, 'aircraft', "%s - %s - %s - %.1fnm",
+                         aircraft_data['callsign'], "IN RANGE" if geo.in_airspace else "Outside",
+                         "On Ground" if aircraft_data['on_ground'] else "Airborne", geo.distance_nm,
+                         icao24=aircraft_data['icao24'], distance_nm=round(geo.distance_nm, 2),
+                         in_airspace=geo.in_airspace, on_ground=aircraft_data['on_ground'])
+            profiler.lap('notify')
+            if self.history is not None:
+                self.history.record_positions(self.now().timestamp(), positions)
+                profiler.lap('history')
+        elif complete:
+            emit(INFO, 'poll_empty', "No tracked aircraft found")
+
+        # Check for disappeared aircraft (possible landings)
+        now = self.now().timestamp()
+        landing = self.config.get('landing', {})
+        pending = False
+        if not complete:
+            # Keep retrying at the normal rate while anything is being followed
+            pending = any(not track.flags & (ON_GROUND | LANDED) and track.icao24 not in seen_aircraft
+                          for track in self.tracks.active())
+        for track in self.tracks.active() if complete else ():
+            aircraft_id = track.icao24
+            if aircraft_id in seen_aircraft:
+                continue
+            track.consecutive_missing += 1
+            if track.has(ON_GROUND):
+                continue
+
+            if track.has(LANDING_INFERRED):
+                # Kept around in case the aircraft turns up still flying
+                if now - track.last_update >= landing.get('retract_window_seconds', 900):
+                    track.drop()
+                continue
+
+            result = landing_detector.assess(track, self.config['airspace'], landing, now)
+            if result.verdict == 'landed':
+                if not track.has(LANDED) and self.should_notify('landing', aircraft_id):
+                    callsign = self.registry.tail_number(aircraft_id)
+                    if track.has(IN_AIRSPACE):
+                        reason = "Signal lost in airspace"
+                    elif track.left_airspace_time is not None:
+                        reason = "Left airspace then signal lost"
+                    else:
+                        reason = "Signal lost on approach"
+                    message = f"**{callsign} LANDED**\nTime: {self.now().strftime('%H:%M')}\nReady to put away\n({reason})"
+                    log(f"  LANDED: {callsign} ({reason}, score {result.score:.2f} after {result.gap_seconds:.0f}s)",
+                        event='landing_inferred', icao24=aircraft_id, score=round(result.score, 3))
+                    self.send_notification(message)
+                    self.record_event(aircraft_id, 'landed', reason)
+                track.flags |= LANDED | LANDING_INFERRED
+            elif result.verdict == 'lost':
+                track.drop()
+            elif result.score >= landing.get('watch_score', 0.25):
+                # Might still be landing: keep polling at the normal rate
+                pending = True
+
+        monitoring = self.config.get('monitoring', {})
+        self.rest_delay = self.scheduler.next_delay(monitoring, boundaries, observations, pending)
+        self.next_poll_delay = self.rest_delay
+        if self.receiving:
+            # Local data costs nothing to re-read, so keep alerts sub-interval
+            self.next_poll_delay = min(self.next_poll_delay, monitoring.get('receiver_poll_interval_seconds', 1))
+        profiler.lap('missing')
+
+        self.evict_tracks(now)
+        if self.state_store is not None:
+            self.state_store.save(self.tracks)
+        profiler.lap('snapshot')
+
+    async def poll_once(self):
+        aircraft_list = await self.get_aircraft_data()
+        await self.process_poll(aircraft_list or [], complete=not self.fetch_failed)
+
+    def evict_tracks(self, now):
+        """Drop stale tracks (TTL) and cap the table (LRU) so memory stays flat"""
+        settings = self.config.get('state', {})
+        # Never evict a track while one of its cooldowns could still apply
+        cooldown_minutes = self.config['notifications'].get('cooldown_minutes', 2)
+        ttl_minutes = max(settings.get('track_ttl_minutes', 60), cooldown_minutes)
+        max_tracks = settings.get('max_tracks', max(1000, 2 * len(self.registry)))
+
+        evicted = self.tracks.evict(now, ttl_minutes * 60, max_tracks)
+        if evicted:
+            METRICS.inc('tracks_evicted', evicted)
+            debug('evict', "[STATS] Evicted %d stale tracks, %d kept", evicted, len(self.tracks))
+
+    async def run(self):
+        """Main tracking loop"""
+        last_stats = time.monotonic()
+
+        self.log_banner()
         log("Tracker running. Waiting for aircraft...")
+        if self.config.get('profiling', {}).get('capture'):
+            self.start_capture()
 
+        errors = 0
         while True:
+            started = time.monotonic()
+            self.profiler.begin()
+            # Re-read each pass so reloaded settings apply immediately
+            stats_interval = self.config.get('monitoring', {}).get('stats_interval_seconds', 300)
+
             try:
-                aircraft_list = self.get_aircraft_data()
-                seen_aircraft = set()
-
-                if aircraft_list:
-                    for aircraft_data in aircraft_list:
-                        seen_aircraft.add(aircraft_data['icao24'])
-                        await self.check_and_notify(aircraft_data)
-
-                        airspace = self.config['airspace']
-                        if aircraft_data['latitude'] and aircraft_data['longitude']:
-                            distance_nm = self.haversine_distance(
-                                airspace['center_lat'], airspace['center_lon'],
-                                aircraft_data['latitude'], aircraft_data['longitude']
-                            )
-                            in_airspace = self.aircraft_state.get(aircraft_data['icao24'], {}).get('in_airspace')
-                            status = "IN RANGE" if in_airspace else "Outside"
-                            ground_status = "On Ground" if aircraft_data['on_ground'] else "Airborne"
-                            log(f"{aircraft_data['callsign']} - {status} - {ground_status} - {distance_nm:.1f}nm")
-                else:
-                    log("No tracked aircraft found")
-
-                # Check for disappeared aircraft (possible landings)
-                for aircraft_id, state in list(self.aircraft_state.items()):
-                    if aircraft_id not in seen_aircraft:
-                        was_in_airspace = state.get('in_airspace', False)
-                        was_on_ground = state.get('on_ground', False)
-                        consecutive_missing = state.get('consecutive_missing', 0) + 1
-                        left_airspace_time = state.get('left_airspace_time', None)
-
-                        recently_left_airspace = False
-                        if left_airspace_time:
-                            time_since_left = (datetime.now() - left_airspace_time).total_seconds()
-                            recently_left_airspace = time_since_left < 300
-
-                        if was_in_airspace and not was_on_ground and consecutive_missing >= 2:
-                            already_landed = state.get('landed', False)
-                            if not already_landed and self.should_notify('landing', aircraft_id):
-                                try:
-                                    idx = [x.lower() for x in self.config['aircraft']['icao24_codes']].index(aircraft_id)
-                                    callsign = self.config['aircraft']['tail_numbers'][idx]
-                                except (ValueError, IndexError):
-                                    callsign = aircraft_id.upper()
-                                message = f"**{callsign} LANDED**\nTime: {datetime.now().strftime('%H:%M')}\nReady to put away\n(Signal lost in airspace)"
-                                self.send_notification(message)
-                            del self.aircraft_state[aircraft_id]
-
-                        elif recently_left_airspace and not was_on_ground and consecutive_missing >= 1:
-                            already_landed = state.get('landed', False)
-                            if not already_landed and self.should_notify('landing', aircraft_id):
-                                try:
-                                    idx = [x.lower() for x in self.config['aircraft']['icao24_codes']].index(aircraft_id)
-                                    callsign = self.config['aircraft']['tail_numbers'][idx]
-                                except (ValueError, IndexError):
-                                    callsign = aircraft_id.upper()
-                                message = f"**{callsign} LANDED**\nTime: {datetime.now().strftime('%H:%M')}\nReady to put away\n(Left airspace then signal lost)"
-                                self.send_notification(message)
-                            del self.aircraft_state[aircraft_id]
+                if 'aircraft' in self.check_reload():
+                    self.log_banner()
+                self.profiler.lap('reload')
 
-                        else:
-                            self.aircraft_state[aircraft_id]['consecutive_missing'] = consecutive_missing
+                await self.poll_once()
+                self.profiler.end()
+                METRICS.observe('poll_seconds', time.monotonic() - started)
+                errors = 0
 
             except Exception as e:
                 log(f"[ERR] Tracking loop error: {e}")
                 import traceback
                 traceback.print_exc()
+                errors += 1
+                if errors >= self.config.get('monitoring', {}).get('max_poll_errors', MAX_POLL_ERRORS):
+                    log(f"[ERR] {errors} polls failed in a row - stopping the tracker")
+                    raise
 
-            await asyncio.sleep(poll_interval)
+            if time.monotonic() - last_stats >= stats_interval:
+                last_stats = time.monotonic()
+                if self.webhook.destinations:
+                    self.log_stats()
+                log_metrics()
+                self.profiler.log_summary()
 
+            # Subtract the time this poll took so the cadence doesn't drift
+            await asyncio.sleep(max(0.0, self.next_poll_delay - (time.monotonic() - started)))
 
-async def main():
-    config_path = sys.argv[1] if len(sys.argv) > 1 else 'tracker_config.json'
 
+def load_config(config_path):
+    """Read and validate a tracker config, exiting on errors"""
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
@@ -441,17 +1028,205 @@ async def main():
         sys.exit(1)
 
     if not config.get('aircraft', {}).get('icao24_codes'):
-        log("[ERR] No aircraft configured")
+        log(f"[ERR] No aircraft configured in {config_path}")
+        sys.exit(1)
+
+    return config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="FinalPing aircraft tracker")
+    parser.add_argument('configs', nargs='*',
+                        help="tracker config file(s); several share ADS-B queries "
+                             "(default tracker_config.json; with --supervise, the initial tenants)")
+    parser.add_argument('--record', metavar='PATH', help="append raw ADS-B responses to a gzip trace")
+    parser.add_argument('--replay', metavar='PATH', help="feed a recorded trace through the tracker")
+    parser.add_argument('--speed', default='max', help="replay speed: max, realtime or a multiplier")
+    parser.add_argument('--bench', action='store_true', help="benchmark the poll loop on synthetic fleets")
+    parser.add_argument('--bench-sizes', default=None, help="comma-separated fleet sizes")
+    parser.add_argument('--bench-polls', type=int, default=20, help="polls per fleet size")
+    parser.add_argument('--history', choices=('approaches', 'movements', 'track', 'events'),
+                        help="query the flight history and print JSON")
+    parser.add_argument('--aircraft', help="tail number or icao24 for --history")
+    parser.add_argument('--since', help="first day (YYYY-MM-DD) for --history; default 30 days ago")
+    parser.add_argument('--until', help="last day (YYYY-MM-DD) for --history; default today")
+    parser.add_argument('--supervise', action='store_true',
+                        help="host many users' trackers in this process, controlled over stdin")
+    parser.add_argument('--control-port', type=int, help="also accept supervisor control on this local port")
+    parser.add_argument('--workers', type=int, default=2, help="supervisor processes for parsing ADS-B responses")
+    parser.add_argument('--stdin-control', action='store_true',
+                        help='stop cleanly when {"cmd": "stop"} is read from stdin')
+    args = parser.parse_args()
+    if not args.configs and not args.supervise:
+        args.configs = ['tracker_config.json']
+    return args
+
+
+def query_history(config, config_path, args):
+    """Answer a --history query from the flight history as JSON on stdout"""
+    directory = flight_history.history_dir(config, config_path)
+    if directory is None or not os.path.isdir(directory):
+        log("[ERR] No flight history recorded for this config")
+        sys.exit(1)
+
+    until = flight_history.parse_day(args.until, end=True) if args.until else time.time()
+    since = flight_history.parse_day(args.since) if args.since else until - 30 * 86400
+
+    icao24 = None
+    if args.aircraft:
+        registry = FleetRegistry(config['aircraft'])
+        icao24 = next((entry.icao24 for entry in registry
+                       if entry.tail_number.upper() == args.aircraft.upper()), args.aircraft.lower())
+    if args.history in ('approaches', 'track') and not icao24:
+        log(f"[ERR] --history {args.history} needs --aircraft")
+        sys.exit(1)
+
+    if args.history == 'approaches':
+        result = flight_history.approaches(directory, icao24, since, until)
+    elif args.history == 'movements':
+        result = flight_history.movements(directory, since, until, icao24)
+    elif args.history == 'track':
+        result = flight_history.track(directory, icao24, since, until)
+    else:
+        result = flight_history.events(directory, since, until, icao24)
+    print(json.dumps(result))
+
+
+async def replay(config, trace_path, speed):
+    """Run a recorded trace against a local stub webhook server"""
+    from replay import StubWebhookServer, replay_config, replay_trace
+    stub = StubWebhookServer()
+    stub.start()
+    tracker = AviationTracker(replay_config(config, stub.url))
+    try:
+        await replay_trace(tracker, trace_path, speed)
+    finally:
+        await tracker.close()
+        stub.stop()
+
+    log(f"[STATS] Stub webhook server received {len(stub.received)} posts")
+    for destination, payload in stub.received:
+        text = next((v for v in (payload or {}).values() if isinstance(v, str)), '')
+        log(f"  {destination}: {text.splitlines()[0] if text else payload}")
+
+
+def install_stop_signal(task):
+    """Cancel task on SIGTERM so shutdown still flushes (no-op where unsupported)"""
+    def on_term():
+        log("Stop requested (SIGTERM)")
+        task.cancel()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, on_term)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+
+def watch_stdin_stop(task):
+    """Cancel task when {"cmd": "stop"} arrives on stdin.
+
+    Windows has no SIGTERM to catch, so the desktop app asks for a clean stop
+    this way before it falls back to killing the process.
+    """
+    loop = asyncio.get_running_loop()
+    def read():
+        for line in sys.stdin:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(request, dict) and request.get('cmd') == 'stop':
+                log("Stop requested (stdin)")
+                loop.call_soon_threadsafe(task.cancel)
+                return
+    threading.Thread(target=read, daemon=True, name='control').start()
+
+
+async def run_until_stopped(coro, stdin_control=False):
+    """Run coro until it returns or a stop is requested; either way the caller's cleanup runs"""
+    task = asyncio.ensure_future(coro)
+    install_stop_signal(task)
+    if stdin_control:
+        watch_stdin_stop(task)
+    try:
+        await task
+    except asyncio.CancelledError:
+        log("Tracker stopping")
+
+
+async def main():
+    args = parse_args()
+
+    if args.bench:
+        # Imported here, like replay, so normal runs don't pay for them at startup
+        import benchmark
+        sizes = [int(size) for size in args.bench_sizes.split(',')] if args.bench_sizes else benchmark.DEFAULT_SIZES
+        await benchmark.run_benchmark(AviationTracker, sizes, args.bench_polls)
+        return
+
+    if args.supervise:
+        import supervisor
+        await run_until_stopped(supervisor.run_supervisor(AviationTracker, HttpClient(pool_size=16), args.configs,
+                                                          args.control_port, args.workers))
+        return
+
+    configs = [load_config(path) for path in args.configs]
+    if args.history:
+        query_history(configs[0], args.configs[0], args)
+        return
+    configure_logging(configs[0].get('logging', {}), configs[0].get('verbose_debug'))
+    if (args.record or args.replay) and len(configs) > 1:
+        log("[ERR] --record and --replay take a single config")
         sys.exit(1)
 
-    tracker = AviationTracker(config)
+    if args.replay:
+        await replay(configs[0], args.replay, args.speed)
+        return
+
+    if len(configs) == 1:
+        runner = AviationTracker(configs[0], config_path=args.configs[0])
+        trackers = [runner]
+    else:
+        # Several airports/fleets: share one set of ADS-B queries between them
+        http = HttpClient()
+        trackers = [AviationTracker(config, http, path) for config, path in zip(configs, args.configs)]
+        runner = TrackingEngine(trackers, http)
+
+    if args.record:
+        from replay import TraceRecorder
+        runner.fetcher.recorder = TraceRecorder(args.record)
+        log(f"[OK] Recording ADS-B responses to {args.record}")
+
+    install_reload_signal([tracker.config_watcher for tracker in trackers])
+    install_capture_signal(trackers[0].start_capture)
+
+    metrics_server = None
+    metrics_port = configs[0].get('monitoring', {}).get('metrics_port')
+    if metrics_port:
+        try:
+            metrics_server = MetricsServer(metrics_port)
+            metrics_server.start()
+            log(f"[OK] Metrics at {metrics_server.url}")
+        except OSError as e:
+            log(f"[WARN] Metrics endpoint disabled: {e}")
+
     try:
-        await tracker.run()
+        await run_until_stopped(runner.run(), args.stdin_control)
     except KeyboardInterrupt:
         log("Tracker stopped by user")
+    finally:
+        # Write out a capture cut short by shutdown
+        CAPTURE.stop()
+        await runner.close()
+        if args.record:
+            runner.fetcher.recorder.close()
+        if metrics_server is not None:
+            metrics_server.stop()
 
 
 if __name__ == "__main__":
+    # The supervisor's parse pool starts worker processes from this binary
+    import multiprocessing
+    multiprocessing.freeze_support()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark harness for FinalPing
+
+Runs synthetic fleets of increasing size (default 1 to 10,000 aircraft)
+through the tracker's per-poll pipeline and reports polls/sec, median
+per-stage latency and peak traced memory:
+
+  parse     streaming adsb.lol JSON filter over the poll's response body
+  extract   picking tracked aircraft out of the parsed entries
+  geometry  batched distance/bearing/airspace pass
+  poll      full process_poll (geometry + state machine + missing check)
+  snapshot  incremental SQLite state snapshot
+
+Usage: aviation_tracker_discord_bot.py --bench [--bench-sizes 1,100,10000] [--bench-polls 20]
+"""
+
+import contextlib
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from math import radians, degrees, cos, sin
+
+from adsb_fetch import AcStreamFilter
+from event_log import log
+from state_store import StateStore
+
+DEFAULT_SIZES = (1, 10, 100, 1000, 10000)
+CENTER_LAT = 40.0
+CENTER_LON = -75.0
+POLL_SECONDS = 10
+
+STAGES = ('parse', 'extract', 'geometry', 'poll', 'snapshot')
+
+
+def synthetic_config(size):
+    codes = [f"{0xa00000 + i:06x}" for i in range(size)]
+    return {
+        'aircraft': {'tail_numbers': [f"N{i}BM" for i in range(size)], 'icao24_codes': codes},
+        'airspace': {
+            'name': 'Bench', 'center_lat': CENTER_LAT, 'center_lon': CENTER_LON,
+            'radius_nm': 5, 'field_elevation_ft_msl': 0, 'ceiling_ft_agl': 3000,
+            'query_radius_nm': 100, 'alert_distances_nm': [10.0, 5.0, 2.0],
+        },
+        'notifications': {'cooldown_minutes': 1},
+        'monitoring': {'poll_interval_seconds': POLL_SECONDS},
+        'state': {'enabled': False},
+    }
+
+
+class SyntheticTraffic:
+    """Aircraft flying straight at the field from random ranges and bearings"""
+
+    def __init__(self, codes, seed=1):
+        rng = random.Random(seed)
+        self.aircraft = [
+            {
+                'hex': code,
+                'distance': rng.uniform(3, 60),
+                'bearing': rng.uniform(0, 360),
+                'gs': rng.uniform(80, 200),
+            }
+            for code in codes
+        ]
+
+    def frame(self, seconds):
+        """Advance every aircraft and return adsb.lol-shaped entries"""
+        entries = []
+        for ac in self.aircraft:
+            ac['distance'] = max(0.2, ac['distance'] - ac['gs'] * seconds / 3600)
+            bearing = radians(ac['bearing'])
+            lat = CENTER_LAT + ac['distance'] / 60 * cos(bearing)
+            lon = CENTER_LON + ac['distance'] / 60 * sin(bearing) / cos(radians(CENTER_LAT))
+            entries.append({
+                'hex': ac['hex'], 'flight': 'BENCH   ', 'lat': lat, 'lon': lon,
+                'alt_baro': int(ac['distance'] * 300 + 300), 'gs': ac['gs'],
+                'track': (degrees(bearing) + 180) % 360,
+            })
+        return entries
+
+
+async def bench_fleet(tracker_cls, size, polls):
+    """Run one fleet size; returns {stage: [seconds per poll]}"""
+    tracker = tracker_cls(synthetic_config(size))
+    traffic = SyntheticTraffic(tracker.registry.codes)
+    sim_now = datetime.now()
+    timings = {stage: [] for stage in STAGES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StateStore(os.path.join(tmp, 'bench.state.db'))
+        try:
+            for _ in range(polls):
+                sim_now += timedelta(seconds=POLL_SECONDS)
+                tracker.now = lambda t=sim_now: t
+                body = json.dumps({'ac': traffic.frame(POLL_SECONDS)})
+
+                t0 = time.perf_counter()
+                stream = AcStreamFilter(tracker.registry.codes)
+                stream.feed(body)
+                stream.finish()
+                t1 = time.perf_counter()
+                aircraft_list = tracker.extract_aircraft(stream.found)
+                t2 = time.perf_counter()
+                tracker.compute_geometry(aircraft_list)
+                t3 = time.perf_counter()
+                await tracker.process_poll(aircraft_list)
+                t4 = time.perf_counter()
+                store.save(tracker.tracks)
+                t5 = time.perf_counter()
+
+                for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+                    timings[stage].append(seconds)
+        finally:
+            store.close()
+            await tracker.close()
+
+    return timings
+
+
+async def run_benchmark(tracker_cls, sizes=DEFAULT_SIZES, polls=20):
+    """Benchmark each fleet size and log a results table"""
+    results = []
+    for size in sizes:
+        # Tracker logging goes to the console per aircraft; keep it out of the numbers
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            timings = await bench_fleet(tracker_cls, size, polls)
+            tracemalloc.start()
+            await bench_fleet(tracker_cls, size, min(polls, 5))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        per_poll = [sum(stage) for stage in zip(*(timings[s] for s in STAGES if s != 'geometry'))]
+        results.append((size, timings, per_poll, peak))
+
+    log("=" * 78)
+    log(f"{'fleet':>6} {'polls/s':>9} " + ' '.join(f"{s + ' ms':>11}" for s in STAGES) + f" {'peak MB':>8}")
+    for size, timings, per_poll, peak in results:
+        medians = ' '.join(f"{statistics.median(timings[s]) * 1000:>11.2f}" for s in STAGES)
+        log(f"{size:>6} {1 / statistics.median(per_poll):>9.1f} {medians} {peak / 1024 / 1024:>8.1f}")
+    log("=" * 78)
+    return results
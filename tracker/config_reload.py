@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Hot config reload for FinalPing
+
+tracker_bridge.js rewrites tracker_config.json when settings change. The
+tracker polls the file's mtime/size once per loop (a single stat call) and,
+on POSIX, also reloads immediately on SIGHUP. Unreadable or half-written
+files are skipped and the current config stays in effect.
+"""
+
+import json
+import os
+import signal
+import asyncio
+
+from event_log import log
+
+
+def diff_sections(old, new):
+    """Top-level config sections whose contents differ"""
+    return {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+
+
+class ConfigWatcher:
+    """Notices when a config file changes on disk or a reload is requested"""
+
+    def __init__(self, path):
+        self.path = path
+        self._stamp = self._stat()
+        self._forced = False
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def request_reload(self):
+        self._forced = True
+
+    def poll(self):
+        """Return the freshly loaded config if the file changed, else None"""
+        stamp = self._stat()
+        if not self._forced and stamp == self._stamp:
+            return None
+        self._forced = False
+        self._stamp = stamp
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log(f"[WARN] Config reload skipped: {e}")
+            return None
+
+
+def install_reload_signal(watchers):
+    """Reload every watcher's config on SIGHUP (no-op where unsupported)"""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+    def on_hup():
+        log("Reload requested (SIGHUP)")
+        for watcher in watchers:
+            watcher.request_reload()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, on_hup)
+    except (NotImplementedError, RuntimeError):
+        pass
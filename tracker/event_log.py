@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Logging for FinalPing tracker modules
+
+Every line is an event with a level. The default text format is what a
+console user reads ("HH:MM:SS message"). With logging.format = "json" each
+event is one JSON line that the desktop app parses instead of scraping text:
+
+  {"t": 1718000000.123, "level": "info", "event": "aircraft", "msg": "...", ...fields}
+
+Events below logging.level (debug/info/warn/error, default info, debug when
+verbose_debug is set) are dropped before any formatting, so debug() calls in
+the poll loop cost one comparison when disabled. logging.sample_every maps an
+event name to N to keep only every Nth occurrence of a noisy event.
+
+Under the supervisor each tenant's tasks run with a TenantLog bound, which
+gives the tenant its own level/format settings and, optionally, its own log
+file; without a file its events go to stdout tagged with the tenant name.
+"""
+
+import contextvars
+import json
+import sys
+import time
+from math import inf
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARN: 'warn', ERROR: 'error'}
+_LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+_settings = {'level': INFO, 'json': False, 'sample_every': {}}
+_sample_counts = {}
+
+# Text timestamps only change once a second
+_clock = [None, '']
+
+_tenant = contextvars.ContextVar('finalping_tenant', default=None)
+
+
+class TenantLog:
+    """One supervised tenant's log settings and destination"""
+
+    __slots__ = ('name', 'stream', 'settings', 'sample_counts')
+
+    def __init__(self, name, stream=None):
+        self.name = name
+        self.stream = stream  # None: shared stdout, tagged with name
+        self.settings = dict(_settings)
+        self.sample_counts = {}
+
+
+def bind(tenant_log):
+    """Route this task's (and its child tasks') events to tenant_log"""
+    _tenant.set(tenant_log)
+
+
+def _current():
+    tenant = _tenant.get()
+    if tenant is None:
+        return None, _settings, _sample_counts
+    return tenant, tenant.settings, tenant.sample_counts
+
+
+def configure(settings, verbose=False):
+    """Apply a config's logging section (to the current tenant, if any)"""
+    _, target, counts = _current()
+    level = str(settings.get('level', 'debug' if verbose else 'info')).lower()
+    target['level'] = _LEVELS.get(level, INFO)
+    target['json'] = settings.get('format') == 'json'
+    target['sample_every'] = dict(settings.get('sample_every', {}))
+    counts.clear()
+
+
+def enabled(level):
+    """Whether events at level are written; guards payloads that cost something to build"""
+    return level >= _current()[1]['level']
+
+
+def _finite(value):
+    """value with non-finite floats spelled as JSON can carry them (None, '+Inf', '-Inf')"""
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value in (inf, -inf):
+            return '+Inf' if value > 0 else '-Inf'
+        return value
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def emit(level, event, msg, *args, **fields):
+    """Write one event; msg % args is only formatted if it will be written"""
+    tenant, settings, counts = _current()
+    if level < settings['level']:
+        return
+    every = settings['sample_every'].get(event)
+    if every and every > 1:
+        count = counts.get(event, 0)
+        counts[event] = count + 1
+        if count % every:
+            return
+
+    if args:
+        try:
+            msg = msg % args
+        except (TypeError, ValueError):
+            msg = f"{msg} {args!r}"
+    now = time.time()
+    shared = tenant is not None and tenant.stream is None
+    if settings['json']:
+        record = {'t': round(now, 3), 'level': LEVEL_NAMES.get(level, 'info'), 'event': event, 'msg': msg}
+        if tenant is not None:
+            record['tenant'] = tenant.name
+        record.update(fields)
+        try:
+            line = json.dumps(record, default=str, separators=(',', ':'), allow_nan=False)
+        except ValueError:
+            # NaN/inf can arrive from adsb.lol bodies or configs; JSON has no token for them
+            line = json.dumps(_finite(record), default=str, separators=(',', ':'))
+    else:
+        second = int(now)
+        if _clock[0] != second:
+            _clock[0] = second
+            _clock[1] = time.strftime('%H:%M:%S', time.localtime(now))
+        line = f"{_clock[1]} [{tenant.name}] {msg}" if shared else f"{_clock[1]} {msg}"
+
+    stream = sys.stdout if tenant is None or shared else tenant.stream
+    try:
+        stream.write(line + '\n')
+        stream.flush()
+    except (OSError, ValueError):
+        # A closed or full log file must not take the poll loop down with it
+        pass
+
+
+def log(msg, level=None, event='log', **fields):
+    """Print with timestamp; [ERR]/[WARN] prefixes set the level"""
+    if level is None:
+        level = ERROR if msg.startswith('[ERR]') else WARN if msg.startswith('[WARN]') else INFO
+    emit(level, event, msg, **fields)
+
+
+def debug(event, msg, *args, **fields):
+    emit(DEBUG, event, msg, *args, **fields)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Fleet registry for FinalPing
+
+Maps normalized ICAO24 hex codes to tail numbers and per-aircraft settings.
+Built once from the config's `aircraft` section and never mutated; a config
+change builds a new registry and swaps it in whole.
+"""
+
+from collections import namedtuple
+from types import MappingProxyType
+
+AircraftEntry = namedtuple('AircraftEntry', ['icao24', 'tail_number', 'settings'])
+
+EMPTY_SETTINGS = MappingProxyType({})
+
+
+def normalize_icao24(code):
+    """Lower-case, whitespace-free hex code ('' for missing codes)"""
+    return (code or '').strip().lower()
+
+
+class FleetRegistry:
+    """Immutable icao24 -> AircraftEntry lookup.
+
+    Per-aircraft settings come from an optional `aircraft.settings` dict keyed
+    by icao24 or tail number.
+    """
+
+    __slots__ = ('_entries', 'codes')
+
+    def __init__(self, aircraft_config):
+        tail_numbers = aircraft_config.get('tail_numbers', [])
+        overrides = aircraft_config.get('settings', {})
+
+        entries = {}
+        for i, code in enumerate(aircraft_config.get('icao24_codes', [])):
+            icao24 = normalize_icao24(code)
+            if not icao24:
+                continue
+            tail_number = tail_numbers[i] if i < len(tail_numbers) and tail_numbers[i] else icao24.upper()
+            settings = overrides.get(icao24) or overrides.get(code) or overrides.get(tail_number)
+            entries[icao24] = AircraftEntry(
+                icao24, tail_number,
+                MappingProxyType(dict(settings)) if settings else EMPTY_SETTINGS,
+            )
+
+        self._entries = MappingProxyType(entries)
+        self.codes = frozenset(entries)
+
+    def __contains__(self, icao24):
+        return icao24 in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def get(self, icao24):
+        return self._entries.get(icao24)
+
+    def tail_number(self, icao24):
+        """Tail number for a tracked aircraft, or the upper-cased hex if unknown"""
+        entry = self._entries.get(icao24)
+        return entry.tail_number if entry else icao24.upper()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Flight history for FinalPing
+
+Every position the tracker processes, and every alert, landing, retraction
+and takeoff, is appended to a per-day SQLite partition (<dir>/YYYY-MM-DD.db).
+A background thread writes them in batched transactions, so the poll loop
+only pays for one queue put per poll. Positions live in a WITHOUT ROWID table keyed by
+(icao24, t) with integer-scaled columns, which keeps a day of a large fleet
+compact and turns "this aircraft between these times" into a range scan.
+Events are indexed by aircraft and by kind. Whole partitions are deleted
+once they are older than history.retention_days (default 90).
+
+Queries (approaches, movements, track, events) read the partitions directly
+and back the --history command line mode the desktop app uses.
+"""
+
+import glob
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from event_log import log
+from metrics import METRICS
+
+# Positions are stored as integers: 1e-5 degrees (~1m), feet, knots, degrees
+COORD_SCALE = 100000
+
+# Writer batching: queued polls are written together up to this many, or
+# after FLUSH_SECONDS
+BATCH_POLLS = 50
+FLUSH_SECONDS = 1.0
+
+# How far before a landing an approach path starts, if nothing earlier bounds it
+APPROACH_LOOKBACK_SECONDS = 20 * 60
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS positions (
+        icao24 TEXT NOT NULL, t REAL NOT NULL, lat INTEGER NOT NULL, lon INTEGER NOT NULL,
+        alt INTEGER, gs INTEGER, track INTEGER, PRIMARY KEY (icao24, t)) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS events (
+        t REAL NOT NULL, icao24 TEXT NOT NULL, kind TEXT NOT NULL, detail TEXT)''',
+    'CREATE INDEX IF NOT EXISTS events_by_aircraft ON events (icao24, t)',
+    'CREATE INDEX IF NOT EXISTS events_by_kind ON events (kind, t)',
+)
+
+
+def history_dir(config, config_path):
+    """Partition directory for a config, or None if history is off"""
+    settings = config.get('history', {})
+    if not settings.get('enabled', True):
+        return None
+    if settings.get('path'):
+        return settings['path']
+    if config_path:
+        return os.path.splitext(config_path)[0] + '.history'
+    return None
+
+
+def _scaled(value):
+    return None if value is None else int(round(value))
+
+
+class FlightHistory:
+    """Append-only writer for the day partitions"""
+
+    def __init__(self, directory, retention_days=90, queue_size=1000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.retention_days = retention_days
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._writer, name='flight-history', daemon=True)
+        self._thread.start()
+
+    def record_positions(self, t, positions):
+        """One poll's (icao24, lat, lon, alt_ft, gs, track) tuples, all seen at t"""
+        if positions:
+            self._put(('p', t, positions))
+
+    def record_event(self, t, icao24, kind, detail=''):
+        self._put(('e', t, [(t, icao24, kind, detail)]))
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            METRICS.inc('history_dropped', len(item[2]))
+
+    def close(self, timeout=10):
+        """Flush queued rows and stop the writer, waiting at most timeout seconds
+
+        Blocks; callers on the event loop run it in an executor.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            # The writer is stuck; it is a daemon thread, so give up on the backlog
+            log(f"[WARN] Flight history writer did not drain {self.queue.qsize()} queued polls")
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+
+    # Writer thread
+
+    def _writer(self):
+        partitions = {}
+        try:
+            while True:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + FLUSH_SECONDS
+                while batch[-1] is not None and len(batch) < BATCH_POLLS:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                items = [item for item in batch if item is not None]
+                if items:
+                    self._write(partitions, items)
+                if batch[-1] is None:
+                    break
+        finally:
+            for conn in partitions.values():
+                conn.close()
+
+    def _write(self, partitions, items):
+        by_day = {}
+        for kind, t, rows in items:
+            positions, events = by_day.setdefault(date.fromtimestamp(t), ([], []))
+            if kind == 'e':
+                events.extend(rows)
+                continue
+            # Scaling happens here, off the poll loop
+            for icao24, lat, lon, alt, gs, heading in rows:
+                positions.append((icao24, t, int(round(lat * COORD_SCALE)), int(round(lon * COORD_SCALE)),
+                                  _scaled(alt), _scaled(gs), _scaled(heading)))
+
+        for day, (positions, events) in by_day.items():
+            try:
+                conn = self._partition(partitions, day)
+                with conn:
+                    conn.executemany('INSERT OR IGNORE INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)', positions)
+                    conn.executemany('INSERT INTO events VALUES (?, ?, ?, ?)', events)
+                METRICS.inc('history_rows', len(positions) + len(events))
+            except sqlite3.Error as e:
+                METRICS.inc('history_dropped', len(positions) + len(events))
+                log(f"[ERR] Writing flight history for {day}: {e}")
+
+    def _partition(self, partitions, day):
+        conn = partitions.get(day)
+        if conn is not None:
+            return conn
+
+        # A new day: close partitions nobody writes to any more and apply retention
+        for old in [d for d in partitions if d < day - timedelta(days=1)]:
+            partitions.pop(old).close()
+        self._expire(day)
+
+        conn = sqlite3.connect(os.path.join(self.directory, f"{day.isoformat()}.db"))
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        partitions[day] = conn
+        return conn
+
+    def _expire(self, today):
+        cutoff = (today - timedelta(days=self.retention_days)).isoformat()
+        for path in glob.glob(os.path.join(self.directory, '????-??-??.db*')):
+            if os.path.basename(path)[:10] < cutoff:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    log(f"[WARN] Removing old flight history {path}: {e}")
+
+
+# Queries
+
+def _partitions(directory, since, until):
+    """Open read-only connections to partitions overlapping [since, until] (epoch seconds)"""
+    first = date.fromtimestamp(since).isoformat()
+    last = date.fromtimestamp(until).isoformat()
+    for path in sorted(glob.glob(os.path.join(directory, '????-??-??.db'))):
+        day = os.path.basename(path)[:10]
+        if first <= day <= last:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                yield day, conn
+            finally:
+                conn.close()
+
+
+def track(directory, icao24, since, until):
+    """Positions for one aircraft, oldest first"""
+    points = []
+    for _, conn in _partitions(directory, since, until):
+        for t, lat, lon, alt, gs, heading in conn.execute(
+                'SELECT t, lat, lon, alt, gs, track FROM positions WHERE icao24 = ? AND t BETWEEN ? AND ? ORDER BY t',
+                (icao24, since, until)):
+            points.append({'t': t, 'lat': lat / COORD_SCALE, 'lon': lon / COORD_SCALE,
+                           'alt_ft': alt, 'gs': gs, 'track': heading})
+    return points
+
+
+def events(directory, since, until, icao24=None, kinds=None):
+    """Events oldest first, optionally for one aircraft and/or some kinds"""
+    sql = 'SELECT t, icao24, kind, detail FROM events WHERE t BETWEEN ? AND ?'
+    params = [since, until]
+    if icao24:
+        sql += ' AND icao24 = ?'
+        params.append(icao24)
+    if kinds:
+        sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+        params.extend(kinds)
+    found = []
+    for _, conn in _partitions(directory, since, until):
+        for t, code, kind, detail in conn.execute(sql + ' ORDER BY t', params):
+            found.append({'t': t, 'icao24': code, 'kind': kind, 'detail': detail})
+    return found
+
+
+def approaches(directory, icao24, since, until):
+    """Each landing by an aircraft with the path that led to it"""
+    landings = events(directory, since, until, icao24, ['landed', 'takeoff', 'retracted'])
+    result = []
+    start = since
+    for i, event in enumerate(landings):
+        if event['kind'] == 'landed':
+            retracted = i + 1 < len(landings) and landings[i + 1]['kind'] == 'retracted'
+            begin = max(start, event['t'] - APPROACH_LOOKBACK_SECONDS)
+            result.append({
+                'landed_at': event['t'], 'detail': event['detail'], 'retracted': retracted,
+                'path': track(directory, icao24, begin, event['t']),
+            })
+        start = event['t']
+    return result
+
+
+def movements(directory, since, until, icao24=None):
+    """Landings and takeoffs per day"""
+    days = {}
+    for event in events(directory, since, until, icao24, ['landed', 'retracted', 'takeoff']):
+        day = days.setdefault(date.fromtimestamp(event['t']).isoformat(), {'landings': 0, 'takeoffs': 0})
+        if event['kind'] == 'takeoff':
+            day['takeoffs'] += 1
+        else:
+            day['landings'] += 1 if event['kind'] == 'landed' else -1
+    return [dict(date=day, **counts) for day, counts in sorted(days.items())]
+
+
+def parse_day(text, end=False):
+    """Epoch seconds for a YYYY-MM-DD (start of day, or end of day if end)"""
+    day = datetime.strptime(text, '%Y-%m-%d')
+    if end:
+        day += timedelta(days=1, microseconds=-1)
+    return day.timestamp()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Geofences for FinalPing
+
+Polygons and corridors that refine the airspace circle and raise their own
+alerts. Fences are projected once per config load into the flat nm frame the
+motion model uses (centred on the airspace) and bucketed into a uniform
+grid, so each aircraft is only tested against the few fences whose bounding
+boxes share its grid cell, however many fences are configured.
+
+geofences config (a list); each fence is one of
+  polygon    [[lat, lon], ...] ring, closing point optional
+  corridor   {path: [[lat, lon], ...], width_nm}: within width_nm / 2 of the
+             path, e.g. a runway's final approach
+  geojson    path to a GeoJSON file, relative to the config file. Polygon and
+             MultiPolygon features become polygons (holes included),
+             LineStrings corridors (properties.width_nm); properties supply
+             the keys below
+plus
+  name            label for alerts and logs (default "fence N")
+  floor_ft_agl    vertical band (default the airspace's floor/ceiling)
+  ceiling_ft_agl
+  airspace        true: this fence is part of the tracked airspace. Once any
+                  fence sets it, in-airspace means inside one of those fences
+                  instead of within airspace.radius_nm
+  alert           'enter', 'exit', 'both' or 'none' (default 'enter', or
+                  'none' for airspace fences)
+"""
+
+import json
+import os
+from collections import namedtuple
+from math import floor, hypot
+
+from motion_model import project
+from track_table import fence_bit
+
+# Grid cells are at least this big, and grow so the largest fence spans at
+# most MAX_CELLS_ACROSS cells a side
+GRID_CELL_NM = 1.0
+MAX_CELLS_ACROSS = 64
+
+DEFAULT_CORRIDOR_WIDTH_NM = 1.0
+
+# edges are (x1, y1, x2, y2) in nm; half_width is None for polygons
+Fence = namedtuple('Fence', ['name', 'edges', 'half_width', 'bbox', 'floor_ft_agl', 'ceiling_ft_agl',
+                             'airspace', 'on_enter', 'on_exit', 'bit'])
+
+
+def _edges(points, closed):
+    pairs = zip(points, points[1:] + points[:1] if closed else points[1:])
+    return tuple((x1, y1, x2, y2) for (x1, y1), (x2, y2) in pairs if (x1, y1) != (x2, y2))
+
+
+def _inside_polygon(edges, x, y):
+    """Even-odd rule, so holes (extra rings in edges) are outside"""
+    inside = False
+    for x1, y1, x2, y2 in edges:
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def _near_path(edges, x, y, half_width):
+    for x1, y1, x2, y2 in edges:
+        dx, dy = x2 - x1, y2 - y1
+        t = ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)
+        t = 0.0 if t < 0 else 1.0 if t > 1 else t
+        if hypot(x - x1 - t * dx, y - y1 - t * dy) <= half_width:
+            return True
+    return False
+
+
+class FenceIndex:
+    """Compiled fences bucketed into a uniform grid"""
+
+    __slots__ = ('fences', 'cell_nm', 'cells', 'airspace_mask', 'extent_nm')
+
+    def __init__(self, fences):
+        self.fences = tuple(fences)
+        self.airspace_mask = 0
+        span = 0.0
+        for fence in self.fences:
+            if fence.airspace:
+                self.airspace_mask |= fence.bit
+            min_x, min_y, max_x, max_y = fence.bbox
+            span = max(span, max_x - min_x, max_y - min_y)
+        self.cell_nm = max(GRID_CELL_NM, span / MAX_CELLS_ACROSS)
+        self.extent_nm = max((hypot(x, y) for f in self.fences for x in f.bbox[::2] for y in f.bbox[1::2]),
+                             default=0.0)
+
+        cells = {}
+        for fence in self.fences:
+            min_x, min_y, max_x, max_y = fence.bbox
+            for i in range(floor(min_x / self.cell_nm), floor(max_x / self.cell_nm) + 1):
+                for j in range(floor(min_y / self.cell_nm), floor(max_y / self.cell_nm) + 1):
+                    cells.setdefault((i, j), []).append(fence)
+        self.cells = {cell: tuple(members) for cell, members in cells.items()}
+
+    def __len__(self):
+        return len(self.fences)
+
+    def containing(self, x, y, altitude_agl_ft, on_ground):
+        """Bit mask of the fences containing a point (x, y nm from the centre).
+
+        altitude_agl_ft is None without an altitude; the aircraft then counts
+        as inside a fence's band only while on the ground.
+        """
+        members = self.cells.get((floor(x / self.cell_nm), floor(y / self.cell_nm)))
+        if not members:
+            return 0
+        mask = 0
+        for fence in members:
+            min_x, min_y, max_x, max_y = fence.bbox
+            if not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            if altitude_agl_ft is None:
+                if not on_ground:
+                    continue
+            elif not fence.floor_ft_agl <= altitude_agl_ft <= fence.ceiling_ft_agl:
+                continue
+            if fence.half_width is None:
+                if not _inside_polygon(fence.edges, x, y):
+                    continue
+            elif not _near_path(fence.edges, x, y, fence.half_width):
+                continue
+            mask |= fence.bit
+        return mask
+
+
+def _geojson_specs(path):
+    """Fence specs for the features of a GeoJSON file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    features = data.get('features', [data]) if data.get('type') == 'FeatureCollection' else [data]
+    specs = []
+    for n, feature in enumerate(features, 1):
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        kind, coordinates = geometry.get('type'), geometry.get('coordinates')
+        name = properties.get('name', f"{os.path.basename(path)} #{n}")
+        # GeoJSON positions are [lon, lat]
+        if kind == 'Polygon':
+            polygons = [coordinates]
+        elif kind == 'MultiPolygon':
+            polygons = coordinates
+        elif kind == 'LineString':
+            path_points = [[lat, lon] for lon, lat, *_ in coordinates]
+            specs.append({**properties, 'name': name,
+                          'corridor': {'path': path_points, 'width_nm': properties.get('width_nm')}})
+            continue
+        else:
+            raise ValueError(f"{path}: unsupported geometry {kind}")
+        rings = [[[lat, lon] for lon, lat, *_ in ring] for polygon in polygons for ring in polygon]
+        specs.append({**properties, 'name': name, 'rings': rings})
+    return specs
+
+
+def compile_fences(config, base_dir=None):
+    """FenceIndex for a config's geofences section; raises ValueError on bad fences"""
+    airspace = config['airspace']
+    center_lat, center_lon = airspace['center_lat'], airspace['center_lon']
+
+    def xy(point):
+        return project(center_lat, center_lon, float(point[0]), float(point[1]))
+
+    specs = []
+    for spec in config.get('geofences', []):
+        if 'geojson' in spec:
+            path = os.path.join(base_dir or '', spec['geojson'])
+            try:
+                loaded = _geojson_specs(path)
+            except OSError as e:
+                raise ValueError(f"can't read {path}: {e.strerror}")
+            specs.extend({**spec, **fence} for fence in loaded)
+        else:
+            specs.append(spec)
+
+    fences = []
+    names = set()
+    for n, spec in enumerate(specs, 1):
+        name = str(spec.get('name') or f"fence {n}")
+        if name in names:
+            raise ValueError(f"duplicate geofence name {name!r}")
+        names.add(name)
+
+        if 'corridor' in spec:
+            corridor = spec['corridor']
+            points = [xy(p) for p in corridor.get('path', [])]
+            half_width = float(corridor.get('width_nm') or DEFAULT_CORRIDOR_WIDTH_NM) / 2
+            edges = _edges(points, closed=False)
+            pad = half_width
+        else:
+            rings = spec.get('rings') or [spec.get('polygon', [])]
+            points = [xy(p) for ring in rings for p in ring]
+            half_width = None
+            edges = tuple(e for ring in rings for e in _edges([xy(p) for p in ring], closed=True))
+            pad = 0.0
+        if not edges:
+            raise ValueError(f"geofence {name!r} has no area")
+
+        xs, ys = [p[0] for p in points], [p[1] for p in points]
+        bbox = (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+        is_airspace = bool(spec.get('airspace'))
+        alert = spec.get('alert', 'none' if is_airspace else 'enter')
+        if alert not in ('enter', 'exit', 'both', 'none'):
+            raise ValueError(f"geofence {name!r}: alert must be enter, exit, both or none")
+        fences.append(Fence(
+            name, edges, half_width, bbox,
+            spec.get('floor_ft_agl', airspace.get('floor_ft_agl', 0)),
+            spec.get('ceiling_ft_agl', airspace.get('ceiling_ft_agl', 3000)),
+            is_airspace, alert in ('enter', 'both'), alert in ('exit', 'both'), fence_bit(name),
+        ))
+    return FenceIndex(fences)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Gap-tolerant landing detection for FinalPing
+
+When a tracked aircraft stops appearing in ADS-B data, its position and
+altitude are dead-reckoned from the motion model and scored for how likely
+a landing is: low and descending, near or heading into the field. A landing
+is only called once the gap has lasted landing.min_gap_seconds (time, not a
+poll count, so it holds at any poll interval) and the score clears
+landing.confirm_score. If the aircraft comes back airborne where dead
+reckoning says it should be, the call is retracted; if it comes back on the
+ground it is confirmed.
+
+landing settings:
+  min_gap_seconds         shortest gap that can be called a landing (default 30)
+  max_gap_seconds         stop following an undecided aircraft after this (default 600)
+  confirm_score           likelihood needed to call a landing (default 0.6)
+  watch_score             below this a missing aircraft isn't worth fast polling (default 0.25)
+  retract_window_seconds  how long an inferred landing can still be retracted (default 900)
+  retract_min_agl_ft      reappearing above this counts as still flying (default 400)
+"""
+
+from collections import namedtuple
+from math import hypot
+
+from motion_model import project
+from track_table import IN_AIRSPACE
+
+# Don't extrapolate a track further than this past its last sample
+MAX_DEAD_RECKON_SECONDS = 120
+
+# Without a motion model, leaving the airspace this recently still counts
+RECENTLY_LEFT_SECONDS = 300
+
+# Reappearing within this of the dead-reckoned position (plus a share of the
+# distance flown during the gap) means it never landed
+RETRACT_MATCH_NM = 2.0
+RETRACT_MATCH_FRACTION = 0.25
+
+# Score weights: low altitude, descending, near the field, heading in
+WEIGHTS = (0.35, 0.2, 0.3, 0.15)
+
+Assessment = namedtuple('Assessment', ['verdict', 'score', 'gap_seconds', 'distance_nm', 'altitude_agl_ft'])
+
+
+def _clamp(value):
+    return 0.0 if value < 0 else 1.0 if value > 1 else value
+
+
+def dead_reckon(motion, field_elevation, now):
+    """(distance_nm, altitude_agl_ft) extrapolated to now, or None without a model"""
+    if motion is None:
+        return None
+    t = min(now, motion.t + MAX_DEAD_RECKON_SECONDS)
+    x, y = motion.position_at(t)
+    alt = motion.altitude_at(t)
+    return hypot(x, y), None if alt is None else max(0.0, alt - field_elevation)
+
+
+def landing_score(track, airspace, now):
+    """(score 0..1, distance_nm, altitude_agl_ft) for a missing aircraft"""
+    gap = now - track.last_update if track.last_update is not None else 0.0
+    reckoned = dead_reckon(track.motion, airspace.get('field_elevation_ft_msl', 0), now)
+
+    if reckoned is None:
+        # No motion history (e.g. restored from an older snapshot): fall back on flags
+        if track.has(IN_AIRSPACE):
+            return 0.7, track.last_distance, None
+        left = track.left_airspace_time
+        if left is not None and now - left < RECENTLY_LEFT_SECONDS:
+            return 0.6, track.last_distance, None
+        return 0.1, track.last_distance, None
+
+    distance, agl = reckoned
+    motion = track.motion
+    low = 0.5 if agl is None else _clamp(1 - agl / 1500.0)
+    descending = _clamp((200.0 - motion.vs) / 700.0)
+    near = _clamp(1 - (distance - airspace['radius_nm']) / 5.0)
+    eta = motion.eta_seconds()
+    heading_in = 1.0 if eta is not None and eta <= gap + 120 else 0.3 if eta is not None else 0.0
+
+    score = sum(w * s for w, s in zip(WEIGHTS, (low, descending, near, heading_in)))
+    return score, distance, agl
+
+
+def assess(track, airspace, settings, now):
+    """Assessment for a missing aircraft.
+
+    verdict is 'landed' (call it), 'lost' (stop following) or None (keep
+    waiting for it to come back).
+    """
+    gap = now - track.last_update if track.last_update is not None else 0.0
+    score, distance, agl = landing_score(track, airspace, now)
+
+    verdict = None
+    if gap >= settings.get('min_gap_seconds', 30) and score >= settings.get('confirm_score', 0.6):
+        verdict = 'landed'
+    elif gap >= settings.get('max_gap_seconds', 600):
+        verdict = 'lost'
+    return Assessment(verdict, score, gap, distance, agl)
+
+
+def review(track, airspace, settings, aircraft_data, altitude_agl_ft, now):
+    """'confirmed', 'retracted' or 'new_flight' for an inferred landing whose aircraft is back"""
+    if aircraft_data['on_ground'] or altitude_agl_ft < 200:
+        return 'confirmed'
+
+    x, y = project(airspace['center_lat'], airspace['center_lon'],
+                   aircraft_data['latitude'], aircraft_data['longitude'])
+    motion = track.motion
+    if motion is not None and altitude_agl_ft >= settings.get('retract_min_agl_ft', 400):
+        ex, ey = motion.position_at(now)
+        flown = hypot(ex - motion.x, ey - motion.y)
+        if hypot(x - ex, y - ey) <= RETRACT_MATCH_NM + RETRACT_MATCH_FRACTION * flown:
+            return 'retracted'
+    # Airborne somewhere unrelated: it landed and has since taken off again
+    return 'new_flight'
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Runtime metrics for FinalPing
+
+One process-wide registry of counters and histograms: poll latency, ADS-B
+requests and bytes, alerts sent and webhook outcomes. It is logged as a
+"metrics" event every stats interval, and served as Prometheus text on
+http://127.0.0.1:<port>/metrics when monitoring.metrics_port is set.
+"""
+
+import threading
+from bisect import bisect_left
+from math import inf
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from event_log import log
+
+# Poll latency histogram bucket upper bounds (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 'finalping_'
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Histogram:
+    """Fixed-bucket histogram"""
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile (inf past the last bound)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return inf
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def snapshot(self):
+        """Flat {name: value} for the periodic metrics event"""
+        snapshot = dict(self.counters)
+        for name, h in list(self.histograms.items()):
+            snapshot[f"{name}_count"] = h.count
+            for q in (0.5, 0.95, 0.99):
+                # JSON has no infinity; use Prometheus' spelling of the overflow bucket
+                value = h.quantile(q)
+                snapshot[f"{name}_p{int(q * 100)}"] = '+Inf' if value == inf else value
+        return snapshot
+
+    def summary(self):
+        """One-line human summary"""
+        parts = [f"{name}={value}" for name, value in sorted(self.counters.items())]
+        for name, h in sorted(self.histograms.items()):
+            if h.count:
+                parts.append(f"{name} p50<={h.quantile(0.5)} p95<={h.quantile(0.95)}")
+        return ', '.join(parts)
+
+    def render(self):
+        """Prometheus text exposition"""
+        lines = []
+        for key, value in sorted(list(self.counters.items())):
+            lines.append(f"{PREFIX}{key} {value}")
+        for name, h in sorted(list(self.histograms.items())):
+            cumulative = 0
+            for bound, count in zip(h.bounds, h.counts):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}{name}_bucket{{le="+Inf"}} {h.count}')
+            lines.append(f"{PREFIX}{name}_sum {h.total:.6f}")
+            lines.append(f"{PREFIX}{name}_count {h.count}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def log_metrics():
+    """Periodic metrics record on the event stream"""
+    log(f"[STATS] {METRICS.summary()}", event='metrics', **METRICS.snapshot())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer:
+    """Local-only HTTP /metrics endpoint on a background thread"""
+
+    def __init__(self, port):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _MetricsHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/metrics"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
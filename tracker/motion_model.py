@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Per-aircraft motion model for FinalPing
+
+An alpha-beta filter over each aircraft's position in a flat nm frame centred
+on the airspace, blended with the ground speed and track adsb.lol reports,
+plus an alpha-beta filter over altitude. Each sample is an O(1) update. The
+filtered state predicts when the aircraft will cross an alert boundary and
+when it will reach the field, which the alerts use for their ETA and the poll
+scheduler uses to poll right after a crossing instead of finding out later.
+"""
+
+from math import radians, cos, sin, sqrt
+
+# Position gains; tuned for 3-30s between samples
+ALPHA = 0.5
+BETA = 0.2
+
+# Weight of a reported gs/track against the filtered velocity
+VELOCITY_GAIN = 0.6
+
+# Altitude gains
+ALT_ALPHA = 0.5
+ALT_BETA = 0.3
+
+# Restart the filter after a gap this long rather than trust the old state
+MAX_GAP_SECONDS = 120
+
+# Close enough to the field to count as arrived
+TOUCHDOWN_RADIUS_NM = 0.5
+
+# Range rates below this (kts) are treated as "not really moving"
+MIN_CLOSING_KTS = 5.0
+
+
+def project(center_lat, center_lon, lat, lon):
+    """(x east, y north) in nm from the airspace centre"""
+    return (lon - center_lon) * 60.0 * cos(radians(center_lat)), (lat - center_lat) * 60.0
+
+
+class MotionState:
+    """Filtered position (nm), velocity (kts), altitude (ft) and vertical speed (fpm)"""
+
+    __slots__ = ('t', 'x', 'y', 'vx', 'vy', 'alt', 'vs', 'samples')
+
+    def __init__(self, t, x, y, vx=0.0, vy=0.0, alt=None, vs=0.0, samples=1):
+        self.t = t
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.alt = alt
+        self.vs = vs
+        self.samples = samples
+
+    @classmethod
+    def start(cls, t, x, y, gs=None, track=None, alt=None, vs=None):
+        vx, vy = _velocity(gs, track) or (0.0, 0.0)
+        return cls(t, x, y, vx, vy, alt, vs or 0.0)
+
+    def update(self, t, x, y, gs=None, track=None, alt=None, vs=None):
+        """Fold in one sample; returns the state to keep (a fresh one after a gap)"""
+        dt = t - self.t
+        if dt <= 0:
+            return self
+        if dt > MAX_GAP_SECONDS:
+            return MotionState.start(t, x, y, gs, track, alt, vs)
+
+        hours = dt / 3600.0
+        px = self.x + self.vx * hours
+        py = self.y + self.vy * hours
+        rx, ry = x - px, y - py
+        self.x = px + ALPHA * rx
+        self.y = py + ALPHA * ry
+        self.vx += BETA * rx / hours
+        self.vy += BETA * ry / hours
+
+        measured = _velocity(gs, track)
+        if measured:
+            self.vx += VELOCITY_GAIN * (measured[0] - self.vx)
+            self.vy += VELOCITY_GAIN * (measured[1] - self.vy)
+
+        if alt is not None:
+            if self.alt is None:
+                self.alt = alt
+            else:
+                minutes = dt / 60.0
+                predicted = self.alt + self.vs * minutes
+                residual = alt - predicted
+                self.alt = predicted + ALT_ALPHA * residual
+                self.vs += ALT_BETA * residual / minutes
+            if vs is not None:
+                self.vs += VELOCITY_GAIN * (vs - self.vs)
+
+        self.t = t
+        self.samples += 1
+        return self
+
+    def position_at(self, t):
+        hours = (t - self.t) / 3600.0
+        return self.x + self.vx * hours, self.y + self.vy * hours
+
+    def altitude_at(self, t):
+        return None if self.alt is None else self.alt + self.vs * (t - self.t) / 60.0
+
+    def distance(self):
+        return sqrt(self.x * self.x + self.y * self.y)
+
+    def closing_kts(self):
+        """Rate the distance to the field is shrinking (negative when opening)"""
+        d = self.distance()
+        if d < 1e-6:
+            return 0.0
+        return -(self.x * self.vx + self.y * self.vy) / d
+
+    def time_to_radius(self, radius):
+        """Seconds until the straight-line track next crosses radius nm, or None"""
+        a = self.vx * self.vx + self.vy * self.vy
+        if a < 1e-9:
+            return None
+        b = 2 * (self.x * self.vx + self.y * self.vy)
+        c = self.x * self.x + self.y * self.y - radius * radius
+        disc = b * b - 4 * a * c
+        if disc < 0:
+            return None
+        root = sqrt(disc)
+        for hours in sorted(((-b - root) / (2 * a), (-b + root) / (2 * a))):
+            if hours > 0:
+                return hours * 3600.0
+        return None
+
+    def next_crossing(self, boundaries):
+        """Seconds until the next crossing of any boundary (nm), or None"""
+        times = [s for s in (self.time_to_radius(b) for b in boundaries) if s is not None]
+        return min(times) if times else None
+
+    def eta_seconds(self):
+        """Seconds until the aircraft reaches the field, or None if it isn't heading there"""
+        if self.distance() <= TOUCHDOWN_RADIUS_NM:
+            return 0.0
+        seconds = self.time_to_radius(TOUCHDOWN_RADIUS_NM)
+        if seconds is not None:
+            return seconds
+        closing = self.closing_kts()
+        if closing < MIN_CLOSING_KTS:
+            return None
+        # Not pointed straight at the field (e.g. in the pattern); use the range rate
+        return max(0.0, self.distance() - TOUCHDOWN_RADIUS_NM) / closing * 3600.0
+
+    def to_row(self):
+        return [self.t, self.x, self.y, self.vx, self.vy, self.alt, self.vs, self.samples]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+def _velocity(gs, track):
+    """Reported ground speed (kts) and track (deg) as (vx, vy)"""
+    if gs is None or track is None:
+        return None
+    heading = radians(track)
+    return gs * sin(heading), gs * cos(heading)
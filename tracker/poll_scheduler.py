@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive poll scheduling for FinalPing
+
+Chooses the delay before the next ADS-B poll from how soon any tracked
+aircraft will reach an alert boundary: fast when something is about to
+cross 2nm or is on short final, slow when everything is far away, and
+backing off exponentially when nothing has been seen for a while. When the
+motion model predicts a crossing soon, the next poll is timed to land just
+after it so the alert goes out without waiting a full interval.
+
+monitoring settings:
+  poll_interval_seconds      normal interval (default 10)
+  min_poll_interval_seconds  fastest allowed (default 3)
+  max_poll_interval_seconds  slowest allowed (default 60)
+  idle_after_seconds         start backing off after this long with nothing seen (default 120)
+  adaptive_polling           false to always use poll_interval_seconds
+
+With a healthy local receiver the tracker polls it every
+receiver_poll_interval_seconds, but adsb.lol is still only queried once
+this delay has passed; in between the last REST result is reused.
+"""
+
+import time
+
+# Closure rates below this (kts) are treated as "not really moving"
+MIN_CLOSURE_KTS = 5.0
+
+# Sample at least this many times between now and the next boundary crossing
+SAMPLES_PER_CROSSING = 2
+
+# Poll this long after a predicted crossing, to be sure it has happened
+CROSSING_MARGIN_SECONDS = 2.0
+
+# An adsb.lol result this close to the REST delay is refetched rather than
+# reused, so a poll that wakes a little early doesn't skip a whole interval
+REST_SLACK_SECONDS = 0.5
+
+
+class PollScheduler:
+    """Tracks idle time and turns per-poll observations into the next delay"""
+
+    def __init__(self):
+        self.last_seen = time.monotonic()
+        self.idle_polls = 0
+
+    def next_delay(self, monitoring, boundaries, observations, pending=False):
+        """Seconds until the next poll.
+
+        boundaries are the distances (nm) where something happens; observations
+        are (distance_nm, closure_kts, crossing_seconds) for airborne tracked
+        aircraft, crossing_seconds being the motion model's predicted time to
+        the next boundary (None if unknown); pending means a missing aircraft
+        is still waiting on landing detection.
+        """
+        base = monitoring.get('poll_interval_seconds', 10)
+        if not monitoring.get('adaptive_polling', True):
+            return base
+        fastest = min(base, monitoring.get('min_poll_interval_seconds', 3))
+        slowest = max(base, monitoring.get('max_poll_interval_seconds', 60))
+
+        now = time.monotonic()
+        if observations or pending:
+            self.last_seen = now
+            self.idle_polls = 0
+        elif now - self.last_seen >= monitoring.get('idle_after_seconds', 120):
+            self.idle_polls += 1
+            return min(slowest, base * 2 ** min(self.idle_polls, 8))
+
+        delay = base if pending or not observations else slowest
+        for distance, closure, crossing in observations:
+            delay = min(delay, self._delay_for(distance, closure, crossing, boundaries, base, slowest))
+        return max(fastest, delay)
+
+    def _delay_for(self, distance, closure, crossing, boundaries, base, slowest):
+        if crossing is not None and crossing <= base:
+            # Predicted to cross before the next regular poll: poll just after
+            return crossing + CROSSING_MARGIN_SECONDS
+        if closure is None or abs(closure) < MIN_CLOSURE_KTS:
+            return base
+
+        if closure > 0:
+            ahead = [b for b in boundaries if b < distance]
+            if not ahead:
+                # Inside the innermost ring and still closing: landing imminent
+                return 0
+            boundary = max(ahead)
+        else:
+            ahead = [b for b in boundaries if b > distance]
+            if not ahead:
+                return slowest
+            boundary = min(ahead)
+
+        seconds_to_boundary = abs(distance - boundary) / abs(closure) * 3600
+        return seconds_to_boundary / SAMPLES_PER_CROSSING
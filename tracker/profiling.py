@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Poll profiling for FinalPing
+
+Every poll is split into stages timed with perf_counter (a monotonic clock).
+A stage boundary costs one clock read, so the timers are always on:
+
+  reload     config file check
+  receivers  local receiver snapshot
+  fetch      adsb.lol requests (waiting on the network), less parsing
+  parse      streaming JSON filter over the response bodies
+  extract    picking tracked aircraft out of the parsed entries
+  geometry   batched distance/bearing/airspace/geofence pass
+  notify     state machine and alert queueing (check_and_notify)
+  history    flight history hand-off
+  missing    disappeared-aircraft check and next poll delay
+  snapshot   track eviction and state snapshot
+  process    (multi-airport) every airport's extract..snapshot stages, each
+             airport also summarised on its own
+
+Webhook posts run on their own delivery tasks, outside the poll; their
+latency is the webhook_post_seconds metric.
+
+Every stats interval the p50/p95/p99 of each stage and the slowest polls are
+written to the event stream as a "poll_profile" event. A poll slower than
+profiling.slow_poll_seconds is logged with its breakdown as it happens.
+
+cProfile captures are opt-in: SIGUSR1 (POSIX), or profiling.capture set in
+the config (at start, or when a reload turns it on), profiles the event
+loop thread for capture_seconds, writes a .prof file and logs the top
+functions by cumulative time. Nothing is profiled otherwise.
+
+profiling config (optional):
+  slow_poll_seconds  log polls slower than this (default 5)
+  capture            run a cProfile capture
+  capture_seconds    capture length (default 30)
+  capture_dir        where .prof files go (default next to the config)
+"""
+
+import asyncio
+import heapq
+import os
+import signal
+import time
+from collections import deque
+
+from event_log import log
+
+STAGES = ('reload', 'receivers', 'fetch', 'parse', 'extract', 'geometry',
+          'notify', 'history', 'missing', 'snapshot', 'process')
+
+# Per-stage samples kept between summaries
+SAMPLES_PER_STAGE = 2048
+SLOWEST_POLLS = 5
+
+DEFAULT_SLOW_POLL_SECONDS = 5.0
+DEFAULT_CAPTURE_SECONDS = 30
+TOP_FUNCTIONS = 15
+
+
+def _ms(stages):
+    return {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()}
+
+
+def _breakdown(stages, top=4):
+    """The slowest few stages, for one log line"""
+    slowest = sorted(stages.items(), key=lambda item: -item[1])[:top]
+    return ', '.join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in slowest)
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class PollProfiler:
+    """Stage timings of the poll in progress, and of recent polls"""
+
+    def __init__(self):
+        self.slow_poll_seconds = DEFAULT_SLOW_POLL_SECONDS
+        self.samples = {}   # stage -> recent seconds
+        self.slowest = []   # min-heap of (seconds, poll number, epoch time, stages)
+        self.polls = 0
+        self._stages = None
+        self._started = None
+        self._mark = None   # None between polls, so stray laps cost nothing
+
+    def configure(self, settings):
+        self.slow_poll_seconds = settings.get('slow_poll_seconds', DEFAULT_SLOW_POLL_SECONDS)
+
+    def begin(self):
+        self._started = self._mark = time.perf_counter()
+        self._stages = {}
+
+    def lap(self, stage):
+        """Charge the time since the last lap to stage"""
+        if self._mark is None:
+            return
+        now = time.perf_counter()
+        self._stages[stage] = self._stages.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def split(self, stage, part, seconds):
+        """Move seconds of stage's time, measured elsewhere, into part"""
+        if self._mark is None:
+            return
+        seconds = min(seconds, self._stages.get(stage, 0.0))
+        self._stages[stage] = self._stages.get(stage, 0.0) - seconds
+        self._stages[part] = self._stages.get(part, 0.0) + seconds
+
+    def end(self):
+        """Finish the poll and return its total seconds"""
+        if self._mark is None:
+            return None
+        total = time.perf_counter() - self._started
+        stages, self._mark = self._stages, None
+        self.polls += 1
+
+        for stage, seconds in stages.items():
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=SAMPLES_PER_STAGE)
+            samples.append(seconds)
+        self.samples.setdefault('total', deque(maxlen=SAMPLES_PER_STAGE)).append(total)
+
+        entry = (total, self.polls, time.time(), stages)
+        if len(self.slowest) < SLOWEST_POLLS:
+            heapq.heappush(self.slowest, entry)
+        elif total > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+        if total >= self.slow_poll_seconds:
+            log(f"[WARN] Slow poll: {total:.2f}s ({_breakdown(stages)})",
+                event='slow_poll', seconds=round(total, 3), stages_ms=_ms(stages))
+        return total
+
+    def summary(self):
+        """({stage: {p50_ms, p95_ms, p99_ms, max_ms}}, slowest polls) since the last summary"""
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        stages = {}
+        for stage in sorted(self.samples, key=lambda s: order.get(s, len(order))):
+            ordered = sorted(self.samples[stage])
+            stages[stage] = {
+                'p50_ms': round(_percentile(ordered, 0.5) * 1000, 2),
+                'p95_ms': round(_percentile(ordered, 0.95) * 1000, 2),
+                'p99_ms': round(_percentile(ordered, 0.99) * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2),
+            }
+        slowest = [{'t': round(t, 3), 'ms': round(total * 1000, 2), 'stages_ms': _ms(polled)}
+                   for total, _, t, polled in sorted(self.slowest, reverse=True)]
+        return stages, slowest
+
+    def log_summary(self, label=None):
+        """Write the stage summary to the event stream and start a new window"""
+        if not self.polls:
+            return
+        stages, slowest = self.summary()
+        name = f" ({label})" if label else ''
+        log(f"[STATS] Poll stages{name} over {self.polls} polls: " +
+            ', '.join(f"{stage} p50 {s['p50_ms']:g}/p95 {s['p95_ms']:g}/p99 {s['p99_ms']:g}ms"
+                      for stage, s in stages.items()),
+            event='poll_profile', label=label, polls=self.polls, stages=stages, slowest=slowest)
+        self.samples.clear()
+        self.slowest = []
+        self.polls = 0
+
+
+class ProfileCapture:
+    """One cProfile capture of the event loop thread at a time"""
+
+    def __init__(self):
+        self._profile = None
+        self._path = None
+        self._timer = None
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def start(self, seconds=DEFAULT_CAPTURE_SECONDS, directory='.'):
+        """Profile for seconds, then write the .prof file; needs a running loop"""
+        if self._profile is not None:
+            log("[WARN] Profile capture already running")
+            return False
+        # Only imported when someone asks for a capture
+        import cProfile
+        self._path = os.path.join(directory, time.strftime('finalping-%Y%m%d-%H%M%S.prof'))
+        self._timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        log(f"[OK] Profiling the tracker for {seconds}s")
+        return True
+
+    def stop(self):
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return
+        profile.disable()
+        self._timer.cancel()
+
+        import pstats
+        path = self._path
+        try:
+            profile.dump_stats(path)
+        except OSError as e:
+            log(f"[WARN] Couldn't write profile: {e}")
+            path = None
+        stats = pstats.Stats(profile).sort_stats('cumulative')
+        top = []
+        for func in stats.fcn_list[:TOP_FUNCTIONS]:
+            _, calls, own, cumulative, _ = stats.stats[func]
+            filename, line, name = func
+            top.append({'function': f"{os.path.basename(filename)}:{line}({name})", 'calls': calls,
+                        'own_s': round(own, 4), 'cumulative_s': round(cumulative, 4)})
+
+        log(f"[STATS] Profile capture done{f' - {path}' if path else ''}", event='profile', path=path, top=top)
+        for entry in top:
+            log(f"  {entry['cumulative_s']:8.3f}s {entry['calls']:8d} calls  {entry['function']}")
+
+
+CAPTURE = ProfileCapture()
+
+
+def install_capture_signal(start_capture):
+    """Call start_capture on SIGUSR1 (no-op where unsupported)"""
+    if not hasattr(signal, 'SIGUSR1'):
+        return
+    def on_usr1():
+        log("Profile capture requested (SIGUSR1)")
+        start_capture()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, on_usr1)
+    except (NotImplementedError, RuntimeError):
+        pass
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Local ADS-B receiver sources for FinalPing
+
+Reads the SBS-1/BaseStation feed that dump1090, readsb and most other
+decoders serve on TCP port 30003, decoding messages incrementally as they
+arrive. Each aircraft is kept as an entry shaped like an adsb.lol `ac`
+object (hex, flight, alt_baro, gs, track, lat, lon, baro_rate, seen_pos),
+so receiver data and REST data go through the same extract/fuse path.
+
+Several trackers pointing at the same receiver share one connection.
+
+receivers config (a list):
+  host     receiver address (default 127.0.0.1)
+  port     SBS port (default 30003)
+  name     label for logs and metrics (default host:port)
+"""
+
+import asyncio
+import time
+
+from event_log import debug, log
+from fleet_registry import normalize_icao24
+from metrics import METRICS
+
+# Positions older than this are not reported (adsb.lol uses about a minute)
+MAX_POSITION_AGE_SECONDS = 30
+
+# Forget aircraft not heard from for this long
+FORGET_AFTER_SECONDS = 300
+
+# A connected receiver that has sent nothing for this long is treated as down
+STALE_AFTER_SECONDS = 60
+
+# Reconnect backoff
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 30
+
+READ_CHUNK_BYTES = 65536
+
+
+def _number(text, cast=float):
+    try:
+        return cast(text) if text else None
+    except ValueError:
+        return None
+
+
+class SbsDecoder:
+    """Incremental SBS-1 (BaseStation CSV) decoder.
+
+    feed() takes raw bytes as they arrive; lines split across chunks are
+    completed on the next feed. Decoded fields are folded into one adsb.lol
+    shaped entry per aircraft, stamped with when each part was last heard.
+    """
+
+    def __init__(self):
+        self.aircraft = {}  # hex -> entry; '_t' last heard, '_pos_t' last position
+        self._pending = b''
+
+    def feed(self, data, now):
+        """Decode whole lines from data; returns the number of messages"""
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        count = 0
+        for line in lines:
+            if self._line(line.decode('ascii', 'replace').strip(), now):
+                count += 1
+        return count
+
+    def _line(self, line, now):
+        fields = line.split(',')
+        if len(fields) < 22 or fields[0] != 'MSG':
+            return False
+        hex_code = normalize_icao24(fields[4])
+        if not hex_code:
+            return False
+
+        entry = self.aircraft.get(hex_code)
+        if entry is None:
+            entry = self.aircraft[hex_code] = {'hex': hex_code}
+        entry['_t'] = now
+
+        callsign = fields[10].strip()
+        if callsign:
+            entry['flight'] = callsign
+        on_ground = fields[21] not in ('', '0')
+        altitude = _number(fields[11], int)
+        if on_ground:
+            entry['alt_baro'] = 'ground'
+        elif altitude is not None:
+            entry['alt_baro'] = altitude
+        gs = _number(fields[12])
+        if gs is not None:
+            entry['gs'] = gs
+        heading = _number(fields[13])
+        if heading is not None:
+            entry['track'] = heading
+        lat, lon = _number(fields[14]), _number(fields[15])
+        if lat is not None and lon is not None:
+            entry['lat'] = lat
+            entry['lon'] = lon
+            entry['_pos_t'] = now
+        rate = _number(fields[16], int)
+        if rate is not None:
+            entry['baro_rate'] = rate
+        squawk = fields[17].strip()
+        if squawk:
+            entry['squawk'] = squawk
+        return True
+
+    def snapshot(self, wanted, now, max_age=MAX_POSITION_AGE_SECONDS):
+        """{hex: entry} for wanted aircraft (None for all) with a recent position"""
+        found = {}
+        codes = self.aircraft.keys() if wanted is None else wanted
+        for hex_code in codes:
+            entry = self.aircraft.get(hex_code)
+            if entry is None or '_pos_t' not in entry or now - entry['_pos_t'] > max_age:
+                continue
+            # Without a speed, extract_aircraft would take it for on the ground
+            if 'gs' not in entry and entry.get('alt_baro') != 'ground':
+                continue
+            aircraft = {k: v for k, v in entry.items() if not k.startswith('_')}
+            aircraft['seen'] = round(now - entry['_t'], 1)
+            aircraft['seen_pos'] = round(now - entry['_pos_t'], 1)
+            found[hex_code] = aircraft
+        return found
+
+    def forget(self, now, after=FORGET_AFTER_SECONDS):
+        for hex_code in [h for h, e in self.aircraft.items() if now - e['_t'] > after]:
+            del self.aircraft[hex_code]
+
+
+class ReceiverSource:
+    """One receiver's SBS feed, read on a background task with reconnects"""
+
+    def __init__(self, host='127.0.0.1', port=30003, name=None):
+        self.host = host
+        self.port = port
+        self.name = name or f"{host}:{port}"
+        self.decoder = SbsDecoder()
+        self.connected = False
+        self.last_message = None
+        self.users = 0
+        self._task = None
+
+    def start(self):
+        """Start reading; needs a running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def healthy(self):
+        return (self.connected and self.last_message is not None
+                and time.time() - self.last_message < STALE_AFTER_SECONDS)
+
+    def snapshot(self, wanted):
+        return self.decoder.snapshot(wanted, time.time())
+
+    async def _run(self):
+        delay = RECONNECT_MIN_SECONDS
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                self.connected = True
+                delay = RECONNECT_MIN_SECONDS
+                log(f"[OK] Receiver {self.name} connected")
+                last_forget = time.time()
+                while True:
+                    data = await reader.read(READ_CHUNK_BYTES)
+                    if not data:
+                        break
+                    now = time.time()
+                    count = self.decoder.feed(data, now)
+                    if count:
+                        self.last_message = now
+                        METRICS.inc('receiver_messages', count, source=self.name)
+                    if now - last_forget >= FORGET_AFTER_SECONDS:
+                        self.decoder.forget(now)
+                        last_forget = now
+                log(f"[WARN] Receiver {self.name} closed the connection")
+            except asyncio.CancelledError:
+                raise
+            except OSError as e:
+                debug('receiver', "[WARN] Receiver %s: %s", self.name, e)
+            finally:
+                self.connected = False
+                if writer is not None:
+                    writer.close()
+            METRICS.inc('receiver_reconnects', source=self.name)
+            await asyncio.sleep(delay)
+            delay = min(RECONNECT_MAX_SECONDS, delay * 2)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Connections shared between trackers, keyed by (host, port)
+_SOURCES = {}
+
+
+def acquire(settings):
+    """Shared ReceiverSource for one receivers config entry"""
+    key = (settings.get('host', '127.0.0.1'), settings.get('port', 30003))
+    source = _SOURCES.get(key)
+    if source is None:
+        source = _SOURCES[key] = ReceiverSource(key[0], key[1], settings.get('name'))
+    source.users += 1
+    return source
+
+
+async def release(source):
+    source.users -= 1
+    if source.users <= 0:
+        _SOURCES.pop((source.host, source.port), None)
+        await source.close()
+
+
+def aged(found, seconds):
+    """found with every position seconds older, for fusing a reused earlier result"""
+    return {hex_code: {**aircraft, 'seen_pos': aircraft.get('seen_pos', 0) + seconds}
+            for hex_code, aircraft in found.items()}
+
+
+def fuse(*results):
+    """Merge {hex: entry} maps from several sources.
+
+    Per aircraft, the entry with the freshest position wins; fields it lacks
+    (e.g. a callsign only one source has heard) are filled from the others.
+    """
+    fused = {}
+    for found in results:
+        for hex_code, aircraft in found.items():
+            current = fused.get(hex_code)
+            if current is None:
+                fused[hex_code] = aircraft
+            elif aircraft.get('seen_pos', 1e9) < current.get('seen_pos', 1e9):
+                fused[hex_code] = {**current, **aircraft}
+            else:
+                fused[hex_code] = {**aircraft, **current}
+    return fused
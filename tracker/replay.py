@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Trace recording and replay for FinalPing
+
+--record PATH appends every poll's raw adsb.lol responses to a gzip
+JSON-lines trace. --replay PATH feeds a trace back through
+AviationTracker.process_poll, at recorded speed or as fast as possible, with
+the tracker's clock set to each poll's recorded time and every webhook
+pointed at a local stub server. That makes approach sequences, signal loss
+and takeoff resets reproducible without real aircraft.
+"""
+
+import asyncio
+import copy
+import gzip
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from adsb_fetch import AcStreamFilter, within_radius
+from event_log import log
+
+
+class TraceRecorder:
+    """Appends each poll's raw adsb.lol responses to a gzip JSON-lines trace"""
+
+    def __init__(self, path):
+        self.path = path
+        self.polls = 0
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def write(self, responses):
+        """Record one poll as a list of (url, body) pairs"""
+        record = {'t': time.time(), 'responses': [{'url': url, 'body': body} for url, body in responses]}
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        # Flush per poll so a crash keeps everything recorded so far
+        self._file.flush()
+        self.polls += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_trace(path):
+    """Yield recorded polls in order.
+
+    A recorder that was killed leaves the gzip stream without its end
+    marker, and possibly a partial last line; the trace is read up to the
+    last complete poll.
+    """
+    polls = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                if line.strip():
+                    polls += 1
+                    yield json.loads(line)
+        except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+            log(f"[WARN] {path} is truncated after {polls} polls ({e})")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        self.server.received.append((self.path.strip('/'), payload))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubWebhookServer:
+    """Local HTTP server that accepts webhook posts and records them"""
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.server.received = []
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def received(self):
+        return self.server.received
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def replay_config(config, stub_url):
+    """Copy of config with every webhook aimed at the stub; snapshots, history and receivers off"""
+    config = copy.deepcopy(config)
+    config['integrations'] = {
+        name: {'enabled': True, 'webhook_url': f"{stub_url}/{name}"}
+        for name in ('discord', 'slack', 'teams')
+    }
+    config.pop('discord_bot', None)
+    config.pop('receivers', None)
+    config['state'] = {'enabled': False}
+    config['history'] = {'enabled': False}
+    return config
+
+
+async def replay_trace(tracker, path, speed='max'):
+    """Feed a recorded trace through tracker.process_poll.
+
+    speed is 'max' (as fast as possible), 'realtime', or a multiplier such
+    as '10' for ten times recorded speed. Returns the number of polls.
+    """
+    factor = None if speed == 'max' else 1.0 if speed == 'realtime' else float(speed)
+    lat, lon, radius = tracker.query_region()
+
+    polls = 0
+    prev_t = None
+    started = time.perf_counter()
+    for record in read_trace(path):
+        if factor and prev_t is not None:
+            await asyncio.sleep(max(0.0, (record['t'] - prev_t) / factor))
+        prev_t = record['t']
+        tracker.now = lambda t=datetime.fromtimestamp(record['t']): t
+
+        found = {}
+        for response in record['responses']:
+            stream = AcStreamFilter(tracker.registry.codes)
+            stream.feed(response['body'])
+            stream.finish()
+            found.update(stream.found)
+
+        await tracker.process_poll(tracker.extract_aircraft(within_radius(found, lat, lon, radius)))
+        polls += 1
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    log(f"Replayed {polls} polls in {elapsed:.2f}s ({polls / elapsed:.0f} polls/s)")
+    return polls
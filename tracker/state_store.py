@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Crash-safe tracker state snapshots for FinalPing
+
+Each aircraft's TrackRecord (state, sent distance alerts and notification
+cooldowns) is written to a small SQLite database in WAL mode after every
+poll, so a crash or update mid-approach doesn't forget which boundaries an
+aircraft already crossed. Only rows whose contents changed since the last
+snapshot are written, which keeps a snapshot to a handful of row upserts.
+"""
+
+import json
+import sqlite3
+import time
+
+from event_log import log
+from track_table import TrackRecord, TrackTable
+
+
+class StateStore:
+    """SQLite (WAL) snapshot of AviationTracker's track table"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Pre-TrackRecord layout; a snapshot is short-lived, so just drop it
+        self.conn.execute('DROP TABLE IF EXISTS aircraft')
+        self.conn.execute('DROP TABLE IF EXISTS cooldowns')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS tracks (
+            icao24 TEXT PRIMARY KEY, record TEXT NOT NULL, updated REAL NOT NULL)''')
+
+        # What was last written, so each snapshot only touches changed rows
+        self._rows = {}
+
+    def load(self, max_age_minutes=30):
+        """Restore a TrackTable.
+
+        Tracks not touched within max_age_minutes are dropped; their approach
+        is long over and restoring them would only trigger stale signal-lost
+        alerts.
+        """
+        cutoff = time.time() - max_age_minutes * 60
+        records = []
+        for icao24, row, updated in self.conn.execute('SELECT icao24, record, updated FROM tracks'):
+            if updated < cutoff:
+                continue
+            try:
+                records.append(TrackRecord.from_row(icao24, json.loads(row)))
+            except (ValueError, TypeError) as e:
+                log(f"[WARN] Skipping unreadable saved state for {icao24}: {e}")
+                continue
+            self._rows[icao24] = row
+        return TrackTable(records)
+
+    def save(self, tracks):
+        """Write tracks that changed since the last snapshot in one transaction"""
+        upserts = []
+        current = set()
+        for record in tracks:
+            current.add(record.icao24)
+            row = json.dumps(record.to_row(), separators=(',', ':'))
+            if self._rows.get(record.icao24) != row:
+                upserts.append((record.icao24, row, record.touched))
+                self._rows[record.icao24] = row
+        removed = [icao24 for icao24 in self._rows if icao24 not in current]
+
+        if not (upserts or removed):
+            return
+
+        for icao24 in removed:
+            del self._rows[icao24]
+
+        try:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)', upserts)
+            self.conn.executemany('DELETE FROM tracks WHERE icao24 = ?', [(i,) for i in removed])
+            self.conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            # Force a full rewrite next time rather than trusting the cache
+            self._rows.clear()
+            log(f"[ERR] Saving tracker state: {e}")
+
+    def close(self):
+        self.conn.close()
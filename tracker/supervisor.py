@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-tenant supervisor for FinalPing
+
+tracker_bridge.js starts one tracker process per user, each with its own
+interpreter, requests stack and connections. The supervisor hosts many
+users' AviationTrackers as tasks on one event loop instead. They share one
+HTTP pool and a small process pool that parses large adsb.lol responses off
+the loop. A tenant whose tracker crashes is restarted with backoff, one
+restart at a time, so a bad deploy can't restart every tenant at once.
+
+Each tenant has its own config file (hot reload works as usual) and its own
+log settings; events go to the tenant's log file if it has one, otherwise
+to stdout tagged with the tenant id.
+
+Control: one JSON request per line on stdin or on --control-port
+(127.0.0.1 only), answered with one JSON line:
+  {"cmd": "add", "id": "alice", "config": "alice.json", "log": "alice.log"}
+  {"cmd": "remove", "id": "alice"}
+  {"cmd": "reload", "id": "alice"}     reload one tenant's config (all without id)
+  {"cmd": "list"}
+  {"cmd": "profile", "seconds": 30}    cProfile the whole loop (see profiling)
+  {"cmd": "stop"}
+Replies are {"ok": true, ...} or {"ok": false, "error": "..."}.
+
+Usage: aviation_tracker_discord_bot.py --supervise [--control-port 8765] [--workers 2] [config ...]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import event_log
+from event_log import configure as configure_logging, log
+from metrics import METRICS
+from profiling import CAPTURE
+
+DEFAULT_WORKERS = 2
+
+# Restart backoff per tenant; a tracker that ran this long resets it
+RESTART_MIN_SECONDS = 1
+RESTART_MAX_SECONDS = 60
+RESTART_RESET_SECONDS = 300
+
+# Gap between two tenants' restarts
+RESTART_SPACING_SECONDS = 1
+
+
+def read_config(path):
+    """Load a tenant config, raising ValueError if it can't be used"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except OSError as e:
+        raise ValueError(f"can't read {path}: {e.strerror}")
+    except ValueError as e:
+        raise ValueError(f"invalid config JSON in {path}: {e}")
+    if not config.get('aircraft', {}).get('icao24_codes'):
+        raise ValueError(f"no aircraft configured in {path}")
+    return config
+
+
+def tenant_ids(paths):
+    """Tenant ids for config paths: the file name without extension, made unique"""
+    ids = []
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        tenant_id, n = stem, 1
+        while tenant_id in ids:
+            n += 1
+            tenant_id = f"{stem}-{n}"
+        ids.append(tenant_id)
+    return ids
+
+
+def _required(request, key):
+    value = request.get(key)
+    if not value:
+        raise ValueError(f"missing {key}")
+    return value
+
+
+class Tenant:
+    """One supervised tracker and its restart bookkeeping"""
+
+    def __init__(self, tenant_id, config_path, log_path=None):
+        self.id = tenant_id
+        self.config_path = config_path
+        self.log_path = log_path
+        stream = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self.log = event_log.TenantLog(tenant_id, stream)
+        self.tracker = None
+        self.task = None
+        self.started = None
+        self.restarts = 0
+        self.backoff = RESTART_MIN_SECONDS
+        self.last_error = None
+
+    def status(self):
+        tracker = self.tracker
+        return {
+            'id': self.id,
+            'config': self.config_path,
+            'log': self.log_path,
+            'running': tracker is not None,
+            'uptime_s': round(time.monotonic() - self.started) if tracker is not None else None,
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'tracks': len(tracker.tracks) if tracker is not None else 0,
+        }
+
+
+class Supervisor:
+    """Runs many tenants' trackers on one loop, sharing HTTP and a parse pool"""
+
+    def __init__(self, tracker_class, http, workers=DEFAULT_WORKERS):
+        self.tracker_class = tracker_class
+        self.http = http
+        self.parse_pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.tenants = {}
+        self._restarting = asyncio.Lock()
+        self._stopped = asyncio.Event()
+        self._server = None
+        self._clients = set()
+
+    # ─── Tenants ──────────────────────────────────────────────────────────────
+
+    def add(self, tenant_id, config_path, log_path=None):
+        """Start a tenant; its config is checked first so errors reach the caller"""
+        if tenant_id in self.tenants:
+            raise ValueError(f"tenant {tenant_id} already exists")
+        read_config(config_path)
+        tenant = self.tenants[tenant_id] = Tenant(tenant_id, config_path, log_path)
+        tenant.task = asyncio.get_running_loop().create_task(self._run_tenant(tenant))
+        METRICS.inc('tenants_added')
+        log(f"[OK] Tenant {tenant_id} added ({config_path})")
+
+    async def remove(self, tenant_id):
+        tenant = self.tenants.pop(tenant_id, None)
+        if tenant is None:
+            raise ValueError(f"no tenant {tenant_id}")
+        tenant.task.cancel()
+        try:
+            await tenant.task
+        except asyncio.CancelledError:
+            pass
+        await self._close_tracker(tenant)
+        if tenant.log.stream is not None:
+            tenant.log.stream.close()
+        log(f"[OK] Tenant {tenant_id} removed")
+
+    def reload(self, tenant_id=None):
+        """Reload one tenant's config from disk, or every tenant's"""
+        if tenant_id is not None and tenant_id not in self.tenants:
+            raise ValueError(f"no tenant {tenant_id}")
+        tenants = [self.tenants[tenant_id]] if tenant_id else list(self.tenants.values())
+        for tenant in tenants:
+            if tenant.tracker is not None and tenant.tracker.config_watcher is not None:
+                tenant.tracker.config_watcher.request_reload()
+        return len(tenants)
+
+    def _start(self, tenant):
+        config = read_config(tenant.config_path)
+        configure_logging(config.get('logging', {}), config.get('verbose_debug'))
+        tracker = self.tracker_class(config, self.http, tenant.config_path)
+        tracker.fetcher.parse_pool = self.parse_pool
+        tenant.tracker = tracker
+        tenant.started = time.monotonic()
+
+    async def _close_tracker(self, tenant):
+        tracker, tenant.tracker = tenant.tracker, None
+        if tracker is None:
+            return
+        try:
+            await tracker.close()
+        except Exception as e:
+            log(f"[WARN] Closing tenant {tenant.id}: {e}")
+
+    async def _run_tenant(self, tenant):
+        """Run one tenant's tracker, restarting it whenever it crashes"""
+        event_log.bind(tenant.log)
+        crashed = False
+        while True:
+            try:
+                if crashed:
+                    await asyncio.sleep(tenant.backoff)
+                    # One restart at a time across all tenants
+                    async with self._restarting:
+                        tenant.restarts += 1
+                        METRICS.inc('tenant_restarts')
+                        log(f"Restarting tenant {tenant.id} (restart {tenant.restarts})")
+                        self._start(tenant)
+                        await asyncio.sleep(RESTART_SPACING_SECONDS)
+                else:
+                    self._start(tenant)
+                await tenant.tracker.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                tenant.last_error = f"{type(e).__name__}: {e}"
+                METRICS.inc('tenant_crashes')
+                log(f"[ERR] Tenant {tenant.id} crashed: {tenant.last_error}")
+                ran = time.monotonic() - tenant.started if tenant.tracker is not None else 0
+                await self._close_tracker(tenant)
+                if ran >= RESTART_RESET_SECONDS:
+                    tenant.backoff = RESTART_MIN_SECONDS
+                elif crashed:
+                    tenant.backoff = min(RESTART_MAX_SECONDS, tenant.backoff * 2)
+                crashed = True
+
+    # ─── Control ──────────────────────────────────────────────────────────────
+
+    async def handle(self, request):
+        """Apply one control request and return the reply"""
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            cmd = request.get('cmd')
+            if cmd == 'add':
+                self.add(_required(request, 'id'), _required(request, 'config'), request.get('log'))
+                return {'ok': True}
+            if cmd == 'remove':
+                await self.remove(_required(request, 'id'))
+                return {'ok': True}
+            if cmd == 'reload':
+                return {'ok': True, 'reloaded': self.reload(request.get('id'))}
+            if cmd == 'list':
+                return {'ok': True, 'tenants': [tenant.status() for tenant in self.tenants.values()]}
+            if cmd == 'profile':
+                if not CAPTURE.start(float(request.get('seconds', 30)), request.get('dir', '.')):
+                    raise ValueError("a profile capture is already running")
+                return {'ok': True}
+            if cmd == 'stop':
+                self._stopped.set()
+                return {'ok': True}
+            raise ValueError(f"unknown cmd {cmd!r}")
+        except (ValueError, OSError) as e:
+            return {'ok': False, 'error': str(e)}
+
+    async def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'ok': False, 'error': 'invalid JSON'}
+        return await self.handle(request)
+
+    def _read_stdin(self, loop):
+        """Feed stdin lines to the loop; runs on its own thread"""
+        for line in sys.stdin:
+            if line.strip():
+                asyncio.run_coroutine_threadsafe(self._stdin_request(line), loop)
+
+    async def _stdin_request(self, line):
+        reply = await self.handle_line(line)
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+    async def _client(self, reader, writer):
+        self._clients.add(writer)
+        try:
+            while not reader.at_eof():
+                line = await reader.readline()
+                if not line.strip():
+                    continue
+                reply = await self.handle_line(line.decode('utf-8', errors='replace'))
+                writer.write((json.dumps(reply) + '\n').encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    async def run(self, control_port=None, read_stdin=True):
+        """Serve control requests until a stop request"""
+        if control_port:
+            self._server = await asyncio.start_server(self._client, '127.0.0.1', control_port)
+            log(f"[OK] Supervisor control on 127.0.0.1:{control_port}")
+        if read_stdin:
+            loop = asyncio.get_running_loop()
+            threading.Thread(target=self._read_stdin, args=(loop,), daemon=True, name='control').start()
+        workers = self.parse_pool._max_workers if self.parse_pool is not None else 0
+        log(f"Supervisor running: {len(self.tenants)} tenants, {workers} parse workers")
+        await self._stopped.wait()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+        # Each tenant can take up to 15s draining its webhooks; drain them together
+        await asyncio.gather(*(self.remove(tenant_id) for tenant_id in list(self.tenants)))
+        self.http.close()
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+        log("Supervisor stopped")
+
+
+async def run_supervisor(tracker_class, http, config_paths, control_port=None, workers=DEFAULT_WORKERS):
+    """Supervise the given configs as tenants, then whatever the control protocol adds"""
+    supervisor = Supervisor(tracker_class, http, workers)
+    try:
+        for tenant_id, path in zip(tenant_ids(config_paths), config_paths):
+            try:
+                supervisor.add(tenant_id, path)
+            except (ValueError, OSError) as e:
+                log(f"[ERR] Tenant {tenant_id}: {e}")
+        await supervisor.run(control_port)
+    finally:
+        await supervisor.close()
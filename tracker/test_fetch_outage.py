@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+A failed adsb.lol fetch must not read as every tracked aircraft going
+missing: an aircraft on approach when the API goes down for 30s is not
+reported as landed.
+
+Run from tracker/: python -m unittest test_fetch_outage
+"""
+
+import asyncio
+import json
+import threading
+import unittest
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from aviation_tracker_discord_bot import AviationTracker
+from track_table import LANDED
+
+ICAO24 = 'abc123'
+
+# 3.6nm north of the field at 1400ft, inbound
+ON_APPROACH = {'hex': ICAO24, 'flight': 'N1', 'lat': 40.06, 'lon': -75.0,
+               'alt_baro': 1400, 'gs': 90, 'track': 180, 'baro_rate': -500}
+
+
+class _AdsbHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.server.down:
+            self.send_error(503)
+            return
+        body = json.dumps({'ac': [ON_APPROACH], 'msg': 'No error'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchOutageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _AdsbHandler)
+        self.server.down = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.config = {
+            'aircraft': {'tail_numbers': ['N1'], 'icao24_codes': [ICAO24]},
+            'airspace': {'center_lat': 40.0, 'center_lon': -75.0, 'radius_nm': 5,
+                         'floor_ft_agl': 0, 'ceiling_ft_agl': 3000, 'alert_distances_nm': [10, 5, 2]},
+            'notifications': {'cooldown_minutes': 0},
+            'monitoring': {'adsb_api': f"http://127.0.0.1:{self.server.server_port}",
+                           'fetch_strategy': 'area'},
+        }
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_outage_is_not_a_landing(self):
+        asyncio.run(self._outage())
+
+    async def _outage(self):
+        tracker = AviationTracker(self.config)
+        clock = [datetime(2026, 1, 1, 12, 0, 0)]
+        tracker.now = lambda: clock[0]
+        sent = []
+        tracker.send_notification = lambda message: sent.append(message) or True
+        try:
+            await tracker.poll_once()
+            self.assertIn(ICAO24, tracker.tracks)
+
+            # adsb.lol returns 503 for 30s
+            self.server.down = True
+            for _ in range(4):
+                clock[0] += timedelta(seconds=10)
+                await tracker.poll_once()
+                self.assertTrue(tracker.fetch_failed)
+
+            track = tracker.tracks.get(ICAO24)
+            self.assertFalse(track.has(LANDED))
+            self.assertEqual(track.consecutive_missing, 0)
+            self.assertEqual([m for m in sent if 'LANDED' in m], [])
+
+            # Back up: still on approach, nothing retracted or re-sent
+            self.server.down = False
+            clock[0] += timedelta(seconds=10)
+            await tracker.poll_once()
+            self.assertFalse(tracker.fetch_failed)
+            self.assertEqual([m for m in sent if 'LANDED' in m], [])
+        finally:
+            await tracker.close(timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Per-aircraft track records for FinalPing
+
+Everything the state machine remembers about one aircraft lives in a single
+slotted TrackRecord: status flags, distances, epoch timestamps, a bitmask of
+distance alerts already sent, the aircraft's notification cooldowns and its
+motion model. TrackTable keeps records in least-recently-touched order, so
+stale tracks are evicted from the front by TTL and the table can be capped
+(LRU) without scanning, and memory stays flat over weeks of uptime with
+rotating fleets.
+"""
+
+from collections import OrderedDict
+
+from motion_model import MotionState
+
+# TrackRecord.flags
+ACTIVE = 1         # being followed; cleared once an aircraft is given up on
+IN_AIRSPACE = 2
+ON_GROUND = 4
+GROUND_KNOWN = 8   # ON_GROUND has been observed at least once
+LANDED = 16
+LANDING_INFERRED = 32  # LANDED was called on signal loss and not yet confirmed
+
+# Alert distance (nm) -> bit in TrackRecord.alerts. Keyed by float value, so
+# 10 and 10.0 share a bit. Only grows by the handful of distinct distances
+# that configs use.
+_ALERT_BITS = {}
+
+
+def alert_bit(distance):
+    distance = float(distance)
+    bit = _ALERT_BITS.get(distance)
+    if bit is None:
+        bit = _ALERT_BITS[distance] = 1 << len(_ALERT_BITS)
+    return bit
+
+
+def alert_distances(mask):
+    """Distances whose bits are set in mask"""
+    return sorted(distance for distance, bit in _ALERT_BITS.items() if mask & bit)
+
+
+# Geofence name -> bit in TrackRecord.fences, the same way
+_FENCE_BITS = {}
+
+
+def fence_bit(name):
+    bit = _FENCE_BITS.get(name)
+    if bit is None:
+        bit = _FENCE_BITS[name] = 1 << len(_FENCE_BITS)
+    return bit
+
+
+def fence_names(mask):
+    """Geofence names whose bits are set in mask"""
+    return sorted(name for name, bit in _FENCE_BITS.items() if mask & bit)
+
+
+class TrackRecord:
+    """State for one tracked aircraft; timestamps are epoch seconds"""
+
+    __slots__ = ('icao24', 'flags', 'last_distance', 'max_distance', 'last_update',
+                 'left_airspace_time', 'consecutive_missing', 'alerts', 'cooldowns', 'touched',
+                 'motion', 'fences')
+
+    def __init__(self, icao24):
+        self.icao24 = icao24
+        self.flags = 0
+        self.last_distance = None
+        self.max_distance = None
+        self.last_update = None
+        self.left_airspace_time = None
+        self.consecutive_missing = 0
+        self.alerts = 0
+        self.cooldowns = {}  # event type -> last sent
+        self.touched = 0.0
+        self.motion = None  # MotionState once a position has been seen
+        self.fences = 0  # bits of the geofences the aircraft was inside last poll
+
+    def has(self, flag):
+        return bool(self.flags & flag)
+
+    def set(self, flag, on=True):
+        self.flags = self.flags | flag if on else self.flags & ~flag
+
+    @property
+    def was_on_ground(self):
+        """Last observed ground status, or None if never observed"""
+        return self.has(ON_GROUND) if self.has(GROUND_KNOWN) else None
+
+    def mark_alert(self, distance):
+        self.alerts |= alert_bit(distance)
+
+    def drop(self):
+        """Stop following the aircraft; sent alerts and cooldowns are kept"""
+        self.flags = 0
+        self.last_distance = None
+        self.max_distance = None
+        self.last_update = None
+        self.left_airspace_time = None
+        self.consecutive_missing = 0
+        self.motion = None
+        self.fences = 0
+
+    def to_row(self):
+        """JSON-safe list for snapshots"""
+        return [self.flags, self.last_distance, self.max_distance, self.last_update,
+                self.left_airspace_time, self.consecutive_missing,
+                alert_distances(self.alerts), self.cooldowns, self.touched,
+                self.motion.to_row() if self.motion else None, fence_names(self.fences)]
+
+    @classmethod
+    def from_row(cls, icao24, row):
+        record = cls(icao24)
+        (record.flags, record.last_distance, record.max_distance, record.last_update,
+         record.left_airspace_time, record.consecutive_missing, alerts,
+         record.cooldowns, record.touched) = row[:9]
+        if len(row) > 9 and row[9]:
+            record.motion = MotionState.from_row(row[9])
+        for distance in alerts:
+            record.mark_alert(distance)
+        for name in row[10] if len(row) > 10 else []:
+            record.fences |= fence_bit(name)
+        return record
+
+
+class TrackTable:
+    """icao24 -> TrackRecord, least recently touched first"""
+
+    def __init__(self, records=()):
+        self._records = OrderedDict()
+        for record in sorted(records, key=lambda r: r.touched):
+            self._records[record.icao24] = record
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(list(self._records.values()))
+
+    def __contains__(self, icao24):
+        return icao24 in self._records
+
+    def get(self, icao24):
+        return self._records.get(icao24)
+
+    def touch(self, icao24, now):
+        """Record for icao24, created if needed and marked most recently used"""
+        record = self._records.get(icao24)
+        if record is None:
+            record = self._records[icao24] = TrackRecord(icao24)
+        else:
+            self._records.move_to_end(icao24)
+        record.touched = now
+        return record
+
+    def active(self):
+        return [record for record in self._records.values() if record.flags & ACTIVE]
+
+    def discard(self, icao24):
+        self._records.pop(icao24, None)
+
+    def evict(self, now, ttl_seconds, max_tracks):
+        """Drop tracks untouched for ttl_seconds, then the oldest beyond max_tracks"""
+        evicted = 0
+        records = self._records
+        while records:
+            record = next(iter(records.values()))
+            if now - record.touched < ttl_seconds and len(records) <= max_tracks:
+                break
+            del records[record.icao24]
+            evicted += 1
+        return evicted
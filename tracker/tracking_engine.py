@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-airport tracking engine for FinalPing
+
+Runs several airport/fleet trackers in one process. Their ADS-B area
+queries are merged into the smallest set of covering /v2/lat/lon/dist
+regions, each region is fetched once per poll, and the results are fanned
+out to every tracker the region covers. Trackers with local receivers get
+their receiver data fused in, and a region is only fetched when one of
+its trackers still needs adsb.lol, and no more often than the most
+urgent of their schedulers asks for: the loop itself runs as fast as the
+fastest airport, which with a local receiver is every second.
+"""
+
+import asyncio
+import time
+from math import cos, radians, hypot, ceil
+
+from adsb_fetch import ADSB_API, AdsbFetcher
+from event_log import log
+from metrics import METRICS, log_metrics
+from poll_scheduler import REST_SLACK_SECONDS
+from profiling import PollProfiler
+from receiver import aged, fuse
+
+# adsb.lol rejects area queries larger than this
+ADSB_MAX_RADIUS_NM = 250
+
+# Merge two regions only if the covering circle's area is at most this
+# multiple of their combined areas; past that, one big query costs more in
+# payload than the extra request it saves.
+MERGE_AREA_FACTOR = 1.5
+
+
+class QueryRegion:
+    """One adsb.lol area query and the trackers it serves"""
+
+    __slots__ = ('lat', 'lon', 'radius_nm', 'members')
+
+    def __init__(self, lat, lon, radius_nm, members):
+        self.lat = lat
+        self.lon = lon
+        self.radius_nm = radius_nm
+        self.members = members
+
+    def __repr__(self):
+        return f"{self.lat:.3f},{self.lon:.3f} r={self.radius_nm:.0f}nm"
+
+
+def _enclose(a, b):
+    """Smallest circle covering regions a and b (flat-earth approximation)"""
+    nm_per_deg_lon = 60 * cos(radians((a.lat + b.lat) / 2))
+    dx = (b.lon - a.lon) * nm_per_deg_lon
+    dy = (b.lat - a.lat) * 60
+    d = hypot(dx, dy)
+    members = a.members + b.members
+
+    if d + b.radius_nm <= a.radius_nm:
+        return QueryRegion(a.lat, a.lon, a.radius_nm, members)
+    if d + a.radius_nm <= b.radius_nm:
+        return QueryRegion(b.lat, b.lon, b.radius_nm, members)
+
+    radius = (d + a.radius_nm + b.radius_nm) / 2
+    t = (radius - a.radius_nm) / d
+    # Pad slightly for the projection error over a few hundred nm
+    return QueryRegion(a.lat + t * (b.lat - a.lat), a.lon + t * (b.lon - a.lon), radius * 1.01, members)
+
+
+def plan_regions(circles, max_radius_nm=ADSB_MAX_RADIUS_NM, merge_factor=MERGE_AREA_FACTOR):
+    """Greedily merge (lat, lon, radius_nm) query circles into covering regions.
+
+    Repeatedly merges the pair whose covering circle wastes the least area,
+    until no pair fits under max_radius_nm and merge_factor. Returns
+    QueryRegions whose members are indexes into circles.
+    """
+    regions = [QueryRegion(lat, lon, radius, [i]) for i, (lat, lon, radius) in enumerate(circles)]
+
+    while len(regions) > 1:
+        best = None
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                merged = _enclose(a, b)
+                if merged.radius_nm > max_radius_nm:
+                    continue
+                cost = merged.radius_nm ** 2 / (a.radius_nm ** 2 + b.radius_nm ** 2)
+                if cost <= merge_factor and (best is None or cost < best[0]):
+                    best = (cost, i, j, merged)
+        if best is None:
+            break
+        _, i, j, merged = best
+        regions = [r for k, r in enumerate(regions) if k not in (i, j)] + [merged]
+
+    return regions
+
+
+class TrackingEngine:
+    """Runs many AviationTrackers off one shared set of ADS-B queries"""
+
+    def __init__(self, trackers, http):
+        self.trackers = trackers
+        self.http = http
+        # Shared stages (reload, receivers, fetch, parse); each tracker times its own
+        self.profiler = PollProfiler()
+        self.profiler.configure(trackers[0].config.get('profiling', {}))
+        self._parse_s = 0.0
+        self.plan()
+
+    def plan(self):
+        """(Re)build the shared query regions from tracker configs"""
+        self.regions = plan_regions([tracker.query_region() for tracker in self.trackers])
+        # One fetcher per region so each learns its own area-vs-hex costs
+        self.fetchers = []
+        for region in self.regions:
+            monitoring = self.trackers[region.members[0]].config.get('monitoring', {})
+            self.fetchers.append(AdsbFetcher(self.http, monitoring.get('adsb_api', ADSB_API)))
+        # Per region, (monotonic time, by_hex or None if it failed) of the last fetch
+        self._rest = [None] * len(self.regions)
+        self.stats_interval = min(
+            tracker.config.get('monitoring', {}).get('stats_interval_seconds', 300) for tracker in self.trackers
+        )
+
+    def check_reload(self):
+        """Reload changed tracker configs, replanning regions if any tracker's query changed"""
+        queries = [tracker.query_region() for tracker in self.trackers]
+        changed = set()
+        for tracker in self.trackers:
+            changed |= tracker.check_reload()
+        if 'profiling' in changed:
+            self.profiler.configure(self.trackers[0].config.get('profiling', {}))
+        # Rings, overrides and geofences size the query as well as the airspace
+        # does; a new fleet or API also invalidates the regions' last results
+        if changed & {'monitoring', 'aircraft'} or (
+                changed and queries != [tracker.query_region() for tracker in self.trackers]):
+            self.plan()
+            log(f"Replanned: {len(self.trackers)} airports sharing {len(self.regions)} ADS-B queries")
+
+    async def fetch_region(self, index, local):
+        """Fetch one region's tracked aircraft, or None if the fetch failed"""
+        region, fetcher = self.regions[index], self.fetchers[index]
+        if not any(self.trackers[i].needs_rest(local[i]) for i in region.members):
+            return {}
+        last = self._rest[index]
+        if last is not None:
+            age = time.monotonic() - last[0]
+            if age < min(self.trackers[i].rest_delay for i in region.members) - REST_SLACK_SECONDS:
+                return aged(last[1], age) if last[1] else last[1]
+        wanted = frozenset().union(*(self.trackers[i].registry.codes for i in region.members))
+        strategy = self.trackers[region.members[0]].config.get('monitoring', {}).get('fetch_strategy', 'auto')
+        try:
+            by_hex = await fetcher.fetch(
+                round(region.lat, 4), round(region.lon, 4), ceil(region.radius_nm), wanted, strategy)
+            self.trackers[region.members[0]].log_fetch(fetcher)
+            self._parse_s += fetcher.last.parse_ms / 1000
+        except Exception as e:
+            log(f"[ERR] Fetching region {region}: {e}")
+            by_hex = None
+        self._rest[index] = (time.monotonic(), by_hex)
+        return by_hex
+
+    async def poll_once(self):
+        local = [tracker.local_aircraft() for tracker in self.trackers]
+        self.profiler.lap('receivers')
+        self._parse_s = 0.0
+        results = await asyncio.gather(*(self.fetch_region(index, local) for index in range(len(self.regions))))
+        # Regions are fetched concurrently, so parse time can exceed the wall time
+        self.profiler.lap('fetch')
+        self.profiler.split('fetch', 'parse', self._parse_s)
+
+        for region, by_hex in zip(self.regions, results):
+            # A failed fetch still leaves local receiver data, but aircraft
+            # without a local position weren't looked for: don't count them missing
+            complete = by_hex is not None
+            by_hex = by_hex or {}
+            for index in region.members:
+                tracker = self.trackers[index]
+                found = fuse(by_hex, local[index]) if local[index] else by_hex
+                tracker.profiler.begin()
+                try:
+                    aircraft_list = tracker.extract_aircraft(found)
+                    tracker.profiler.lap('extract')
+                    await tracker.process_poll(aircraft_list, complete)
+                    tracker.profiler.end()
+                except Exception as e:
+                    log(f"[ERR] {tracker.config['airspace'].get('name', 'My Airport')}: {e}")
+        self.profiler.lap('process')
+
+    async def run(self):
+        """Main tracking loop for all airports"""
+        for tracker in self.trackers:
+            tracker.log_banner()
+        log(f"{len(self.trackers)} airports sharing {len(self.regions)} ADS-B queries:")
+        for region in self.regions:
+            names = ', '.join(self.trackers[i].config['airspace'].get('name', 'My Airport') for i in region.members)
+            log(f"  {region}: {names}")
+        log("Tracker running. Waiting for aircraft...")
+        if any(tracker.config.get('profiling', {}).get('capture') for tracker in self.trackers):
+            self.trackers[0].start_capture()
+
+        last_stats = time.monotonic()
+        while True:
+            started = time.monotonic()
+            self.profiler.begin()
+            try:
+                self.check_reload()
+                self.profiler.lap('reload')
+                await self.poll_once()
+                self.profiler.end()
+                METRICS.observe('poll_seconds', time.monotonic() - started)
+            except Exception as e:
+                log(f"[ERR] Tracking loop error: {e}")
+                import traceback
+                traceback.print_exc()
+
+            if time.monotonic() - last_stats >= self.stats_interval:
+                last_stats = time.monotonic()
+                for region, fetcher in zip(self.regions, self.fetchers):
+                    log(f"[STATS] ADS-B {region}: {fetcher.summary()}")
+                for tracker in self.trackers:
+                    tracker.log_stats()
+                log_metrics()
+                self.profiler.log_summary('shared')
+                for tracker in self.trackers:
+                    tracker.profiler.log_summary(tracker.config['airspace'].get('name', 'My Airport'))
+
+            # Poll as soon as the most urgent airport needs it
+            delay = min(tracker.next_poll_delay for tracker in self.trackers)
+            await asyncio.sleep(max(0.0, delay - (time.monotonic() - started)))
+
+    async def close(self, timeout=15):
+        await asyncio.gather(*(tracker.close(timeout) for tracker in self.trackers))
+        self.http.close()